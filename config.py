@@ -1,6 +1,14 @@
+import itertools
 import os
 
 
+def pre_fork(server, worker):
+    # give each worker the lowest slot not taken by a live worker, so that a replaced worker
+    # takes over the CPU set of the worker it replaces
+    used_slots = {getattr(live_worker, "cpu_slot", None) for live_worker in server.WORKERS.values()}
+    worker.cpu_slot = next(slot for slot in itertools.count() if slot not in used_slots)
+
+
 def post_fork(server, worker):
     server.log.info("Worker spawned (pid: %s)", worker.pid)
     cuda_device_count = int(os.getenv("APP_CUDA_DEVICE_COUNT", -1))
@@ -16,3 +24,45 @@ def post_fork(server, worker):
         os.environ["CUDA_VISIBLE_DEVICES"] = str(cudaid)
     else:
         worker.log.info("APP_CUDA_DEVICE_COUNT device variables not set")
+
+    if os.getenv("APP_CPU_LAYOUT", "none").lower() == "auto":
+        set_cpu_layout(server, worker)
+
+
+def set_cpu_layout(server, worker):
+    # pin the worker (and the bulk processing subprocesses it creates) to its own set of CPUs and size its
+    # threads after it, needs to be done before the models (and torch / BLAS libraries) are loaded
+    from medcat_service.utils.cpu import BLAS_THREADS_ENV_VARS, get_cpu_layout, get_thread_counts, set_cpu_affinity
+
+    layout = get_cpu_layout(server.num_workers)
+    cpus = layout[getattr(worker, "cpu_slot", worker.age) % len(layout)]
+    threads = get_thread_counts(len(cpus), int(os.getenv("APP_BULK_NPROC", 8)))
+
+    if not set_cpu_affinity(cpus):
+        worker.log.warning("Could not set the CPU affinity of the worker (pid: %s)", worker.pid)
+
+    os.environ["APP_TORCH_THREADS"] = str(threads["torch_threads"])
+    os.environ["APP_BULK_NPROC"] = str(threads["bulk_nproc"])
+    os.environ["APP_BULK_TORCH_THREADS"] = str(threads["bulk_torch_threads"])
+    for env_var in BLAS_THREADS_ENV_VARS:
+        os.environ[env_var] = str(threads["blas_threads"])
+
+    worker.log.info("Worker (pid: %s) pinned to CPUs %s, %d torch threads, %d bulk subprocesses with %d torch "
+                    "threads each", worker.pid, ",".join(map(str, cpus)), threads["torch_threads"],
+                    threads["bulk_nproc"], threads["bulk_torch_threads"])
+
+
+def post_request(worker, req, environ, resp):
+    # recycle the worker once its memory grows over APP_WORKER_MAX_RSS_MB, the worker stops accepting
+    # new requests, finishes the ones in progress and is replaced by a fresh worker
+    max_rss_mb = float(os.getenv("APP_WORKER_MAX_RSS_MB", 0))
+    if max_rss_mb <= 0 or not worker.alive:
+        return
+
+    from medcat_service.utils.memory import get_rss_mb
+
+    rss_mb = get_rss_mb()
+    if rss_mb > max_rss_mb:
+        worker.log.warning("Worker RSS %.0f MB over APP_WORKER_MAX_RSS_MB %.0f MB, recycling worker (pid: %s)",
+                           rss_mb, max_rss_mb, worker.pid)
+        worker.alive = False
@@ -2,13 +2,26 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import math
 import os
+import time
 import traceback
 
 import simplejson as json
 from flask import Blueprint, Response, request
 
-from medcat_service.nlp_service import NlpService
+from medcat_service.api.capture import create_workload_capture, record_payload, record_results
+from medcat_service.api.compression import get_json_payload, json_response
+from medcat_service.nlp_service import CoordinatorService, NlpService
+from medcat_service.utils import create_request_profiler
+from medcat_service.utils.arrow_results import (ARROW_STREAM_MIMETYPE, PARQUET_MIMETYPE, EntityBatchBuilder,
+                                                is_arrow_available, to_parquet_bytes, write_arrow_stream)
+
+# bulk responses are streamed when the bulk requests have a memory budget, rather than serialised at once
+BULK_STREAMING = float(os.getenv("APP_BULK_MEMORY_BUDGET_MB", 0)) > 0
+
+# max number of concepts returned by a concept search
+CONCEPT_SEARCH_MAX_LIMIT = 1000
 
 log = logging.getLogger("API")
 log.setLevel(level=os.getenv("APP_LOG_LEVEL", logging.INFO))
@@ -17,6 +30,11 @@ log.setLevel(level=os.getenv("APP_LOG_LEVEL", logging.INFO))
 #
 api = Blueprint(name='api', import_name='api', url_prefix='/api')
 
+# shape of the requests recorded to APP_WORKLOAD_CAPTURE_PATH, see medcat_service.api.capture
+WORKLOAD_CAPTURE = create_workload_capture()
+if WORKLOAD_CAPTURE is not None:
+    WORKLOAD_CAPTURE.register(api)
+
 
 # API endpoints definition
 #
@@ -25,11 +43,16 @@ api = Blueprint(name='api', import_name='api', url_prefix='/api')
 @api.route('/info', methods=['GET'])
 def info(nlp_service: NlpService) -> Response:
     """
-    Returns basic information about the NLP Service
+    Returns basic information about the NLP Service, together with the memory and CPU usage of the worker
+    and its bulk processing configuration
     :param nlp_service: NLP Service provided by dependency injection
     :return: Flask Response
     """
-    app_info = nlp_service.nlp.get_app_info()
+    app_info = dict(nlp_service.nlp.get_app_info())
+    app_info['memory'] = nlp_service.nlp.get_memory_info()
+    app_info['cpu'] = nlp_service.nlp.get_cpu_info()
+    app_info['bulk_tuning'] = nlp_service.nlp.get_bulk_tuning_info()
+    app_info['meta_tasks'] = nlp_service.nlp.get_meta_tasks()
     return Response(response=json.dumps(app_info), status=200, mimetype="application/json")
 
 
@@ -40,18 +63,33 @@ def process(nlp_service: NlpService) -> Response:
     :param nlp_service: NLP Service provided by dependency injection
     :return: Flask response
     """
-    payload = request.get_json()
+    payload = get_json_payload()
     if payload is None or 'content' not in payload or payload['content'] is None:
         return Response(response="Input Payload should be JSON", status=400)
+    record_payload(payload)
 
     # send across the meta_anns filters in the request.
     meta_anns_filters = payload.get('meta_anns_filters', None)
 
     try:
-        result = nlp_service.nlp.process_content(payload['content'], meta_anns_filters=meta_anns_filters)
+        _check_doc_id(payload['content'])
+        output_format = _get_output_format(payload)
+    except ValueError as e:
+        return Response(response=str(e), status=400)
+
+    profiler, return_profile = _get_request_profiler(payload)
+
+    try:
+        result = nlp_service.nlp.process_content(payload['content'], meta_anns_filters=meta_anns_filters,
+                                                 profiler=profiler)
+        record_results([result])
+        if output_format != 'json':
+            return _arrow_response(nlp_service, [result], [payload['content']], output_format, profiler,
+                                   return_profile)
         app_info = nlp_service.nlp.get_app_info()
-        response = {'result': result, 'medcat_info': app_info}
-        return Response(response=json.dumps(response, iterable_as_array=True), status=200, mimetype="application/json")
+        response = {'result': _profile_serialisation(profiler, result), 'medcat_info': app_info}
+        _finish_profile(profiler, return_profile, response)
+        return json_response(response)
 
     except Exception as e:
         log.error(traceback.format_exc())
@@ -65,26 +103,117 @@ def process_bulk(nlp_service: NlpService) -> Response:
     :param nlp_service: NLP Service provided by dependency injection
     :return: Flask Response
     """
-    payload = request.get_json()
+    start_time = time.monotonic()
+    payload = get_json_payload()
     if payload is None or 'content' not in payload.keys() or payload['content'] is None:
         return Response(response="Input Payload should be JSON", status=400)
+    record_payload(payload)
+
+    # dictionary-only screening, see /api/screen
+    if payload.get('screen') is True:
+        return _screen(nlp_service, payload)
 
     try:
-        result = nlp_service.nlp.process_content_bulk(payload['content'])
+        deadline = _get_deadline(payload, start_time)
+        output_format = _get_output_format(payload)
+    except ValueError as e:
+        return Response(response=str(e), status=400)
+
+    profiler, return_profile = _get_request_profiler(payload)
+
+    try:
+        result = record_results(nlp_service.nlp.process_content_bulk(payload['content'], profiler=profiler,
+                                                                     deadline=deadline))
+        if output_format != 'json':
+            return _arrow_response(nlp_service, result, payload['content'], output_format, profiler,
+                                   return_profile)
         app_info = nlp_service.nlp.get_app_info()
 
-        response = {'result': result, 'medcat_info': app_info}
-        return Response(response=json.dumps(response, iterable_as_array=True), status=200, mimetype="application/json")
+        response = {'result': _profile_serialisation(profiler, result), 'medcat_info': app_info}
+        _finish_profile(profiler, return_profile, response)
+        return json_response(response, stream=BULK_STREAMING)
 
     except Exception as e:
         log.error(traceback.format_exc())
         return Response(response="Internal processing error %s" % e, status=500)
 
 
+@api.route('/screen', methods=['POST'])
+def screen(nlp_service: NlpService) -> Response:
+    """
+    Returns the CUIs whose names are found in the provided set of documents, using the compiled name automaton
+    of the screening mode only (no spaCy pipeline, disambiguation or meta-annotations)
+    :param nlp_service: NLP Service provided by dependency injection
+    :return: Flask Response
+    """
+    payload = get_json_payload()
+    if payload is None or 'content' not in payload or payload['content'] is None:
+        return Response(response="Input Payload should be JSON", status=400)
+    record_payload(payload)
+    return _screen(nlp_service, payload)
+
+
+@api.route('/concepts/search', methods=['GET'])
+def search_concepts(nlp_service: NlpService) -> Response:
+    """
+    Returns the concepts whose names start with, or are similar to, the 'q' query parameter, at most 'limit'
+    (default: 10) of them. The 'mode' parameter restricts the search to the 'prefix' or 'fuzzy' matches
+    :param nlp_service: NLP Service provided by dependency injection
+    :return: Flask Response
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return Response(response="The 'q' query parameter is required", status=400)
+
+    try:
+        limit = int(request.args.get('limit', 10))
+        min_similarity = float(request.args.get('min_similarity', 0.3))
+    except ValueError:
+        return Response(response="The 'limit' and 'min_similarity' query parameters should be numbers", status=400)
+    if not 0 < limit <= CONCEPT_SEARCH_MAX_LIMIT:
+        return Response(response="The 'limit' query parameter should be between 1 and %d" %
+                        CONCEPT_SEARCH_MAX_LIMIT, status=400)
+
+    try:
+        result = nlp_service.nlp.search_concepts(query, limit=limit, mode=request.args.get('mode', 'auto'),
+                                                 min_similarity=min_similarity)
+    except ValueError as e:
+        return Response(response=str(e), status=400)
+
+    try:
+        return json_response({'result': result, 'medcat_info': nlp_service.nlp.get_app_info()})
+
+    except Exception as e:
+        log.error(traceback.format_exc())
+        return Response(response="Internal processing error %s" % e, status=500)
+
+
+@api.route('/concepts/<cui>', methods=['GET'])
+def get_concept(nlp_service: NlpService, cui: str) -> Response:
+    """
+    Returns the preferred name, names and type ids of a concept of the CDB, the concepts filtered out
+    by the CUI filters not being found
+    :param nlp_service: NLP Service provided by dependency injection
+    :param cui: the CUI of the concept
+    :return: Flask Response
+    """
+    try:
+        result = nlp_service.nlp.get_concept(cui)
+    except ValueError as e:
+        return Response(response=str(e), status=400)
+
+    if result is None:
+        return Response(response="Concept not found: %s" % cui, status=404)
+    return json_response({'result': result, 'medcat_info': nlp_service.nlp.get_app_info()})
+
+
 @api.route('/retrain_medcat', methods=['POST'])
 def retrain_medcat(nlp_service: NlpService) -> Response:
 
-    payload = request.get_json()
+    if isinstance(nlp_service, CoordinatorService):
+        return Response(response="Retraining is not available in the coordinator mode", status=501)
+
+    payload = get_json_payload()
     if payload is None or 'content' not in payload or payload['content'] is None:
         return Response(response="Input Payload should be JSON", status=400)
 
@@ -92,8 +221,177 @@ def retrain_medcat(nlp_service: NlpService) -> Response:
         result = nlp_service.nlp.retrain_medcat(payload['content'], payload['replace_cdb'])
         app_info = nlp_service.nlp.get_app_info()
         response = {'result': result, 'annotations': payload['content'], 'medcat_info': app_info}
-        return Response(response=json.dumps(response), status=200, mimetype="application/json")
+        return json_response(response)
 
     except Exception as e:
         log.error(traceback.format_exc())
         return Response(response="Internal processing error %s" % e, status=500)
+
+
+# screening helpers
+#
+def _screen(nlp_service, payload):
+    """
+    Screens the documents of the payload, optionally for the CUIs of its 'cuis' field only, the matched names
+    being returned unless 'include_spans' is false
+    :param nlp_service: NLP Service provided by dependency injection
+    :param payload: the request payload
+    :return: Flask Response
+    """
+    cuis = payload.get('cuis')
+    if cuis is not None and not isinstance(cuis, list):
+        return Response(response="The 'cuis' field should be a list of CUIs", status=400)
+
+    try:
+        result = record_results(nlp_service.nlp.process_content_screen(
+            payload['content'], cuis=cuis, include_spans=payload.get('include_spans', True) is not False))
+    except ValueError as e:
+        return Response(response=str(e), status=400)
+
+    try:
+        response = {'result': result, 'medcat_info': nlp_service.nlp.get_app_info()}
+        return json_response(response)
+
+    except Exception as e:
+        log.error(traceback.format_exc())
+        return Response(response="Internal processing error %s" % e, status=500)
+
+
+# request deadline helpers
+#
+def _get_deadline(payload, start_time):
+    """
+    Returns the deadline of the request, sent as a time budget in milliseconds either in the 'deadline_ms'
+    payload field or in the 'X-Deadline-Ms' header. It is capped by the gunicorn worker timeout
+    (SERVER_WORKER_TIMEOUT), so that the completed documents are returned before the worker gets killed
+    :param payload: the request payload
+    :param start_time: the time.monotonic() time the request was received at
+    :return: the time.monotonic() time by which the results are needed, or None when no deadline was sent
+    """
+    deadline_ms = payload.get('deadline_ms', request.headers.get('X-Deadline-Ms'))
+    if deadline_ms is None:
+        return None
+
+    try:
+        deadline_ms = float(deadline_ms)
+    except (TypeError, ValueError):
+        raise ValueError("The request deadline should be a number of milliseconds, got: %s" % deadline_ms)
+    if not math.isfinite(deadline_ms) or deadline_ms <= 0:
+        raise ValueError("The request deadline should be a positive number of milliseconds")
+
+    worker_timeout = float(os.getenv('SERVER_WORKER_TIMEOUT', 0))
+    if worker_timeout > 0:
+        deadline_ms = min(deadline_ms, worker_timeout * 1000)
+    return start_time + deadline_ms / 1000
+
+
+def _check_doc_id(content):
+    """
+    Checks the optional 'doc_id' of a document, used to identify its versions for incremental re-annotation
+    :param content: the document content
+    :raises ValueError: when the document identifier is neither a string nor an integer
+    """
+    doc_id = content.get('doc_id') if isinstance(content, dict) else None
+    if doc_id is not None and (isinstance(doc_id, bool) or not isinstance(doc_id, (str, int))):
+        raise ValueError("The document 'doc_id' should be a string or an integer, got: %s" % json.dumps(doc_id))
+
+
+# Arrow / Parquet output helpers
+#
+def _get_output_format(payload):
+    """
+    Returns the output format asked for with the 'format' query parameter, the 'output_format' payload field or
+    the Accept header: 'json' (default), 'arrow' (Arrow IPC stream) or 'parquet'
+    :param payload: the request payload
+    :return: the output format
+    """
+    output_format = request.args.get('format', payload.get('output_format'))
+    if output_format is None:
+        accepted = [mimetype for mimetype, _ in request.accept_mimetypes]
+        output_format = 'arrow' if ARROW_STREAM_MIMETYPE in accepted else \
+            'parquet' if PARQUET_MIMETYPE in accepted else 'json'
+
+    output_format = str(output_format).lower()
+    if output_format not in ('json', 'arrow', 'parquet'):
+        raise ValueError("The output format should be one of: json, arrow, parquet, got: %s" % output_format)
+    if output_format != 'json' and not is_arrow_available():
+        raise ValueError("The %s output format is not available, pyarrow is not installed" % output_format)
+    return output_format
+
+
+def _arrow_response(nlp_service, results, documents, output_format, profiler, return_profile):
+    """
+    Returns the entities of the results as Arrow record batches, one row per entity, either streamed as
+    an Arrow IPC stream or written as a Parquet file. The application info is stored in the schema metadata
+    :param nlp_service: NLP Service provided by dependency injection
+    :param results: the processing results, in the order of the documents
+    :param documents: the input documents, the 'doc_id' column being added when any of them has a 'doc_id'
+    :param output_format: 'arrow' or 'parquet'
+    :param profiler: the request profiler, or None
+    :param return_profile: whether the profile should be returned to the client, in the 'X-Profile' header
+    :return: Flask Response
+    """
+    doc_ids = [document.get('doc_id') if isinstance(document, dict) else None for document in documents]
+    builder = EntityBatchBuilder(nlp_service.nlp.get_meta_tasks(),
+                                 with_doc_id=any(doc_id is not None for doc_id in doc_ids),
+                                 metadata={'medcat_info': json.dumps(nlp_service.nlp.get_app_info())})
+    batches = builder.build_batches(results, doc_ids if builder.with_doc_id else None,
+                                    batch_docs=int(os.getenv('APP_ARROW_BATCH_DOCS', 1000)))
+
+    mimetype = ARROW_STREAM_MIMETYPE if output_format == 'arrow' else PARQUET_MIMETYPE
+    if profiler is None:
+        # the record batches are built and sent one at a time
+        content = write_arrow_stream(batches, builder.schema) if output_format == 'arrow' else \
+            to_parquet_bytes(batches, builder.schema)
+        return Response(response=content, status=200, mimetype=mimetype)
+
+    # the output is built upfront so that the profile covers the serialisation
+    with profiler.span('serialisation'):
+        content = b''.join(write_arrow_stream(batches, builder.schema)) if output_format == 'arrow' else \
+            to_parquet_bytes(batches, builder.schema)
+    profile = {}
+    _finish_profile(profiler, return_profile, profile)
+    headers = {'X-Profile': json.dumps(profile['profile'])} if 'profile' in profile else {}
+    return Response(response=content, status=200, mimetype=mimetype, headers=headers)
+
+
+# request profiling helpers
+#
+def _get_request_profiler(payload):
+    """
+    Creates the profiler of the current request, if profiling was asked for with the 'profile' payload field
+    (or query parameter) and the 'X-Profiling-Token' header, or if the request was sampled for background tracing
+    :param payload: the request payload
+    :return: tuple of (profiler or None, whether to return the profile in the response)
+    """
+    requested = payload.get('profile') is True or request.args.get('profile', '').lower() == 'true'
+    return create_request_profiler(request.path, requested, request.headers.get('X-Profiling-Token'))
+
+
+def _profile_serialisation(profiler, result):
+    """
+    Serialises the result within a profiler span, so that the time spent generating and serialising
+    the output is part of the profile
+    :param profiler: the request profiler, or None
+    :param result: the processing result
+    :return: the result, pre-serialised when profiling
+    """
+    if profiler is None:
+        return result
+    with profiler.span('serialisation'):
+        return json.RawJSON(json.dumps(result, iterable_as_array=True))
+
+
+def _finish_profile(profiler, return_profile, response):
+    """
+    Ends the request profile, exports it and adds it to the response when requested
+    :param profiler: the request profiler, or None
+    :param return_profile: whether the profile should be returned to the client
+    :param response: the response content
+    """
+    if profiler is None:
+        return
+    profiler.finish()
+    profiler.export()
+    if return_profile:
+        response['profile'] = profiler.to_dict()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import threading
+import time
+
+import simplejson as json
+from flask import g, request
+
+from medcat_service.utils.arrow_results import iter_entities
+
+log = logging.getLogger("WorkloadCapture")
+log.setLevel(level=os.getenv("APP_LOG_LEVEL", logging.INFO))
+
+# payload fields recorded as request options, none of them holding document content
+CAPTURED_OPTIONS = ('meta_anns_filters', 'deadline_ms', 'output_format', 'screen', 'include_spans', 'profile')
+
+# request headers recorded as request options
+CAPTURED_HEADERS = {'Accept': 'accept', 'Accept-Encoding': 'accept_encoding', 'Content-Encoding': 'content_encoding',
+                    'X-Deadline-Ms': 'deadline_ms'}
+
+
+class WorkloadCapture:
+    """
+    Records the shape of the requests served by a blueprint as JSON lines, without their content: the endpoint,
+    the arrival time, the number of documents and their lengths, the number of entities found in each document,
+    the request options (meta-annotation filters, deadline, output format, encodings), the status, the latency
+    (until the response is fully sent) and the number of requests in flight in the worker on arrival.
+    The captured workload can be replayed with synthetic documents by `python -m medcat_service.workload`.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: the JSON lines file the requests are appended to, shared by the workers of the service
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def register(self, blueprint):
+        """
+        Records the requests of the endpoints of the blueprint
+        :param blueprint: the Flask blueprint
+        """
+        blueprint.before_request(self._before_request)
+        blueprint.after_request(self._after_request)
+        blueprint.teardown_request(self._teardown_request)
+        log.info("Capturing the shape of the requests to %s", self.path)
+
+    def _before_request(self):
+        with self._lock:
+            self._in_flight += 1
+            in_flight = self._in_flight
+        g.workload_record = {'time': round(time.time(), 3), 'endpoint': _get_endpoint(), 'method': request.method,
+                             'worker': os.getpid(), 'in_flight': in_flight, '_start': time.monotonic()}
+        options = {name: request.headers[header] for header, name in CAPTURED_HEADERS.items()
+                   if header in request.headers}
+        options.update({name: value for name, value in request.args.items() if name != 'q'})
+        if 'q' in request.args:
+            g.workload_record['query_chars'] = len(request.args['q'])
+        if options:
+            g.workload_record['options'] = options
+
+    def _after_request(self, response):
+        record = g.pop('workload_record', None)
+        if record is not None:
+            record['status'] = response.status_code
+            response.call_on_close(lambda: self._finish(record))
+        return response
+
+    def _teardown_request(self, exception=None):
+        # the response could not be created, the request being still recorded
+        record = g.pop('workload_record', None)
+        if record is not None:
+            record['status'] = 500
+            self._finish(record)
+
+    def _finish(self, record):
+        record['latency_ms'] = round((time.monotonic() - record.pop('_start')) * 1000, 3)
+        line = json.dumps(record, iterable_as_array=True) + "\n"
+        with self._lock:
+            self._in_flight -= 1
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                log.warning("Failed to record the request: %s", e)
+
+
+def create_workload_capture():
+    """
+    Creates the workload capture when enabled with APP_WORKLOAD_CAPTURE_PATH
+    :return: the WorkloadCapture, or None when disabled
+    """
+    path = os.getenv("APP_WORKLOAD_CAPTURE_PATH", "").strip()
+    if not path:
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return WorkloadCapture(path)
+
+
+def record_payload(payload):
+    """
+    Records the shape of the documents and the options of the payload of the current request, when captured
+    :param payload: the request payload
+    """
+    record = g.get('workload_record')
+    if record is None or not isinstance(payload, dict):
+        return
+
+    content = payload.get('content')
+    documents = content if isinstance(content, list) else [content] if content is not None else []
+    record['num_docs'] = len(documents)
+    record['doc_chars'] = [len(doc.get('text') or '') if isinstance(doc, dict) else 0 for doc in documents]
+
+    options = record.setdefault('options', {})
+    options.update({name: payload[name] for name in CAPTURED_OPTIONS if name in payload})
+    if isinstance(payload.get('cuis'), list):
+        options['num_cuis'] = len(payload['cuis'])
+    if not options:
+        del record['options']
+
+
+def record_results(results):
+    """
+    Records the number of entities found in each document of the current request, when captured
+    :param results: the processing results, in the order of the documents
+    :return: the results, wrapped into a generator counting the entities as they are consumed when not a list
+    """
+    record = g.get('workload_record')
+    if record is None:
+        return results
+
+    doc_entities = record['doc_entities'] = []
+    if isinstance(results, list):
+        doc_entities.extend(_count_entities(result) for result in results)
+        return results
+    return _counting_entities(results, doc_entities)
+
+
+def _counting_entities(results, doc_entities):
+    for result in results:
+        doc_entities.append(_count_entities(result))
+        yield result
+
+
+def _count_entities(result):
+    if not isinstance(result, dict) or result.get('annotations') is None:
+        return None
+    # the annotations are generated when serialised, a single item (the entities) being generated
+    if not isinstance(result['annotations'], (list, dict)):
+        result['annotations'] = list(result['annotations'])
+    return sum(1 for _ in iter_entities(result['annotations']))
+
+
+def _get_endpoint():
+    # the URL rule rather than the path, so that no identifier is recorded (e.g. /api/concepts/<cui>)
+    return request.url_rule.rule if request.url_rule is not None else request.path
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gzip
+import io
+import os
+import zlib
+
+import simplejson as json
+from flask import Response, request
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge, UnsupportedMediaType
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore
+
+RESPONSE_COMPRESSION = os.getenv("APP_RESPONSE_COMPRESSION", "True").lower() == "true"
+GZIP_COMPRESSION_LEVEL = int(os.getenv("APP_GZIP_COMPRESSION_LEVEL", 6))
+ZSTD_COMPRESSION_LEVEL = int(os.getenv("APP_ZSTD_COMPRESSION_LEVEL", 3))
+
+# max size of a compressed request body once decompressed, so that a small body cannot expand without limit
+MAX_DECOMPRESSED_SIZE = int(float(os.getenv("APP_MAX_DECOMPRESSED_MB", 100)) * 1024 * 1024)
+
+# size of the serialised JSON chunks handed over to the compressor, or sent as is when streaming
+COMPRESSION_CHUNK_SIZE = 256 * 1024
+
+DECODING_ERRORS = (OSError, EOFError, UnicodeDecodeError, zlib.error, json.JSONDecodeError) + \
+    ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+def get_supported_encodings():
+    """
+    Returns the content encodings supported for request and response bodies, in the order of preference
+    :return: list of encoding names
+    """
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def get_json_payload():
+    """
+    Parses the JSON payload of the current request, transparently decompressing the body when sent with a
+    'Content-Encoding: gzip|zstd' header. The compressed body is decompressed while being read from the request
+    stream, so that only the decompressed payload is held in memory, up to APP_MAX_DECOMPRESSED_MB.
+    :return: the parsed payload, or None when the body is empty
+    :raises RequestEntityTooLarge: when the decompressed body is larger than APP_MAX_DECOMPRESSED_MB
+    """
+    encoding = request.headers.get("Content-Encoding", "identity").strip().lower()
+    if encoding in ("", "identity"):
+        return request.get_json()
+
+    if encoding not in get_supported_encodings():
+        raise UnsupportedMediaType("Unsupported Content-Encoding: %s" % encoding)
+
+    if encoding == "gzip":
+        body = gzip.GzipFile(fileobj=request.stream, mode="rb")
+    else:
+        body = zstandard.ZstdDecompressor().stream_reader(request.stream)
+
+    try:
+        with io.TextIOWrapper(io.BufferedReader(_LimitedReader(body, MAX_DECOMPRESSED_SIZE)),
+                              encoding="utf-8") as reader:
+            return json.load(reader)
+    except DECODING_ERRORS as e:
+        raise BadRequest("Cannot decode %s request body: %s" % (encoding, e)) from e
+
+
+def json_response(content, status=200, stream=False):
+    """
+    Creates a JSON response, compressed according to the 'Accept-Encoding' header of the current request.
+    Compressed responses are compressed and sent chunk by chunk, the content being serialised at once unless
+    streamed.
+    :param content: the content to be serialised
+    :param status: HTTP status code
+    :param stream: whether to serialise the content chunk by chunk, the bulk results being serialised one at a
+    time as they are generated, rather than at once
+    :return: Flask Response
+    """
+    encoding = _negotiate_encoding()
+    # the response depends on the 'Accept-Encoding' header whether or not it is compressed, for the caches
+    headers = {"Vary": "Accept-Encoding"} if RESPONSE_COMPRESSION else {}
+    if encoding is None and not stream:
+        return Response(response=json.dumps(content, iterable_as_array=True), status=status,
+                        mimetype="application/json", headers=headers)
+
+    # the C encoder of simplejson builds the whole output at once, hence the envelope is written here
+    chunks = _iter_json(content) if stream else (json.dumps(content, iterable_as_array=True),)
+    if encoding is None:
+        return Response(response=_join_chunks(chunks), status=status, mimetype="application/json", headers=headers)
+    return Response(response=_compress(chunks, encoding), status=status, mimetype="application/json",
+                    headers={"Content-Encoding": encoding, **headers})
+
+
+def _negotiate_encoding():
+    if not RESPONSE_COMPRESSION:
+        return None
+    return request.accept_encodings.best_match(get_supported_encodings())
+
+
+def _iter_json(content):
+    """
+    Serialises the content chunk by chunk: the fields of the dicts are serialised one at a time, and the items of
+    the iterables other than lists and tuples (e.g. the generated bulk results) one item at a time, as they are
+    generated
+    :param content: the content to be serialised
+    :return: generator of JSON strings
+    """
+    if isinstance(content, dict):
+        yield "{"
+        for i, (key, value) in enumerate(content.items()):
+            yield ("" if i == 0 else ", ") + json.dumps(str(key)) + ": "
+            yield from _iter_json(value)
+        yield "}"
+    elif isinstance(content, (list, tuple, str, bytes, json.RawJSON)) or not hasattr(content, "__iter__"):
+        yield json.dumps(content, iterable_as_array=True)
+    else:
+        yield "["
+        for i, item in enumerate(content):
+            yield ("" if i == 0 else ", ") + json.dumps(item, iterable_as_array=True)
+        yield "]"
+
+
+class _LimitedReader(io.RawIOBase):
+    """
+    Reader of a decompressed request body, refusing the request once more than `limit` bytes were read
+    """
+
+    def __init__(self, body, limit):
+        self.body = body
+        self.limit = limit
+        self.size = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self.body.read(len(b))
+        self.size += len(data)
+        if self.size > self.limit:
+            raise RequestEntityTooLarge("The decompressed request body is larger than %d bytes" % self.limit)
+        b[:len(data)] = data
+        return len(data)
+
+
+def _join_chunks(chunks):
+    buffer, buffer_size = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffer_size += len(chunk)
+        if buffer_size >= COMPRESSION_CHUNK_SIZE:
+            yield "".join(buffer).encode("utf-8")
+            buffer, buffer_size = [], 0
+    yield "".join(buffer).encode("utf-8")
+
+
+def _compress(chunks, encoding):
+    if encoding == "gzip":
+        compressor = zlib.compressobj(GZIP_COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    else:
+        compressor = zstandard.ZstdCompressor(level=ZSTD_COMPRESSION_LEVEL).compressobj()
+
+    for data in _join_chunks(chunks):
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
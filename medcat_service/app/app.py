@@ -10,8 +10,8 @@ from flask import Flask
 from flask_injector import FlaskInjector
 
 from medcat_service.api import api
-from medcat_service.nlp_processor import MedCatProcessor
-from medcat_service.nlp_service import MedCatService, NlpService
+from medcat_service.nlp_processor import CoordinatorProcessor, MedCatProcessor
+from medcat_service.nlp_service import CoordinatorService, MedCatService, NlpService
 
 
 def setup_logging():
@@ -48,10 +48,15 @@ def create_app():
     app = Flask(__name__)
     app.register_blueprint(api)
 
-    # provide the dependent modules via dependency injection
+    # provide the dependent modules via dependency injection, in the coordinator mode the documents are
+    # dispatched to the MedCAT services listed in APP_COORDINATOR_BACKENDS rather than processed locally
     def configure(binder):
-        binder.bind(MedCatProcessor, to=MedCatProcessor, scope=injector.singleton)
-        binder.bind(NlpService, to=MedCatService, scope=injector.singleton)
+        if os.getenv("APP_COORDINATOR_BACKENDS"):
+            binder.bind(CoordinatorProcessor, to=CoordinatorProcessor, scope=injector.singleton)
+            binder.bind(NlpService, to=CoordinatorService, scope=injector.singleton)
+        else:
+            binder.bind(MedCatProcessor, to=MedCatProcessor, scope=injector.singleton)
+            binder.bind(NlpService, to=MedCatService, scope=injector.singleton)
 
     FlaskInjector(app=app, modules=[configure])
 
@@ -0,0 +1,7 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .annotator import annotate_directory
+from .readers import count_documents, list_input_files, read_documents
+
+__all__ = ['annotate_directory', 'list_input_files', 'read_documents', 'count_documents']
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Offline batch annotation of JSONL / CSV / Parquet files, using the same model configuration (env variables)
+as the service:
+
+    python -m medcat_service.batch <input_dir> <output_dir> [--nproc 8] [--shard-size 1000] [--output-format parquet]
+"""
+import argparse
+import logging
+import sys
+
+from medcat_service.batch.annotator import annotate_directory
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m medcat_service.batch",
+                                     description="Annotates the JSONL, CSV and Parquet files of a directory "
+                                                 "into sharded JSONL or Parquet files, resuming interrupted runs.")
+    parser.add_argument("input_dir", help="directory with the input files (searched recursively)")
+    parser.add_argument("output_dir", help="directory where the output shards and the checkpoint are written")
+    parser.add_argument("--nproc", type=int, default=None,
+                        help="number of worker processes (default: APP_BULK_NPROC or 8)")
+    parser.add_argument("--shard-size", type=int, default=1000, help="documents per output shard (default: 1000)")
+    parser.add_argument("--text-field", default="text", help="field / column with the document text")
+    parser.add_argument("--id-field", default="id", help="field / column with the document id")
+    parser.add_argument("--include-text", action="store_true", help="include the document text in the output")
+    parser.add_argument("--output-format", choices=["jsonl", "parquet"], default="jsonl",
+                        help="jsonl: one line per document, parquet: one row per entity (default: jsonl)")
+    parser.add_argument("--no-count", action="store_true",
+                        help="do not count the input documents beforehand (no ETA is reported)")
+    parser.add_argument("--progress-interval", type=int, default=10, help="seconds between progress reports")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="[%(asctime)s] [%(levelname)s] %(name)s: %(message)s", level=logging.INFO)
+
+    annotate_directory(args.input_dir, args.output_dir, nproc=args.nproc, shard_size=args.shard_size,
+                       text_field=args.text_field, id_field=args.id_field, include_text=args.include_text,
+                       count_docs=not args.no_count, progress_interval=args.progress_interval,
+                       output_format=args.output_format)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
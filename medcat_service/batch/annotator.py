@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import simplejson as json
+
+from medcat_service.batch.readers import count_documents, list_input_files, read_documents
+from medcat_service.utils.arrow_results import EntityBatchBuilder, is_arrow_available, write_parquet
+
+log = logging.getLogger("BatchAnnotator")
+log.setLevel(level=os.getenv("APP_LOG_LEVEL", logging.INFO))
+
+# processor shared with the forked workers, so that the model is loaded only once
+_processor = None
+
+
+class Checkpoint:
+    """
+    Append-only log of the output shards written so far, used to resume an interrupted run. Shards are written
+    to a temporary file and renamed once complete, so a shard listed in the log is always complete on disk.
+    """
+
+    FILE_NAME = "checkpoint.jsonl"
+
+    def __init__(self, output_dir, shard_size, output_format="jsonl"):
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.path = os.path.join(output_dir, Checkpoint.FILE_NAME)
+        self.completed = {}
+
+        if os.path.exists(self.path):
+            self._load(shard_size)
+        else:
+            self._append({"shard_size": shard_size})
+
+    def is_completed(self, shard_name):
+        return shard_name in self.completed and \
+            os.path.exists(get_shard_path(self.output_dir, shard_name, self.output_format))
+
+    def add(self, shard_name, docs, chars):
+        """Records a completed shard.
+
+        Args:
+            shard_name (str): Shard name.
+            docs (int): Number of documents in the shard.
+            chars (int): Number of characters in the shard.
+        """
+        self.completed[shard_name] = {"docs": docs, "chars": chars}
+        self._append({"shard": shard_name, "docs": docs, "chars": chars})
+
+    def get_totals(self):
+        """Returns the number of documents and characters of the completed shards.
+
+        Returns:
+            tuple: (docs, chars)
+        """
+        completed = [shard for name, shard in self.completed.items() if self.is_completed(name)]
+        return sum(shard["docs"] for shard in completed), sum(shard["chars"] for shard in completed)
+
+    def _load(self, shard_size):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line may be truncated when the run was killed while writing it
+                    continue
+                if "shard_size" in entry and entry["shard_size"] != shard_size:
+                    raise ValueError("The checkpoint in %s was created with a shard size of %d, cannot resume "
+                                     "with a shard size of %d" % (self.output_dir, entry["shard_size"], shard_size))
+                if "shard" in entry:
+                    self.completed[entry["shard"]] = {"docs": entry["docs"], "chars": entry["chars"]}
+
+    def _append(self, entry):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class Progress:
+    """
+    Tracks the throughput of the run and logs the processed documents, docs/sec, chars/sec and ETA.
+    """
+
+    def __init__(self, total_docs=None, done_docs=0, interval=10):
+        self.total_docs = total_docs
+        self.done_docs = done_docs
+        self.interval = interval
+        self.docs = 0
+        self.chars = 0
+        self.start_time = time.monotonic()
+        self._last_log_time = self.start_time
+
+    def update(self, docs, chars):
+        self.docs += docs
+        self.chars += chars
+        if time.monotonic() - self._last_log_time >= self.interval:
+            self.log()
+
+    def get_stats(self):
+        """Returns the throughput of the run.
+
+        Returns:
+            dict: Total "docs" done (including the ones of a previous run), "processed_docs" and "chars" in this
+                run, "docs_per_sec", "chars_per_sec" and "eta_sec" (None when the total number of documents
+                is unknown).
+        """
+        elapsed = max(time.monotonic() - self.start_time, 1e-9)
+        docs_per_sec = self.docs / elapsed
+        eta_sec = None
+        if self.total_docs is not None and docs_per_sec > 0:
+            eta_sec = max(0, self.total_docs - self.done_docs - self.docs) / docs_per_sec
+        return {"docs": self.done_docs + self.docs,
+                "processed_docs": self.docs,
+                "chars": self.chars,
+                "elapsed_sec": elapsed,
+                "docs_per_sec": docs_per_sec,
+                "chars_per_sec": self.chars / elapsed,
+                "eta_sec": eta_sec}
+
+    def log(self):
+        self._last_log_time = time.monotonic()
+        stats = self.get_stats()
+        total = "/%d" % self.total_docs if self.total_docs is not None else ""
+        eta = time.strftime("%H:%M:%S", time.gmtime(stats["eta_sec"])) if stats["eta_sec"] is not None else "unknown"
+        log.info("Processed %d%s docs, %.1f docs/sec, %.0f chars/sec, ETA %s",
+                 stats["docs"], total, stats["docs_per_sec"], stats["chars_per_sec"], eta)
+
+
+def annotate_directory(input_dir, output_dir, processor=None, nproc=None, shard_size=1000, text_field="text",
+                       id_field="id", include_text=False, count_docs=True, progress_interval=10,
+                       output_format="jsonl"):
+    """Annotates all the JSONL, CSV and Parquet files of the input directory, writing the results as JSONL
+    shards of `shard_size` documents to the output directory. Each output line holds the document "id" and the
+    same fields as returned by `/api/process`. With the "parquet" output format, the shards are Parquet files
+    instead, with one row per entity (see `EntityBatchBuilder`). Completed shards are checkpointed, so that
+    running it again with the same arguments resumes an interrupted run.
+
+    Args:
+        input_dir (str): Input directory.
+        output_dir (str): Output directory.
+        processor (MedCatProcessor, optional): Processor used for the annotations, created from the env
+            variables when not provided. Defaults to None.
+        nproc (int, optional): Number of worker processes. Defaults to APP_BULK_NPROC.
+        shard_size (int): Number of documents per output shard. Defaults to 1000.
+        text_field (str): Name of the field / column holding the document text. Defaults to "text".
+        id_field (str): Name of the field / column holding the document id. Defaults to "id".
+        include_text (bool): Whether to include the document text in the output. Defaults to False.
+        count_docs (bool): Whether to count the input documents first, to report the ETA. Defaults to True.
+        progress_interval (int): Seconds between progress reports. Defaults to 10.
+        output_format (str): "jsonl" or "parquet". Defaults to "jsonl".
+
+    Returns:
+        dict: Throughput stats of the run, as returned by `Progress.get_stats`.
+    """
+    global _processor
+
+    if output_format not in ("jsonl", "parquet"):
+        raise ValueError("The output format should be jsonl or parquet, got: %s" % output_format)
+    if output_format == "parquet" and not is_arrow_available():
+        raise ImportError("pyarrow is required for the parquet output format, install it with: pip install pyarrow")
+
+    nproc = nproc or int(os.getenv("APP_BULK_NPROC", 8))
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint = Checkpoint(output_dir, shard_size, output_format)
+
+    input_files = list_input_files(input_dir)
+    log.info("Found %d input files in %s", len(input_files), input_dir)
+
+    total_docs = sum(count_documents(os.path.join(input_dir, f)) for f in input_files) if count_docs else None
+    done_docs, _ = checkpoint.get_totals()
+    if done_docs > 0:
+        log.info("Resuming from checkpoint, %d docs already processed", done_docs)
+    progress = Progress(total_docs, done_docs, progress_interval)
+
+    if processor is None:
+        from medcat_service.nlp_processor import MedCatProcessor
+        processor = MedCatProcessor()
+    _processor = processor
+
+    def complete(futures):
+        for future in futures:
+            shard_name, docs, chars = future.result()
+            checkpoint.add(shard_name, docs, chars)
+            progress.update(docs, chars)
+
+    # the workers are forked once the model is loaded, the number of shards in flight is bounded
+    # so that the input is streamed rather than read at once
+    mp_context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=nproc, mp_context=mp_context, initializer=_init_worker) as executor:
+        pending = set()
+        for shard_name, documents in _generate_shards(input_dir, input_files, shard_size, text_field, id_field):
+            if checkpoint.is_completed(shard_name):
+                continue
+            if len(pending) >= 2 * nproc:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                complete(done)
+            pending.add(executor.submit(_annotate_shard, shard_name, documents,
+                                        get_shard_path(output_dir, shard_name, output_format), include_text))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            complete(done)
+
+    progress.log()
+    return progress.get_stats()
+
+
+def get_shard_path(output_dir, shard_name, output_format="jsonl"):
+    return os.path.join(output_dir, shard_name + "." + output_format)
+
+
+def _generate_shards(input_dir, input_files, shard_size, text_field, id_field):
+    """Generator function splitting the documents of the input files into consecutive shards.
+
+    Yields:
+        tuple: Consecutive tuples of (shard_name, documents), the shard name being derived from the input file
+            path and the shard index within the file.
+    """
+    for input_file in input_files:
+        file_stem = os.path.splitext(input_file)[0].replace(os.sep, "__")
+        shard_index, documents = 0, []
+        for document in read_documents(os.path.join(input_dir, input_file), text_field, id_field):
+            documents.append(document)
+            if len(documents) == shard_size:
+                yield "%s-%06d" % (file_stem, shard_index), documents
+                shard_index, documents = shard_index + 1, []
+        if documents:
+            yield "%s-%06d" % (file_stem, shard_index), documents
+
+
+def _init_worker():
+    """Initialises a worker process: the workers share the CPUs, each one running torch (and the BLAS / OpenMP
+    libraries it uses) with APP_BULK_TORCH_THREADS threads, or a single thread, rather than the thread count
+    inherited from the parent. The documents are annotated in a single pass by each worker, the pool annotating
+    the segments of long documents inherited from the parent being dropped.
+    """
+    import torch
+    torch.set_num_threads(_processor.bulk_torch_threads if _processor.bulk_torch_threads > 0 else 1)
+    _processor.segment_pool = None
+
+
+def _annotate_shard(shard_name, documents, output_path, include_text):
+    """Annotates the documents of a shard in a worker process and writes them to the shard output file.
+
+    Returns:
+        tuple: (shard_name, docs, chars)
+    """
+    chars = sum(len(text) for _, text in documents if isinstance(text, str))
+    tmp_path = output_path + ".tmp"
+    results = (_annotate_document(text) for _, text in documents)
+
+    if output_path.endswith(".parquet"):
+        # the entities are built straight into record batches, the "doc_index" being the index within the shard
+        builder = EntityBatchBuilder(_processor.get_meta_tasks(), with_doc_id=True)
+        write_parquet(builder.build_batches(results, [doc_id for doc_id, _ in documents]), builder.schema, tmp_path)
+    else:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for (doc_id, _), result in zip(documents, results):
+                if not include_text:
+                    result.pop("text", None)
+                f.write(json.dumps({"id": doc_id, **result}, iterable_as_array=True) + "\n")
+    os.replace(tmp_path, output_path)
+    return shard_name, len(documents), chars
+
+
+def _annotate_document(text):
+    """Annotates a single document in a worker process, a malformed document whose text is not a string being
+    reported as a failed document rather than aborting the run.
+
+    Returns:
+        dict: Processing result of the document.
+    """
+    if text is not None and not isinstance(text, str):
+        return {
+            "success": False,
+            "errors": ["'text' field should be a string, got: %s" % type(text).__name__],
+            "timestamp": _processor._get_timestamp(),
+        }
+    return _processor.process_content({"text": text} if text is not None else {})
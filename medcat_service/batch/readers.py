@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import csv
+import os
+import sys
+
+import simplejson as json
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+JSONL_EXTENSIONS = (".jsonl", ".ndjson")
+CSV_EXTENSIONS = (".csv",)
+PARQUET_EXTENSIONS = (".parquet",)
+SUPPORTED_EXTENSIONS = JSONL_EXTENSIONS + CSV_EXTENSIONS + PARQUET_EXTENSIONS
+
+# number of rows read at once from parquet files
+PARQUET_BATCH_SIZE = 1024
+
+# clinical notes can easily exceed the default csv field size limit (128KB)
+csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+
+def list_input_files(input_dir):
+    """Lists the supported input files (JSONL, CSV, Parquet) found in the input directory and its subdirectories.
+
+    Args:
+        input_dir (str): Input directory.
+
+    Returns:
+        list: Sorted file paths, relative to the input directory.
+    """
+    input_files = []
+    for root, _, file_names in os.walk(input_dir):
+        for file_name in file_names:
+            if file_name.lower().endswith(SUPPORTED_EXTENSIONS):
+                input_files.append(os.path.relpath(os.path.join(root, file_name), input_dir))
+    return sorted(input_files)
+
+
+def read_documents(path, text_field="text", id_field="id"):
+    """Streams the documents of an input file, without loading the whole file in memory.
+
+    Args:
+        path (str): Path of a JSONL, CSV or Parquet file.
+        text_field (str): Name of the field / column holding the document text. Defaults to "text".
+        id_field (str): Name of the field / column holding the document id. Documents without one are identified
+            by their row number in the file. Defaults to "id".
+
+    Yields:
+        tuple: Consecutive tuples of (doc_id, text).
+    """
+    for row_number, record in enumerate(_read_records(path, [text_field, id_field])):
+        doc_id = record.get(id_field)
+        yield (doc_id if doc_id is not None else row_number), record.get(text_field)
+
+
+def count_documents(path):
+    """Counts the documents of an input file, reading the metadata only for Parquet files.
+
+    Args:
+        path (str): Path of a JSONL, CSV or Parquet file.
+
+    Returns:
+        int: Number of documents.
+    """
+    if path.lower().endswith(PARQUET_EXTENSIONS):
+        return _get_parquet_file(path).metadata.num_rows
+    if path.lower().endswith(JSONL_EXTENSIONS):
+        with open(path, "rb") as f:
+            return sum(1 for line in f if line.strip())
+    return sum(1 for _ in _read_records(path, []))
+
+
+def _read_records(path, columns):
+    lower_path = path.lower()
+    if lower_path.endswith(JSONL_EXTENSIONS):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    elif lower_path.endswith(CSV_EXTENSIONS):
+        with open(path, encoding="utf-8", newline="") as f:
+            yield from csv.DictReader(f)
+
+    elif lower_path.endswith(PARQUET_EXTENSIONS):
+        parquet_file = _get_parquet_file(path)
+        columns = [column for column in columns if column in parquet_file.schema_arrow.names]
+        for batch in parquet_file.iter_batches(batch_size=PARQUET_BATCH_SIZE, columns=columns or None):
+            yield from batch.to_pylist()
+
+    else:
+        raise ValueError("Unsupported input file: %s, expected one of %s" % (path, ", ".join(SUPPORTED_EXTENSIONS)))
+
+
+def _get_parquet_file(path):
+    if pq is None:
+        raise ImportError("pyarrow is required to read parquet files, install it with: pip install pyarrow")
+    return pq.ParquetFile(path)
@@ -0,0 +1,7 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .async_client import AsyncMedCATClient
+from .client import MedCATClient, MedCATClientError
+
+__all__ = ['MedCATClient', 'AsyncMedCATClient', 'MedCATClientError']
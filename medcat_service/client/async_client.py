@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from medcat_service.client.client import MedCATClient
+
+
+class AsyncMedCATClient:
+    """
+    asyncio client of the MedCAT service, sharing the batching, connection pool, back-pressure and retries of
+    `MedCATClient`: the documents are handed over to its dispatcher thread and awaited as futures, so that the
+    event loop is never blocked by the requests. Up to `max_pending_docs` documents can be awaited at once, the
+    next coroutines waiting for a slot.
+    """
+
+    def __init__(self, url="http://localhost:5000", max_pending_docs=10000, **kwargs):
+        """
+        Args:
+            url (str): URL of the service. Defaults to "http://localhost:5000".
+            max_pending_docs (int): Number of documents awaited at once. Defaults to 10000.
+            **kwargs: Other arguments of `MedCATClient`.
+        """
+        self._client = MedCATClient(url, max_pending_docs=max_pending_docs, **kwargs)
+        self._max_pending_docs = max_pending_docs
+        self._slots = None
+
+    @property
+    def client(self):
+        return self._client
+
+    async def process(self, document, meta_anns_filters=None):
+        """Processes a document, batched with the documents processed concurrently by other coroutines.
+
+        Args:
+            document (str | dict): Text, or document with a "text" field.
+            meta_anns_filters (list, optional): Meta-annotation filters, as pairs of task name and accepted values.
+                Defaults to None.
+
+        Returns:
+            dict: Processing result of the document.
+
+        Raises:
+            MedCATClientError: If the document could not be processed.
+        """
+        if meta_anns_filters is not None:
+            return await asyncio.get_running_loop().run_in_executor(None, self._client.process, document,
+                                                                    meta_anns_filters)
+        async with self._get_slots():
+            return await asyncio.wrap_future(self._client.submit(document))
+
+    async def process_bulk(self, documents):
+        """Processes documents, split into bulk requests sent concurrently.
+
+        Args:
+            documents (Iterable): Texts, or documents with a "text" field.
+
+        Returns:
+            list: Processing results, in the order of the documents.
+
+        Raises:
+            MedCATClientError: If a document could not be processed.
+        """
+        return list(await asyncio.gather(*[self.process(document) for document in documents]))
+
+    async def info(self):
+        """Returns the information of the service (/api/info).
+
+        Returns:
+            dict: Service information.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self._client.info)
+
+    def get_stats(self):
+        return self._client.get_stats()
+
+    async def close(self):
+        """Sends the queued documents, waits for the requests in flight and closes the connections."""
+        await asyncio.get_running_loop().run_in_executor(None, self._client.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _get_slots(self):
+        # created lazily, within the event loop of the client
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_pending_docs)
+        return self._slots
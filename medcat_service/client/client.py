@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gzip
+import io
+import logging
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+import simplejson as json
+from requests.adapters import HTTPAdapter
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore
+
+log = logging.getLogger("MedCATClient")
+
+# magic number of the zstd frames, the zstd responses being decoded by urllib3 with some versions only
+ZSTD_MAGIC_NUMBER = b"\x28\xb5\x2f\xfd"
+
+# statuses of the responses retried, the service (or a proxy in front of it) being overloaded or restarting
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class MedCATClientError(Exception):
+    """
+    Raised when a request to the service failed, after the retries when it was retryable
+    """
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _PendingDocument:
+    __slots__ = ("document", "chars", "future")
+
+    def __init__(self, document):
+        self.document = document
+        self.chars = len(document.get("text") or "")
+        self.future = Future()
+
+
+class MedCATClient:
+    """
+    Thread-safe client of the MedCAT service. The documents passed to `process` and `submit` are queued and
+    grouped into bulk requests by a dispatcher thread, a batch being sent once it reaches `max_batch_chars`
+    characters or `max_batch_docs` documents, or once its first document waited `max_batch_delay` seconds
+    (a batch of a single document being sent to /api/process). At most `max_in_flight` requests are sent
+    concurrently over a pool of keep-alive connections, the callers being blocked once `max_pending_docs`
+    documents are queued (back-pressure). Request bodies are compressed, and the requests failing with
+    429 / 502 / 503 / 504 or a connection error are retried with exponential backoff and full jitter,
+    honouring the Retry-After header.
+    """
+
+    def __init__(self, url="http://localhost:5000", max_batch_chars=200000, max_batch_docs=1000,
+                 max_batch_delay=0.01, max_in_flight=4, max_pending_docs=10000, timeout=300, retries=3,
+                 backoff=0.5, max_backoff=30, compression="gzip", compress_min_bytes=1024):
+        """
+        Args:
+            url (str): URL of the service. Defaults to "http://localhost:5000".
+            max_batch_chars (int): Number of characters per bulk request. Defaults to 200000.
+            max_batch_docs (int): Number of documents per bulk request. Defaults to 1000.
+            max_batch_delay (float): Time (in seconds) a document waits for more documents to be batched with.
+                Defaults to 0.01.
+            max_in_flight (int): Number of requests sent concurrently. Defaults to 4.
+            max_pending_docs (int): Number of documents queued before the callers are blocked. Defaults to 10000.
+            timeout (float): Timeout (in seconds) of each request. Defaults to 300.
+            retries (int): Number of retries of a failed request. Defaults to 3.
+            backoff (float): Base delay (in seconds) of the exponential backoff between retries. Defaults to 0.5.
+            max_backoff (float): Max delay (in seconds) between retries. Defaults to 30.
+            compression (str): Encoding of the requests and responses, "gzip", "zstd" or None. Defaults to "gzip".
+            compress_min_bytes (int): Size of the request bodies from which they are compressed. Defaults to 1024.
+
+        Raises:
+            ValueError: If the compression is not supported.
+        """
+        if compression not in (None, "gzip", "zstd"):
+            raise ValueError("The compression should be one of: gzip, zstd or None, got: %s" % compression)
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("The zstd compression is not available, zstandard is not installed")
+
+        self.url = url.rstrip("/")
+        self.max_batch_chars = max_batch_chars
+        self.max_batch_docs = max_batch_docs
+        self.max_batch_delay = max_batch_delay
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=max_in_flight))
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=max_in_flight))
+
+        self._queue = queue.Queue(maxsize=max_pending_docs)
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="medcat-client")
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "bulk_requests": 0, "documents": 0, "retries": 0, "errors": 0}
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch, name="medcat-client-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, document):
+        """Queues a document to be processed in the next bulk request, blocking while the queue is full.
+
+        Args:
+            document (str | dict): Text, or document with a "text" field (and optionally a "footer").
+
+        Returns:
+            Future: The future result of the document, failing with a MedCATClientError if it could not be
+                processed.
+
+        Raises:
+            RuntimeError: If the client is closed.
+        """
+        if self._closed:
+            raise RuntimeError("The client is closed")
+        pending = _PendingDocument(document if isinstance(document, dict) else {"text": document})
+        self._queue.put(pending)
+        return pending.future
+
+    def process(self, document, meta_anns_filters=None):
+        """Processes a document, batched with the documents processed concurrently by other threads.
+
+        Args:
+            document (str | dict): Text, or document with a "text" field.
+            meta_anns_filters (list, optional): Meta-annotation filters, as pairs of task name and accepted values.
+                The documents with filters are sent right away to /api/process. Defaults to None.
+
+        Returns:
+            dict: Processing result of the document.
+
+        Raises:
+            MedCATClientError: If the document could not be processed.
+        """
+        if meta_anns_filters is not None:
+            content = {"content": document if isinstance(document, dict) else {"text": document},
+                       "meta_anns_filters": meta_anns_filters}
+            with self._in_flight:
+                return self._request("POST", "/api/process", content, num_docs=1)["result"]
+        return self.submit(document).result()
+
+    def process_bulk(self, documents):
+        """Processes documents, split into bulk requests sent concurrently.
+
+        Args:
+            documents (Iterable): Texts, or documents with a "text" field.
+
+        Returns:
+            list: Processing results, in the order of the documents.
+
+        Raises:
+            MedCATClientError: If a document could not be processed.
+        """
+        futures = [self.submit(document) for document in documents]
+        return [future.result() for future in futures]
+
+    def info(self):
+        """Returns the information of the service (/api/info).
+
+        Returns:
+            dict: Service information.
+        """
+        with self._in_flight:
+            return self._request("GET", "/api/info")
+
+    def get_stats(self):
+        """Returns the number of requests (all and bulk ones), documents, retries and failed requests.
+
+        Returns:
+            dict: Counters of the client.
+        """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def close(self):
+        """Sends the queued documents, waits for the requests in flight and closes the connections."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _dispatch(self):
+        carried = None
+        while True:
+            pending = carried if carried is not None else self._queue.get()
+            carried = None
+            if pending is None:
+                return
+
+            batch, chars = [pending], pending.chars
+            flush_time = time.monotonic() + self.max_batch_delay
+            closing = False
+            while chars < self.max_batch_chars and len(batch) < self.max_batch_docs:
+                try:
+                    pending = self._queue.get(timeout=max(0.0, flush_time - time.monotonic()))
+                except queue.Empty:
+                    break
+                if pending is None:
+                    closing = True
+                    break
+                if chars + pending.chars > self.max_batch_chars:
+                    carried = pending
+                    break
+                batch.append(pending)
+                chars += pending.chars
+
+            # the cancelled documents are not sent
+            batch = [pending for pending in batch if pending.future.set_running_or_notify_cancel()]
+            if batch:
+                self._in_flight.acquire()
+                self._executor.submit(self._send_batch, batch)
+            if closing:
+                return
+
+    def _send_batch(self, batch):
+        try:
+            if len(batch) == 1:
+                results = [self._request("POST", "/api/process", {"content": batch[0].document}, num_docs=1)["result"]]
+            else:
+                results = self._request("POST", "/api/process_bulk",
+                                        {"content": [pending.document for pending in batch]},
+                                        num_docs=len(batch))["result"]
+            if len(results) != len(batch):
+                raise MedCATClientError("The service returned %d results for %d documents" %
+                                        (len(results), len(batch)))
+            for pending, result in zip(batch, results):
+                pending.future.set_result(result)
+        except Exception as e:
+            for pending in batch:
+                pending.future.set_exception(e)
+        finally:
+            self._in_flight.release()
+
+    def _request(self, method, path, payload=None, num_docs=0):
+        headers = {"Accept-Encoding": self.compression or "identity"}
+        body = None
+        if payload is not None:
+            body = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+            if self.compression is not None and len(body) >= self.compress_min_bytes:
+                body = gzip.compress(body) if self.compression == "gzip" else \
+                    zstandard.ZstdCompressor().compress(body)
+                headers["Content-Encoding"] = self.compression
+        self._count(requests=1, bulk_requests=int(path == "/api/process_bulk"), documents=num_docs)
+
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            try:
+                response = self.session.request(method, self.url + path, data=body, headers=headers,
+                                                timeout=self.timeout)
+            except requests.ConnectionError as e:
+                error = MedCATClientError("Connection error: %r" % e)
+            except requests.RequestException as e:
+                self._count(errors=1)
+                raise MedCATClientError("Request failed: %r" % e) from e
+            else:
+                if response.status_code == 200:
+                    return json.loads(_get_content(response))
+                error = MedCATClientError("HTTP %d %s" % (response.status_code, response.text[:200]),
+                                          status_code=response.status_code)
+                if response.status_code not in RETRY_STATUSES:
+                    self._count(errors=1)
+                    raise error
+                retry_after = _get_retry_after(response)
+
+            if attempt == self.retries:
+                self._count(errors=1)
+                raise error
+            delay = self._get_backoff(attempt, retry_after)
+            log.warning("Request to %s failed (%s), retrying in %.2fs", path, error, delay)
+            self._count(retries=1)
+            time.sleep(delay)
+
+    def _get_backoff(self, attempt, retry_after=None):
+        # full jitter, so that the clients throttled at the same time do not retry at the same time
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        return max(delay, retry_after) if retry_after is not None else delay
+
+    def _count(self, **counts):
+        with self._stats_lock:
+            for name, count in counts.items():
+                self._stats[name] += count
+
+
+def _get_content(response):
+    content = response.content
+    if response.headers.get("Content-Encoding", "").strip().lower() == "zstd" and \
+            content.startswith(ZSTD_MAGIC_NUMBER):
+        with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(content), read_across_frames=True) as reader:
+            content = reader.read()
+    return content
+
+
+def _get_retry_after(response):
+    # only the delay-seconds form, the HTTP-date form being ignored
+    try:
+        return max(0.0, float(response.headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,13 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+# the bulk processing forks worker processes from the threads serving the RPCs, the gRPC fork handlers
+# then leave the workers in an inconsistent state, so they are disabled (read when grpc is first imported)
+os.environ.setdefault("GRPC_ENABLE_FORK_SUPPORT", "false")
+
+from .server import create_server  # noqa: E402
+from .servicer import MedCatServicer  # noqa: E402
+
+__all__ = ['MedCatServicer', 'create_server']
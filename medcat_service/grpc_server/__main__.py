@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Runs the gRPC server of the MedCAT service, configured with the same env variables as the HTTP service:
+
+    python -m medcat_service.grpc_server
+"""
+import logging
+import signal
+
+from medcat_service.grpc_server.server import create_server
+
+
+def main():
+    logging.basicConfig(format="[%(asctime)s] [%(levelname)s] %(name)s: %(message)s", level=logging.INFO)
+
+    server, _ = create_server()
+    server.start()
+
+    # let the RPCs in progress complete on shutdown
+    signal.signal(signal.SIGTERM, lambda *_: server.stop(grace=30))
+    server.wait_for_termination()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import simplejson as json
+from google.protobuf.json_format import MessageToDict
+
+from medcat_service.grpc_server import medcat_service_pb2 as pb2
+from medcat_service.utils.arrow_results import iter_entities
+
+# entity fields mapped onto the typed fields of the Entity message, any other field goes to "extra"
+ENTITY_FIELDS = {"id", "cui", "pretty_name", "source_value", "detected_name", "start", "end", "acc",
+                 "context_similarity", "type_ids", "types", "meta_anns"}
+
+
+def document_to_content(document):
+    """Converts a Document message to the content dict expected by the NLP processor.
+
+    Args:
+        document (pb2.Document): Document message.
+
+    Returns:
+        dict: Content with the "text" and, when set, "footer" fields.
+    """
+    content = {"text": document.text}
+    if document.HasField("footer"):
+        content["footer"] = MessageToDict(document.footer)
+    return content
+
+
+def filters_to_meta_anns_filters(filters):
+    """Converts the MetaAnnotationsFilter messages to the meta_anns_filters expected by the NLP processor.
+
+    Returns:
+        list: List of (task, filter values) pairs.
+    """
+    return [(f.task, list(f.values)) for f in filters]
+
+
+def info_to_message(app_info):
+    """Converts the application info returned by the NLP processor to an InfoResponse message."""
+    message = pb2.InfoResponse(service_app_name=str(app_info.get("service_app_name", "")),
+                               service_language=str(app_info.get("service_language", "")),
+                               service_version=str(app_info.get("service_version", "")),
+                               service_model=str(app_info.get("service_model", "")))
+    message.model_card_info.update(_to_json_compatible(app_info.get("model_card_info", {})))
+    return message
+
+
+def result_to_message(result, doc_id="", meta_anns_filters=None):
+    """Converts a processing result of the NLP processor to a ProcessResult message.
+
+    Args:
+        result (dict): Processing result, as returned by `process_content` / `process_content_bulk`.
+        doc_id (str): Document id. Defaults to "".
+        meta_anns_filters (list, optional): List of (task, filter values) pairs the entities are filtered by.
+            Defaults to None.
+
+    Returns:
+        pb2.ProcessResult: Result message.
+    """
+    message = pb2.ProcessResult(id=doc_id,
+                                text=str(result.get("text", "")),
+                                success=bool(result.get("success", False)),
+                                errors=[str(error) for error in result.get("errors", [])]
+                                + ([str(result.get("deferred_reason"))] if result.get("deferred") else []),
+                                timestamp=str(result.get("timestamp", "")),
+                                elapsed_time=float(result.get("elapsed_time", 0)))
+
+    for entity in iter_entities(result.get("annotations", [])):
+        if meta_anns_filters and not all(entity.get("meta_anns", {}).get(task, {}).get("value") in filter_values
+                                         for task, filter_values in meta_anns_filters):
+            continue
+        message.entities.append(entity_to_message(entity))
+
+    if result.get("footer") is not None:
+        message.footer.update(_to_json_compatible(result["footer"]))
+    return message
+
+
+def entity_to_message(entity):
+    """Converts a MedCAT entity to an Entity message.
+
+    Args:
+        entity (dict): MedCAT entity.
+
+    Returns:
+        pb2.Entity: Entity message.
+    """
+    message = pb2.Entity(id=int(entity.get("id", 0)),
+                         cui=str(entity.get("cui", "")),
+                         pretty_name=str(entity.get("pretty_name", "")),
+                         source_value=str(entity.get("source_value", "")),
+                         detected_name=str(entity.get("detected_name", "")),
+                         start=int(entity.get("start", 0)),
+                         end=int(entity.get("end", 0)),
+                         acc=float(entity.get("acc", 0)),
+                         context_similarity=float(entity.get("context_similarity", 0)),
+                         type_ids=[str(type_id) for type_id in entity.get("type_ids", [])],
+                         types=[str(entity_type) for entity_type in entity.get("types", [])])
+
+    for task, meta_ann in entity.get("meta_anns", {}).items():
+        message.meta_anns[task].CopyFrom(pb2.MetaAnnotation(name=str(meta_ann.get("name", task)),
+                                                            value=str(meta_ann.get("value", "")),
+                                                            confidence=float(meta_ann.get("confidence", 0))))
+
+    extra = {key: value for key, value in entity.items() if key not in ENTITY_FIELDS}
+    if extra:
+        message.extra.update(_to_json_compatible(extra))
+    return message
+
+
+def _to_json_compatible(value):
+    return json.loads(json.dumps(value, iterable_as_array=True, default=str))
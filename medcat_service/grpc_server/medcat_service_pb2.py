@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: medcat_service/grpc_server/medcat_service.proto
+# Protobuf Python Version: 7.35.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    7,
+    35,
+    1,
+    '',
+    'medcat_service/grpc_server/medcat_service.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+from google.protobuf import struct_pb2 as google_dot_protobuf_dot_struct__pb2
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n/medcat_service/grpc_server/medcat_service.proto\x12\x0emedcat_service\x1a\x1cgoogle/protobuf/struct.proto\"M\n\x08\x44ocument\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04text\x18\x02 \x01(\t\x12\'\n\x06\x66ooter\x18\x03 \x01(\x0b\x32\x17.google.protobuf.Struct\"5\n\x15MetaAnnotationsFilter\x12\x0c\n\x04task\x18\x01 \x01(\t\x12\x0e\n\x06values\x18\x02 \x03(\t\"A\n\x0eMetaAnnotation\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\t\x12\x12\n\nconfidence\x18\x03 \x01(\x01\"\xfb\x02\n\x06\x45ntity\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x0b\n\x03\x63ui\x18\x02 \x01(\t\x12\x13\n\x0bpretty_name\x18\x03 \x01(\t\x12\x14\n\x0csource_value\x18\x04 \x01(\t\x12\x15\n\rdetected_name\x18\x05 \x01(\t\x12\r\n\x05start\x18\x06 \x01(\x05\x12\x0b\n\x03\x65nd\x18\x07 \x01(\x05\x12\x0b\n\x03\x61\x63\x63\x18\x08 \x01(\x01\x12\x1a\n\x12\x63ontext_similarity\x18\t \x01(\x01\x12\x10\n\x08type_ids\x18\n \x03(\t\x12\r\n\x05types\x18\x0b \x03(\t\x12\x37\n\tmeta_anns\x18\x0c \x03(\x0b\x32$.medcat_service.Entity.MetaAnnsEntry\x12&\n\x05\x65xtra\x18\r \x01(\x0b\x32\x17.google.protobuf.Struct\x1aO\n\rMetaAnnsEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12-\n\x05value\x18\x02 \x01(\x0b\x32\x1e.medcat_service.MetaAnnotation:\x02\x38\x01\"~\n\x0eProcessRequest\x12*\n\x08\x64ocument\x18\x01 \x01(\x0b\x32\x18.medcat_service.Document\x12@\n\x11meta_anns_filters\x18\x02 \x03(\x0b\x32%.medcat_service.MetaAnnotationsFilter\"\xc6\x01\n\rProcessResult\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04text\x18\x02 \x01(\t\x12(\n\x08\x65ntities\x18\x03 \x03(\x0b\x32\x16.medcat_service.Entity\x12\x0f\n\x07success\x18\x04 \x01(\x08\x12\x0e\n\x06\x65rrors\x18\x05 \x03(\t\x12\x11\n\ttimestamp\x18\x06 \x01(\t\x12\x14\n\x0c\x65lapsed_time\x18\x07 \x01(\x01\x12\'\n\x06\x66ooter\x18\x08 \x01(\x0b\x32\x17.google.protobuf.Struct\"s\n\x0fProcessResponse\x12-\n\x06result\x18\x01 \x01(\x0b\x32\x1d.medcat_service.ProcessResult\x12\x31\n\x0bmedcat_info\x18\x02 \x01(\x0b\x32\x1c.medcat_service.InfoResponse\"A\n\x12ProcessBulkRequest\x12+\n\tdocuments\x18\x01 \x03(\x0b\x32\x18.medcat_service.Document\"x\n\x13ProcessBulkResponse\x12.\n\x07results\x18\x01 \x03(\x0b\x32\x1d.medcat_service.ProcessResult\x12\x31\n\x0bmedcat_info\x18\x02 \x01(\x0b\x32\x1c.medcat_service.InfoResponse\"\r\n\x0bInfoRequest\"\xa4\x01\n\x0cInfoResponse\x12\x18\n\x10service_app_name\x18\x01 \x01(\t\x12\x18\n\x10service_language\x18\x02 \x01(\t\x12\x17\n\x0fservice_version\x18\x03 \x01(\t\x12\x15\n\rservice_model\x18\x04 \x01(\t\x12\x30\n\x0fmodel_card_info\x18\x05 \x01(\x0b\x32\x17.google.protobuf.Struct2\xc5\x02\n\x06MedCat\x12\x41\n\x04Info\x12\x1b.medcat_service.InfoRequest\x1a\x1c.medcat_service.InfoResponse\x12J\n\x07Process\x12\x1e.medcat_service.ProcessRequest\x1a\x1f.medcat_service.ProcessResponse\x12V\n\x0bProcessBulk\x12\".medcat_service.ProcessBulkRequest\x1a#.medcat_service.ProcessBulkResponse\x12T\n\rProcessStream\x12\x1e.medcat_service.ProcessRequest\x1a\x1f.medcat_service.ProcessResponse(\x01\x30\x01\x62\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'medcat_service.grpc_server.medcat_service_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_ENTITY_METAANNSENTRY']._loaded_options = None
+  _globals['_ENTITY_METAANNSENTRY']._serialized_options = b'8\001'
+  _globals['_DOCUMENT']._serialized_start=97
+  _globals['_DOCUMENT']._serialized_end=174
+  _globals['_METAANNOTATIONSFILTER']._serialized_start=176
+  _globals['_METAANNOTATIONSFILTER']._serialized_end=229
+  _globals['_METAANNOTATION']._serialized_start=231
+  _globals['_METAANNOTATION']._serialized_end=296
+  _globals['_ENTITY']._serialized_start=299
+  _globals['_ENTITY']._serialized_end=678
+  _globals['_ENTITY_METAANNSENTRY']._serialized_start=599
+  _globals['_ENTITY_METAANNSENTRY']._serialized_end=678
+  _globals['_PROCESSREQUEST']._serialized_start=680
+  _globals['_PROCESSREQUEST']._serialized_end=806
+  _globals['_PROCESSRESULT']._serialized_start=809
+  _globals['_PROCESSRESULT']._serialized_end=1007
+  _globals['_PROCESSRESPONSE']._serialized_start=1009
+  _globals['_PROCESSRESPONSE']._serialized_end=1124
+  _globals['_PROCESSBULKREQUEST']._serialized_start=1126
+  _globals['_PROCESSBULKREQUEST']._serialized_end=1191
+  _globals['_PROCESSBULKRESPONSE']._serialized_start=1193
+  _globals['_PROCESSBULKRESPONSE']._serialized_end=1313
+  _globals['_INFOREQUEST']._serialized_start=1315
+  _globals['_INFOREQUEST']._serialized_end=1328
+  _globals['_INFORESPONSE']._serialized_start=1331
+  _globals['_INFORESPONSE']._serialized_end=1495
+  _globals['_MEDCAT']._serialized_start=1498
+  _globals['_MEDCAT']._serialized_end=1823
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,141 @@
+from google.protobuf import struct_pb2 as _struct_pb2
+from google.protobuf.internal import containers as _containers
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import message as _message
+from collections.abc import Iterable as _Iterable, Mapping as _Mapping
+from typing import ClassVar as _ClassVar, Optional as _Optional, Union as _Union
+
+DESCRIPTOR: _descriptor.FileDescriptor
+
+class Document(_message.Message):
+    __slots__ = ("id", "text", "footer")
+    ID_FIELD_NUMBER: _ClassVar[int]
+    TEXT_FIELD_NUMBER: _ClassVar[int]
+    FOOTER_FIELD_NUMBER: _ClassVar[int]
+    id: str
+    text: str
+    footer: _struct_pb2.Struct
+    def __init__(self, id: _Optional[str] = ..., text: _Optional[str] = ..., footer: _Optional[_Union[_struct_pb2.Struct, _Mapping]] = ...) -> None: ...
+
+class MetaAnnotationsFilter(_message.Message):
+    __slots__ = ("task", "values")
+    TASK_FIELD_NUMBER: _ClassVar[int]
+    VALUES_FIELD_NUMBER: _ClassVar[int]
+    task: str
+    values: _containers.RepeatedScalarFieldContainer[str]
+    def __init__(self, task: _Optional[str] = ..., values: _Optional[_Iterable[str]] = ...) -> None: ...
+
+class MetaAnnotation(_message.Message):
+    __slots__ = ("name", "value", "confidence")
+    NAME_FIELD_NUMBER: _ClassVar[int]
+    VALUE_FIELD_NUMBER: _ClassVar[int]
+    CONFIDENCE_FIELD_NUMBER: _ClassVar[int]
+    name: str
+    value: str
+    confidence: float
+    def __init__(self, name: _Optional[str] = ..., value: _Optional[str] = ..., confidence: _Optional[float] = ...) -> None: ...
+
+class Entity(_message.Message):
+    __slots__ = ("id", "cui", "pretty_name", "source_value", "detected_name", "start", "end", "acc", "context_similarity", "type_ids", "types", "meta_anns", "extra")
+    class MetaAnnsEntry(_message.Message):
+        __slots__ = ("key", "value")
+        KEY_FIELD_NUMBER: _ClassVar[int]
+        VALUE_FIELD_NUMBER: _ClassVar[int]
+        key: str
+        value: MetaAnnotation
+        def __init__(self, key: _Optional[str] = ..., value: _Optional[_Union[MetaAnnotation, _Mapping]] = ...) -> None: ...
+    ID_FIELD_NUMBER: _ClassVar[int]
+    CUI_FIELD_NUMBER: _ClassVar[int]
+    PRETTY_NAME_FIELD_NUMBER: _ClassVar[int]
+    SOURCE_VALUE_FIELD_NUMBER: _ClassVar[int]
+    DETECTED_NAME_FIELD_NUMBER: _ClassVar[int]
+    START_FIELD_NUMBER: _ClassVar[int]
+    END_FIELD_NUMBER: _ClassVar[int]
+    ACC_FIELD_NUMBER: _ClassVar[int]
+    CONTEXT_SIMILARITY_FIELD_NUMBER: _ClassVar[int]
+    TYPE_IDS_FIELD_NUMBER: _ClassVar[int]
+    TYPES_FIELD_NUMBER: _ClassVar[int]
+    META_ANNS_FIELD_NUMBER: _ClassVar[int]
+    EXTRA_FIELD_NUMBER: _ClassVar[int]
+    id: int
+    cui: str
+    pretty_name: str
+    source_value: str
+    detected_name: str
+    start: int
+    end: int
+    acc: float
+    context_similarity: float
+    type_ids: _containers.RepeatedScalarFieldContainer[str]
+    types: _containers.RepeatedScalarFieldContainer[str]
+    meta_anns: _containers.MessageMap[str, MetaAnnotation]
+    extra: _struct_pb2.Struct
+    def __init__(self, id: _Optional[int] = ..., cui: _Optional[str] = ..., pretty_name: _Optional[str] = ..., source_value: _Optional[str] = ..., detected_name: _Optional[str] = ..., start: _Optional[int] = ..., end: _Optional[int] = ..., acc: _Optional[float] = ..., context_similarity: _Optional[float] = ..., type_ids: _Optional[_Iterable[str]] = ..., types: _Optional[_Iterable[str]] = ..., meta_anns: _Optional[_Mapping[str, MetaAnnotation]] = ..., extra: _Optional[_Union[_struct_pb2.Struct, _Mapping]] = ...) -> None: ...
+
+class ProcessRequest(_message.Message):
+    __slots__ = ("document", "meta_anns_filters")
+    DOCUMENT_FIELD_NUMBER: _ClassVar[int]
+    META_ANNS_FILTERS_FIELD_NUMBER: _ClassVar[int]
+    document: Document
+    meta_anns_filters: _containers.RepeatedCompositeFieldContainer[MetaAnnotationsFilter]
+    def __init__(self, document: _Optional[_Union[Document, _Mapping]] = ..., meta_anns_filters: _Optional[_Iterable[_Union[MetaAnnotationsFilter, _Mapping]]] = ...) -> None: ...
+
+class ProcessResult(_message.Message):
+    __slots__ = ("id", "text", "entities", "success", "errors", "timestamp", "elapsed_time", "footer")
+    ID_FIELD_NUMBER: _ClassVar[int]
+    TEXT_FIELD_NUMBER: _ClassVar[int]
+    ENTITIES_FIELD_NUMBER: _ClassVar[int]
+    SUCCESS_FIELD_NUMBER: _ClassVar[int]
+    ERRORS_FIELD_NUMBER: _ClassVar[int]
+    TIMESTAMP_FIELD_NUMBER: _ClassVar[int]
+    ELAPSED_TIME_FIELD_NUMBER: _ClassVar[int]
+    FOOTER_FIELD_NUMBER: _ClassVar[int]
+    id: str
+    text: str
+    entities: _containers.RepeatedCompositeFieldContainer[Entity]
+    success: bool
+    errors: _containers.RepeatedScalarFieldContainer[str]
+    timestamp: str
+    elapsed_time: float
+    footer: _struct_pb2.Struct
+    def __init__(self, id: _Optional[str] = ..., text: _Optional[str] = ..., entities: _Optional[_Iterable[_Union[Entity, _Mapping]]] = ..., success: _Optional[bool] = ..., errors: _Optional[_Iterable[str]] = ..., timestamp: _Optional[str] = ..., elapsed_time: _Optional[float] = ..., footer: _Optional[_Union[_struct_pb2.Struct, _Mapping]] = ...) -> None: ...
+
+class ProcessResponse(_message.Message):
+    __slots__ = ("result", "medcat_info")
+    RESULT_FIELD_NUMBER: _ClassVar[int]
+    MEDCAT_INFO_FIELD_NUMBER: _ClassVar[int]
+    result: ProcessResult
+    medcat_info: InfoResponse
+    def __init__(self, result: _Optional[_Union[ProcessResult, _Mapping]] = ..., medcat_info: _Optional[_Union[InfoResponse, _Mapping]] = ...) -> None: ...
+
+class ProcessBulkRequest(_message.Message):
+    __slots__ = ("documents",)
+    DOCUMENTS_FIELD_NUMBER: _ClassVar[int]
+    documents: _containers.RepeatedCompositeFieldContainer[Document]
+    def __init__(self, documents: _Optional[_Iterable[_Union[Document, _Mapping]]] = ...) -> None: ...
+
+class ProcessBulkResponse(_message.Message):
+    __slots__ = ("results", "medcat_info")
+    RESULTS_FIELD_NUMBER: _ClassVar[int]
+    MEDCAT_INFO_FIELD_NUMBER: _ClassVar[int]
+    results: _containers.RepeatedCompositeFieldContainer[ProcessResult]
+    medcat_info: InfoResponse
+    def __init__(self, results: _Optional[_Iterable[_Union[ProcessResult, _Mapping]]] = ..., medcat_info: _Optional[_Union[InfoResponse, _Mapping]] = ...) -> None: ...
+
+class InfoRequest(_message.Message):
+    __slots__ = ()
+    def __init__(self) -> None: ...
+
+class InfoResponse(_message.Message):
+    __slots__ = ("service_app_name", "service_language", "service_version", "service_model", "model_card_info")
+    SERVICE_APP_NAME_FIELD_NUMBER: _ClassVar[int]
+    SERVICE_LANGUAGE_FIELD_NUMBER: _ClassVar[int]
+    SERVICE_VERSION_FIELD_NUMBER: _ClassVar[int]
+    SERVICE_MODEL_FIELD_NUMBER: _ClassVar[int]
+    MODEL_CARD_INFO_FIELD_NUMBER: _ClassVar[int]
+    service_app_name: str
+    service_language: str
+    service_version: str
+    service_model: str
+    model_card_info: _struct_pb2.Struct
+    def __init__(self, service_app_name: _Optional[str] = ..., service_language: _Optional[str] = ..., service_version: _Optional[str] = ..., service_model: _Optional[str] = ..., model_card_info: _Optional[_Union[_struct_pb2.Struct, _Mapping]] = ...) -> None: ...
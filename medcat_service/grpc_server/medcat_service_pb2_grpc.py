@@ -0,0 +1,232 @@
+# Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
+"""Client and server classes corresponding to protobuf-defined services."""
+import grpc
+import warnings
+
+from medcat_service.grpc_server import medcat_service_pb2 as medcat__service_dot_grpc__server_dot_medcat__service__pb2
+
+GRPC_GENERATED_VERSION = '1.84.0'
+GRPC_VERSION = grpc.__version__
+_version_not_supported = False
+
+try:
+    from grpc._utilities import first_version_is_lower
+    _version_not_supported = first_version_is_lower(GRPC_VERSION, GRPC_GENERATED_VERSION)
+except ImportError:
+    _version_not_supported = True
+
+if _version_not_supported:
+    raise RuntimeError(
+        f'The grpc package installed is at version {GRPC_VERSION},'
+        + ' but the generated code in medcat_service/grpc_server/medcat_service_pb2_grpc.py depends on'
+        + f' grpcio>={GRPC_GENERATED_VERSION}.'
+        + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
+        + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
+    )
+
+
+class MedCatStub:
+    """Missing associated documentation comment in .proto file."""
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.Info = channel.unary_unary(
+                '/medcat_service.MedCat/Info',
+                request_serializer=medcat__service_dot_grpc__server_dot_medcat__service__pb2.InfoRequest.SerializeToString,
+                response_deserializer=medcat__service_dot_grpc__server_dot_medcat__service__pb2.InfoResponse.FromString,
+                _registered_method=True)
+        self.Process = channel.unary_unary(
+                '/medcat_service.MedCat/Process',
+                request_serializer=medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessRequest.SerializeToString,
+                response_deserializer=medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessResponse.FromString,
+                _registered_method=True)
+        self.ProcessBulk = channel.unary_unary(
+                '/medcat_service.MedCat/ProcessBulk',
+                request_serializer=medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessBulkRequest.SerializeToString,
+                response_deserializer=medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessBulkResponse.FromString,
+                _registered_method=True)
+        self.ProcessStream = channel.stream_stream(
+                '/medcat_service.MedCat/ProcessStream',
+                request_serializer=medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessRequest.SerializeToString,
+                response_deserializer=medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessResponse.FromString,
+                _registered_method=True)
+
+
+class MedCatServicer:
+    """Missing associated documentation comment in .proto file."""
+
+    def Info(self, request, context):
+        """Returns basic information about the NLP service (/api/info)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Process(self, request, context):
+        """Returns the annotations extracted from a single document (/api/process)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ProcessBulk(self, request, context):
+        """Returns the annotations extracted from a set of documents (/api/process_bulk)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ProcessStream(self, request_iterator, context):
+        """Documents are streamed in and their annotations are streamed back as soon as they are complete, not necessarily
+        in the same order, the responses carrying the document id. The server stops reading documents while it has as
+        many documents in flight as it can process at once.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_MedCatServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'Info': grpc.unary_unary_rpc_method_handler(
+                    servicer.Info,
+                    request_deserializer=medcat__service_dot_grpc__server_dot_medcat__service__pb2.InfoRequest.FromString,
+                    response_serializer=medcat__service_dot_grpc__server_dot_medcat__service__pb2.InfoResponse.SerializeToString,
+            ),
+            'Process': grpc.unary_unary_rpc_method_handler(
+                    servicer.Process,
+                    request_deserializer=medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessRequest.FromString,
+                    response_serializer=medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessResponse.SerializeToString,
+            ),
+            'ProcessBulk': grpc.unary_unary_rpc_method_handler(
+                    servicer.ProcessBulk,
+                    request_deserializer=medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessBulkRequest.FromString,
+                    response_serializer=medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessBulkResponse.SerializeToString,
+            ),
+            'ProcessStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.ProcessStream,
+                    request_deserializer=medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessRequest.FromString,
+                    response_serializer=medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessResponse.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'medcat_service.MedCat', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('medcat_service.MedCat', rpc_method_handlers)
+
+
+ # This class is part of an EXPERIMENTAL API.
+class MedCat:
+    """Missing associated documentation comment in .proto file."""
+
+    @staticmethod
+    def Info(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/medcat_service.MedCat/Info',
+            medcat__service_dot_grpc__server_dot_medcat__service__pb2.InfoRequest.SerializeToString,
+            medcat__service_dot_grpc__server_dot_medcat__service__pb2.InfoResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Process(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/medcat_service.MedCat/Process',
+            medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessRequest.SerializeToString,
+            medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ProcessBulk(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/medcat_service.MedCat/ProcessBulk',
+            medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessBulkRequest.SerializeToString,
+            medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessBulkResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ProcessStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/medcat_service.MedCat/ProcessStream',
+            medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessRequest.SerializeToString,
+            medcat__service_dot_grpc__server_dot_medcat__service__pb2.ProcessResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
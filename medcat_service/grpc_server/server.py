@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import grpc
+
+from medcat_service.grpc_server import medcat_service_pb2_grpc as pb2_grpc
+from medcat_service.grpc_server.servicer import MedCatServicer
+
+log = logging.getLogger("gRPC")
+log.setLevel(level=os.getenv("APP_LOG_LEVEL", logging.INFO))
+
+
+def create_server(nlp_processor=None, host=None, port=None, max_workers=None):
+    """
+    Creates the gRPC server, it has to be started with `server.start()`
+    :param nlp_processor: the NLP processor, a MedCatProcessor is created when not provided
+    :param host: the host to bind to (default: APP_GRPC_HOST or 0.0.0.0)
+    :param port: the port to bind to, 0 to pick a free port (default: APP_GRPC_PORT or 50051)
+    :param max_workers: the number of concurrent RPCs served (default: APP_GRPC_WORKERS or 4)
+    :return: tuple of (server, bound port)
+    """
+    if nlp_processor is None:
+        from medcat_service.nlp_processor import MedCatProcessor
+        nlp_processor = MedCatProcessor()
+
+    host = host or os.getenv("APP_GRPC_HOST", "0.0.0.0")
+    port = port if port is not None else int(os.getenv("APP_GRPC_PORT", 50051))
+    max_workers = max_workers or int(os.getenv("APP_GRPC_WORKERS", 4))
+    max_message_size = int(os.getenv("APP_GRPC_MAX_MESSAGE_MB", 100)) * 1024 * 1024
+
+    server = grpc.server(ThreadPoolExecutor(max_workers=max_workers),
+                         options=[("grpc.max_receive_message_length", max_message_size),
+                                  ("grpc.max_send_message_length", max_message_size)])
+    pb2_grpc.add_MedCatServicer_to_server(MedCatServicer(nlp_processor), server)
+    bound_port = server.add_insecure_port("%s:%d" % (host, port))
+
+    log.info("gRPC server listening on %s:%d", host, bound_port)
+    return server, bound_port
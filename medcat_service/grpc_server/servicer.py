@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import queue
+import threading
+import time
+import traceback
+
+import grpc
+
+from medcat_service.grpc_server import medcat_service_pb2 as pb2
+from medcat_service.grpc_server import medcat_service_pb2_grpc as pb2_grpc
+from medcat_service.grpc_server.converters import (document_to_content, filters_to_meta_anns_filters, info_to_message,
+                                                   result_to_message)
+
+log = logging.getLogger("gRPC")
+log.setLevel(level=os.getenv("APP_LOG_LEVEL", logging.INFO))
+
+# marks the end of the request stream
+_END_OF_STREAM = object()
+
+# time remaining reported for the calls sent without a deadline
+_NO_DEADLINE_SEC = 1e9
+
+
+class MedCatServicer(pb2_grpc.MedCatServicer):
+    """
+    gRPC servicer exposing the same operations as the HTTP API on top of the NLP processor.
+    """
+
+    def __init__(self, nlp_processor, stream_batch_size=None, stream_bulk_min_chars=None):
+        """
+        :param nlp_processor: the NLP processor
+        :param stream_batch_size: max number of streamed documents processed at once, which also bounds the number
+            of documents read ahead from the stream (default: APP_GRPC_STREAM_BATCH_SIZE, or 4 * APP_BULK_NPROC)
+        :param stream_bulk_min_chars: number of characters from which a stream batch is processed by the bulk
+            processing subprocesses rather than in-process (default: APP_GRPC_STREAM_BULK_MIN_CHARS, or 500000)
+        """
+        self.nlp = nlp_processor
+        # the RPCs share the processor, whose bulk processing disables pipes of the shared MedCAT pipeline while
+        # it runs, hence the processor is used by one RPC at a time
+        self._lock = threading.Lock()
+        self.stream_batch_size = stream_batch_size or int(os.getenv("APP_GRPC_STREAM_BATCH_SIZE",
+                                                                    4 * getattr(nlp_processor, "bulk_nproc", 8)))
+        self.stream_bulk_min_chars = stream_bulk_min_chars or int(os.getenv("APP_GRPC_STREAM_BULK_MIN_CHARS", 500000))
+
+    def Info(self, request, context):
+        with self._lock:
+            return info_to_message(self.nlp.get_app_info())
+
+    def Process(self, request, context):
+        try:
+            with self._lock:
+                return pb2.ProcessResponse(result=self._process_single(request),
+                                           medcat_info=info_to_message(self.nlp.get_app_info()))
+        except Exception as e:
+            log.error(traceback.format_exc())
+            context.abort(grpc.StatusCode.INTERNAL, "Internal processing error %s" % e)
+
+    def ProcessBulk(self, request, context):
+        try:
+            contents = [document_to_content(document) for document in request.documents]
+            # the documents not processed before the deadline of the call are returned as deferred
+            time_remaining = context.time_remaining()
+            deadline = time.monotonic() + time_remaining \
+                if time_remaining is not None and time_remaining < _NO_DEADLINE_SEC else None
+            with self._lock:
+                results = self.nlp.process_content_bulk(contents, deadline=deadline)
+                app_info = self.nlp.get_app_info()
+            return pb2.ProcessBulkResponse(results=[result_to_message(result, document.id) for result, document
+                                                    in zip(results, request.documents)],
+                                           medcat_info=info_to_message(app_info))
+        except Exception as e:
+            log.error(traceback.format_exc())
+            context.abort(grpc.StatusCode.INTERNAL, "Internal processing error %s" % e)
+
+    def ProcessStream(self, request_iterator, context):
+        """
+        Processes the streamed documents in batches of up to `stream_batch_size` documents, sending back the
+        results of each batch as soon as it is complete. At most one batch is read ahead from the stream while
+        another one is processed, the gRPC flow control then holds back the client.
+        """
+        requests = queue.Queue(maxsize=self.stream_batch_size)
+        reader = threading.Thread(target=self._read_stream, args=(request_iterator, requests, context), daemon=True)
+        reader.start()
+
+        end_of_stream = False
+        while not end_of_stream and context.is_active():
+            try:
+                batch = [requests.get(timeout=1)]
+            except queue.Empty:
+                continue
+            # take whatever else is already waiting, without waiting for a full batch
+            while len(batch) < self.stream_batch_size:
+                try:
+                    batch.append(requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            if _END_OF_STREAM in batch:
+                end_of_stream = True
+                batch = batch[:batch.index(_END_OF_STREAM)]
+            if not batch:
+                break
+
+            try:
+                with self._lock:
+                    results = self._process_batch(batch)
+            except Exception as e:
+                log.error(traceback.format_exc())
+                context.abort(grpc.StatusCode.INTERNAL, "Internal processing error %s" % e)
+
+            for result in results:
+                yield pb2.ProcessResponse(result=result)
+
+    def _process_single(self, request):
+        # the entities are filtered by the converter, as the ones of the stream batches
+        result = self.nlp.process_content(document_to_content(request.document))
+        return result_to_message(result, request.document.id,
+                                 filters_to_meta_anns_filters(request.meta_anns_filters))
+
+    def _process_batch(self, batch):
+        # the bulk processing subprocesses are started for each batch, which is only worth it for large batches
+        contents = [document_to_content(request.document) for request in batch]
+        if sum(len(content["text"]) for content in contents) >= self.stream_bulk_min_chars:
+            results = self.nlp.process_content_bulk(contents)
+        else:
+            results = [self.nlp.process_content(content) for content in contents]
+        return [result_to_message(result, request.document.id,
+                                  filters_to_meta_anns_filters(request.meta_anns_filters))
+                for result, request in zip(results, batch)]
+
+    @staticmethod
+    def _read_stream(request_iterator, requests, context):
+        """Reads the requests from the stream, blocking while the queue of requests to be processed is full."""
+        try:
+            for request in request_iterator:
+                if not MedCatServicer._put(requests, request, context):
+                    return
+        except Exception:
+            # the stream was cancelled by the client
+            log.debug(traceback.format_exc())
+        MedCatServicer._put(requests, _END_OF_STREAM, context)
+
+    @staticmethod
+    def _put(requests, item, context):
+        while context.is_active():
+            try:
+                requests.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from .coordinator import CoordinatorProcessor
 from .medcat_processor import MedCatProcessor
 
-__all__ = ['MedCatProcessor']
+__all__ = ['MedCatProcessor', 'CoordinatorProcessor']
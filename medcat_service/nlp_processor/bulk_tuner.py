@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger("BulkTuner")
+log.setLevel(level=os.getenv("APP_LOG_LEVEL", logging.INFO))
+
+# default batch size of `CAT.multiprocessing_batch_char_size`
+MEDCAT_BATCH_CHARS = 5000000
+
+
+class BulkTuner:
+    """
+    Adaptive controller of the bulk processing configuration, i.e. the number of subprocesses (nproc) and the
+    character size of the batches of `multiprocessing_batch_char_size`. The throughput (chars/sec) and the batch
+    latency of each configuration are tracked over the recent bulk runs, and the configuration hill-climbs within
+    its bounds: the neighbouring configurations (nproc +/- 1, batch size x2 / /2) of the best known one are tried
+    in turn, a trial being adopted when it is faster. The measurements expire after `window` runs, so that the
+    configurations are re-evaluated as the document length mix and the concurrent traffic change.
+    """
+
+    def __init__(self, nproc_bounds, batch_chars_bounds, nproc=None, batch_chars=None, window=50, min_runs=2,
+                 min_chars=20000, max_batch_latency=None, smoothing=0.3, tolerance=0.05, history_size=20):
+        """
+        Args:
+            nproc_bounds (tuple): (min, max) number of subprocesses.
+            batch_chars_bounds (tuple): (min, max) batch size in characters.
+            nproc (int, optional): Initial number of subprocesses. Defaults to the max.
+            batch_chars (int, optional): Initial batch size. Defaults to 5000000 (the MedCAT default), within
+                the bounds.
+            window (int): Number of runs after which the measurements of a configuration expire. Defaults to 50.
+            min_runs (int): Number of runs a configuration is measured for before deciding. Defaults to 2.
+            min_chars (int): Runs of fewer characters are not measured, their time being dominated by the
+                start-up of the subprocesses. Defaults to 20000.
+            max_batch_latency (float, optional): Seconds a batch may take, slower configurations being penalised.
+                Defaults to None.
+            smoothing (float): Weight of the last run in the moving averages. Defaults to 0.3.
+            tolerance (float): Relative gain a trial needs over the best configuration to be adopted.
+                Defaults to 0.05.
+            history_size (int): Number of configuration changes kept for reporting. Defaults to 20.
+        """
+        self.nproc_bounds = (max(1, nproc_bounds[0]), max(1, nproc_bounds[0], nproc_bounds[1]))
+        self.batch_chars_bounds = (max(1, batch_chars_bounds[0]), max(1, batch_chars_bounds[0],
+                                                                      batch_chars_bounds[1]))
+        self.window = window
+        self.min_runs = min_runs
+        self.min_chars = min_chars
+        self.max_batch_latency = max_batch_latency
+        self.smoothing = smoothing
+        self.tolerance = tolerance
+
+        self.best = self._clip((self.nproc_bounds[1] if nproc is None else nproc,
+                                MEDCAT_BATCH_CHARS if batch_chars is None else batch_chars))
+        self.config = self.best
+        self.history = deque(maxlen=history_size)
+
+        self._stats = {}
+        self._runs = 0
+        self._tried = set()
+        self._lock = threading.Lock()
+
+    def get_config(self):
+        """Returns the configuration to use for the next bulk run.
+
+        Returns:
+            tuple: (nproc, batch_chars)
+        """
+        with self._lock:
+            return self.config
+
+    def record(self, config, chars, elapsed):
+        """Records the measurements of a bulk run, and updates the configuration.
+
+        Args:
+            config (tuple): (nproc, batch_chars) the run was made with.
+            chars (int): Number of characters processed.
+            elapsed (float): Seconds the run took.
+        """
+        if chars < self.min_chars or elapsed <= 0:
+            return
+
+        with self._lock:
+            self._runs += 1
+            chars_per_sec = chars / elapsed
+            batch_latency = elapsed / max(1, math.ceil(chars / config[1]))
+
+            stats = self._get_stats(config)
+            if stats is None:
+                self._stats[config] = {"chars_per_sec": chars_per_sec, "batch_latency": batch_latency, "runs": 1,
+                                       "first_run": self._runs}
+            else:
+                stats["chars_per_sec"] += self.smoothing * (chars_per_sec - stats["chars_per_sec"])
+                stats["batch_latency"] += self.smoothing * (batch_latency - stats["batch_latency"])
+                stats["runs"] += 1
+
+            self._update_config()
+
+    def get_info(self):
+        """Returns the state of the controller.
+
+        Returns:
+            dict: Current and best configurations, bounds, measurements of the configurations (still valid)
+                and the last configuration changes.
+        """
+        with self._lock:
+            configs = [{"nproc": config[0], "batch_size_chars": config[1],
+                        "chars_per_sec": round(stats["chars_per_sec"]),
+                        "batch_latency_sec": round(stats["batch_latency"], 3),
+                        "runs": stats["runs"]}
+                       for config, stats in sorted(self._stats.items()) if self._get_stats(config) is not None]
+            return {"enabled": True,
+                    "nproc": self.config[0],
+                    "batch_size_chars": self.config[1],
+                    "best": {"nproc": self.best[0], "batch_size_chars": self.best[1]},
+                    "nproc_bounds": list(self.nproc_bounds),
+                    "batch_size_chars_bounds": list(self.batch_chars_bounds),
+                    "configs": configs,
+                    "history": list(self.history)}
+
+    def _update_config(self):
+        if self.config != self.best:
+            trial_stats = self._get_stats(self.config)
+            if trial_stats is None or trial_stats["runs"] < self.min_runs:
+                return
+            self._tried.add(self.config)
+            # the last measurements of the best configuration, even if they expired during the trial
+            if self._score(trial_stats) > self._score(self._stats[self.best]) * (1 + self.tolerance):
+                self._set_config(self.config, "adopted, %.0f chars/sec" % trial_stats["chars_per_sec"], best=True)
+            else:
+                self._set_config(self.best, "trial rejected, %.0f chars/sec" % trial_stats["chars_per_sec"])
+            return
+
+        best_stats = self._get_stats(self.best)
+        if best_stats is None or best_stats["runs"] < self.min_runs:
+            return
+        # the trials are reset once the best configuration is measured anew
+        self._tried = {config for config in self._tried if self._get_stats(config) is not None}
+        for neighbour in self._get_neighbours(self.best):
+            if neighbour not in self._tried:
+                self._set_config(neighbour, "trial")
+                return
+
+    def _set_config(self, config, reason, best=False):
+        log.info("Bulk processing: nproc=%d, batch_size_chars=%d -> nproc=%d, batch_size_chars=%d (%s)",
+                 self.config[0], self.config[1], config[0], config[1], reason)
+        self.history.append({"time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                             "nproc": config[0], "batch_size_chars": config[1], "reason": reason})
+        self.config = config
+        if best:
+            self._tried.add(self.best)
+            self.best = config
+
+    def _get_stats(self, config):
+        # measurements are only valid within the window
+        stats = self._stats.get(config)
+        if stats is None or self._runs - stats["first_run"] >= self.window:
+            return None
+        return stats
+
+    def _score(self, stats):
+        score = stats["chars_per_sec"]
+        if self.max_batch_latency and stats["batch_latency"] > self.max_batch_latency:
+            score *= self.max_batch_latency / stats["batch_latency"]
+        return score
+
+    def _get_neighbours(self, config):
+        nproc, batch_chars = config
+        neighbours = [(nproc + 1, batch_chars), (nproc - 1, batch_chars),
+                      (nproc, batch_chars * 2), (nproc, batch_chars // 2)]
+        return [neighbour for neighbour in neighbours if self._clip(neighbour) == neighbour]
+
+    def _clip(self, config):
+        return (min(max(config[0], self.nproc_bounds[0]), self.nproc_bounds[1]),
+                min(max(config[1], self.batch_chars_bounds[0]), self.batch_chars_bounds[1]))
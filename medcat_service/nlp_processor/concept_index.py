@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import bisect
+import hashlib
+import logging
+import math
+import os
+import re
+import tempfile
+from array import array
+from collections import Counter
+
+from medcat_service.utils.pickle_cache import load_or_build
+
+log = logging.getLogger("ConceptIndex")
+log.setLevel(level=os.getenv("APP_LOG_LEVEL", logging.INFO))
+
+# bumped whenever the pickled index layout changes, so that stale caches are not loaded
+INDEX_FORMAT_VERSION = 1
+
+NON_WORD_PATTERN = re.compile(r"[\W_]+")
+
+
+def normalise_name(name):
+    """Lowercases the name and collapses its punctuation and spaces, the queries being normalised alike.
+
+    Args:
+        name (str): Concept name or query.
+
+    Returns:
+        str: Normalised name.
+    """
+    return NON_WORD_PATTERN.sub(" ", name.lower()).strip()
+
+
+def get_trigrams(key):
+    """Returns the character trigrams of a normalised name, padded with a space on both sides.
+
+    Args:
+        key (str): Normalised name.
+
+    Returns:
+        set: Trigrams of the name, as many as its characters (fewer when repeated).
+    """
+    padded = " %s " % key
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ConceptIndex:
+    """
+    Indexes of the concepts of a CDB for their lookup by CUI and the search of their names: the normalised names
+    are kept sorted for the prefix search (a binary search followed by a scan of the matching range), and an
+    inverted index of their character trigrams is used for the fuzzy search, the trigrams a name shares with the
+    query being counted over the posting arrays of the query trigrams, without going through the names.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.names = []
+        self.name_cuis = []
+        self.concepts = {}
+        self._trigrams = {}
+        self._num_trigrams = array("l")
+
+    @property
+    def num_names(self):
+        return len(self.keys)
+
+    def build(self, concepts, names):
+        """Builds the indexes.
+
+        Args:
+            concepts (dict): Concept information by CUI, i.e. the "pretty_name", the "names" and the "type_ids".
+            names (dict): CUIs by display name.
+        """
+        self.concepts = dict(concepts)
+
+        by_key = {}
+        for name, cuis in names.items():
+            key = normalise_name(name)
+            if key:
+                _, key_cuis = by_key.setdefault(key, (name, []))
+                key_cuis.extend(cui for cui in cuis if cui not in key_cuis)
+
+        self.keys = sorted(by_key)
+        self.names = [by_key[key][0] for key in self.keys]
+        self.name_cuis = [tuple(by_key[key][1]) for key in self.keys]
+
+        postings = {}
+        self._num_trigrams = array("l")
+        for name_idx, key in enumerate(self.keys):
+            trigrams = get_trigrams(key)
+            self._num_trigrams.append(len(trigrams))
+            for trigram in trigrams:
+                postings.setdefault(trigram, []).append(name_idx)
+        self._trigrams = {trigram: array("l", name_ids) for trigram, name_ids in postings.items()}
+
+    def get_concept(self, cui):
+        """Returns the information of a concept.
+
+        Args:
+            cui (str): CUI of the concept.
+
+        Returns:
+            dict: The "cui", "pretty_name", "names" and "type_ids" of the concept, or None when not indexed.
+        """
+        concept = self.concepts.get(cui)
+        if concept is None:
+            return None
+        return dict(concept, cui=cui)
+
+    def search(self, query, limit=10, mode="auto", min_similarity=0.3):
+        """Searches the concepts by name, each concept being returned once, for its best matching name.
+
+        Args:
+            query (str): Name, or beginning of a name, to search for.
+            limit (int): Max number of concepts. Defaults to 10.
+            mode (str): "prefix" for the names starting with the query, "fuzzy" for the names similar to it
+                (Dice coefficient of their trigrams) or "auto" for the prefix matches, completed with the fuzzy
+                ones. Defaults to "auto".
+            min_similarity (float): Min similarity of the fuzzy matches. Defaults to 0.3.
+
+        Returns:
+            list: Matches, best first, with the "cui", "pretty_name", "type_ids", matched "name", "match" mode
+                and "score".
+
+        Raises:
+            ValueError: If the mode is not valid.
+        """
+        if mode not in ("auto", "prefix", "fuzzy"):
+            raise ValueError("The search mode should be one of: auto, prefix, fuzzy, got: %s" % mode)
+
+        key = normalise_name(query)
+        if not key or limit <= 0:
+            return []
+
+        matches = {}
+        if mode in ("auto", "prefix"):
+            self._add_matches(matches, self._search_prefix(key, limit), "prefix", limit)
+        if mode == "fuzzy" or (mode == "auto" and len(matches) < limit):
+            self._add_matches(matches, self._search_fuzzy(key, min_similarity), "fuzzy", limit)
+        return list(matches.values())
+
+    def _search_prefix(self, key, limit):
+        # the shortest names first, out of a bounded scan of the names starting with the key
+        start = bisect.bisect_left(self.keys, key)
+        end = start
+        max_scanned = max(100, limit * 20)
+        while end < len(self.keys) and end - start < max_scanned and self.keys[end].startswith(key):
+            end += 1
+        name_ids = sorted(range(start, end), key=lambda name_idx: (len(self.keys[name_idx]), name_idx))
+        return [(name_idx, len(key) / len(self.keys[name_idx])) for name_idx in name_ids]
+
+    def _search_fuzzy(self, key, min_similarity):
+        trigrams = get_trigrams(key)
+        common = Counter()
+        for trigram in trigrams:
+            name_ids = self._trigrams.get(trigram)
+            if name_ids is not None:
+                common.update(name_ids)
+
+        # dice = 2c / (q + n) >= s with n >= c needs at least c >= s q / (2 - s) common trigrams
+        min_common = max(1, math.ceil(min_similarity * len(trigrams) / (2 - min_similarity)))
+        num_trigrams, num_query_trigrams = self._num_trigrams, len(trigrams)
+        scored = []
+        for name_idx, name_common in common.items():
+            if name_common >= min_common:
+                score = 2 * name_common / (num_query_trigrams + num_trigrams[name_idx])
+                if score >= min_similarity:
+                    scored.append((-score, num_trigrams[name_idx], name_idx))
+        scored.sort()
+        return [(name_idx, -score) for score, _, name_idx in scored]
+
+    def _add_matches(self, matches, scored_names, match_mode, limit):
+        for name_idx, score in scored_names:
+            for cui in self.name_cuis[name_idx]:
+                if len(matches) >= limit:
+                    return
+                if cui in matches:
+                    continue
+                concept = self.concepts[cui]
+                matches[cui] = {"cui": cui, "pretty_name": concept["pretty_name"], "type_ids": concept["type_ids"],
+                                "name": self.names[name_idx], "match": match_mode, "score": round(score, 4)}
+
+
+def get_allowed_cuis(cdb, cui_filter=None):
+    """Returns the CUIs of the CDB that pass the active CUI filters, i.e. the CUI list the service was loaded
+    with and the include / exclude filters of the linking config.
+
+    Args:
+        cdb (CDB): MedCAT concept database.
+        cui_filter (Iterable, optional): CUIs the service was loaded with. Defaults to None.
+
+    Returns:
+        set: Allowed CUIs.
+    """
+    allowed = set(cdb.cui2names)
+    if cui_filter:
+        allowed &= set(cui_filter)
+    filters = cdb.config.linking.filters
+    if filters.cuis:
+        allowed &= set(filters.cuis)
+    if filters.cuis_exclude:
+        allowed -= set(filters.cuis_exclude)
+    return allowed
+
+
+def get_index_fingerprint(cdb, cuis):
+    """Returns a hash of the concepts and names of the CDB that are indexed.
+
+    Args:
+        cdb (CDB): MedCAT concept database.
+        cuis (set): Indexed CUIs.
+
+    Returns:
+        str: Hex digest.
+    """
+    digest = hashlib.sha1()
+    digest.update(("%d:%s:" % (INDEX_FORMAT_VERSION, cdb.config.general.separator)).encode("utf-8"))
+    for cui in sorted(cuis):
+        digest.update(("%s\0%s\0%s\0%s\n" % (cui, cdb.cui2preferred_name.get(cui, ""),
+                                             "\0".join(sorted(cdb.cui2names.get(cui, ()))),
+                                             "\0".join(sorted(cdb.cui2type_ids.get(cui, ()))))).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def build_index(cdb, cuis):
+    """Builds the concept index of the CDB.
+
+    Args:
+        cdb (CDB): MedCAT concept database.
+        cuis (set): CUIs to index.
+
+    Returns:
+        ConceptIndex: The built index.
+    """
+    separator = cdb.config.general.separator
+    concepts, names = {}, {}
+    for cui in cuis:
+        cui_names = sorted(name.replace(separator, " ") for name in cdb.cui2names.get(cui, ()))
+        concepts[cui] = {"pretty_name": cdb.get_name(cui),
+                         "names": cui_names,
+                         "type_ids": sorted(cdb.cui2type_ids.get(cui, ()))}
+        # the preferred name may not be one of the names used for the detection
+        preferred_name = cdb.cui2preferred_name.get(cui)
+        for name in cui_names + ([preferred_name] if preferred_name else []):
+            names.setdefault(name, []).append(cui)
+
+    index = ConceptIndex()
+    index.build(concepts, names)
+    return index
+
+
+def load_or_build_index(cdb, cui_filter=None, cache_dir=None):
+    """Loads the concept index of the CDB from the cache directory, building (and caching) it when missing.
+
+    Args:
+        cdb (CDB): MedCAT concept database.
+        cui_filter (Iterable, optional): CUIs the service was loaded with. Defaults to None.
+        cache_dir (str, optional): Cache directory. Defaults to a "medcat_concepts" directory in the temp dir.
+
+    Returns:
+        ConceptIndex: The concept index.
+    """
+    cuis = get_allowed_cuis(cdb, cui_filter)
+    cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "medcat_concepts")
+    cache_path = os.path.join(cache_dir, "concepts-%s.pkl" % get_index_fingerprint(cdb, cuis))
+
+    def build_and_log():
+        index = build_index(cdb, cuis)
+        log.info("Built the concept index: %d concepts, %d names", len(index.concepts), index.num_names)
+        return index
+
+    return load_or_build(cache_path, build_and_log, "concept index")
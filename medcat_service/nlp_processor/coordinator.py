@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from medcat_service.nlp_processor.medcat_processor import DEFERRED_REASON, NlpProcessor
+
+
+def split_balanced(lengths, n_shards):
+    """Splits the documents into shards of balanced total length, the longest documents being assigned first
+    to the shard with the least characters so far.
+
+    Args:
+        lengths (list): Length of each document.
+        n_shards (int): Number of shards.
+
+    Returns:
+        list: Non-empty lists of document idx, each sorted.
+    """
+    n_shards = max(1, min(n_shards, len(lengths)))
+    heap = [(0, i) for i in range(n_shards)]
+    shards = [[] for _ in range(n_shards)]
+    for doc_idx in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+        chars, shard_idx = heapq.heappop(heap)
+        shards[shard_idx].append(doc_idx)
+        heapq.heappush(heap, (chars + lengths[doc_idx], shard_idx))
+    return [sorted(shard) for shard in shards if shard]
+
+
+class Backend:
+    """
+    MedCAT service instance the coordinator dispatches the shards to, with its load and health.
+    """
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.failed_at = None
+
+    def is_healthy(self, cooldown):
+        return self.failed_at is None or time.monotonic() - self.failed_at >= cooldown
+
+    def get_info(self, cooldown):
+        return {"url": self.url, "healthy": self.is_healthy(cooldown), "in_flight": self.in_flight,
+                "requests": self.requests, "failures": self.failures}
+
+
+class BackendError(Exception):
+    """
+    Raised when a backend could not process a request, the request not being retried when `retryable` is False
+    """
+
+    def __init__(self, message, retryable=True, status_code=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status_code = status_code
+
+
+class DeadlineReached(BackendError):
+    """
+    Raised when the deadline of a request is reached before a backend could process it
+    """
+
+    def __init__(self):
+        super().__init__(DEFERRED_REASON, retryable=False)
+
+
+class CoordinatorProcessor(NlpProcessor):
+    """
+    NLP processor of the coordinator mode: instead of running MedCAT, the documents of the bulk requests are split
+    into length-balanced shards and dispatched to the MedCAT service instances listed in
+    APP_COORDINATOR_BACKENDS, over pooled keep-alive connections. A failed shard is retried on another backend,
+    and the results are merged back in the input order.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+        self.backends = [Backend(url) for url in os.getenv("APP_COORDINATOR_BACKENDS", "").split(",") if url.strip()]
+        if not self.backends:
+            raise ValueError("No backend configured for the coordinator mode, set APP_COORDINATOR_BACKENDS")
+
+        self.backend_concurrency = max(1, int(os.getenv("APP_COORDINATOR_BACKEND_CONCURRENCY", 2)))
+        self.shard_chars = int(os.getenv("APP_COORDINATOR_SHARD_CHARS", 200000))
+        self.retries = int(os.getenv("APP_COORDINATOR_RETRIES", 2))
+        self.timeout = float(os.getenv("APP_COORDINATOR_TIMEOUT", os.getenv("SERVER_WORKER_TIMEOUT", 300)))
+        self.cooldown = float(os.getenv("APP_COORDINATOR_BACKEND_COOLDOWN", 10))
+
+        # one pool of keep-alive connections per backend, sized for the shards dispatched concurrently
+        pool_size = len(self.backends) * self.backend_concurrency
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=len(self.backends), pool_maxsize=pool_size))
+        self.session.mount("https://", HTTPAdapter(pool_connections=len(self.backends), pool_maxsize=pool_size))
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="coordinator")
+
+        self._lock = threading.Lock()
+        self._next_backend = itertools.count()
+        self._backend_info = None
+
+        self.log.info("Coordinator dispatching to %d backends: %s", len(self.backends),
+                      ", ".join(backend.url for backend in self.backends))
+
+    def get_app_info(self):
+        """Returns the application information of the backends, together with the state of the coordinator.
+
+        Returns:
+            dict: Application information stored as KVPs.
+        """
+        app_info = dict(self._get_backend_info())
+        app_info.pop("meta_tasks", None)
+        app_info["coordinator"] = {"backends": [backend.get_info(self.cooldown) for backend in self.backends]}
+        return app_info
+
+    def get_meta_tasks(self):
+        """Returns the names of the meta-annotation tasks of the model of the backends.
+
+        Returns:
+            list: Task (category) names.
+        """
+        return list(self._get_backend_info().get("meta_tasks", []))
+
+    def process_content(self, content, *args, **kwargs):
+        """Forwards a single document to a backend.
+
+        Args:
+            content (dict): Document to be processed, containing "text" field.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+                meta_anns_filters (List[Tuple[str, List[str]]]): Filters forwarded to the backend.
+
+        Returns:
+            dict: Processing result of the backend, or an error result when no backend could process it.
+        """
+        payload = {"content": content}
+        if kwargs.get("meta_anns_filters") is not None:
+            payload["meta_anns_filters"] = kwargs["meta_anns_filters"]
+        try:
+            return self._dispatch("/api/process", payload)["result"]
+        except BackendError as e:
+            return self._get_error_result(content, str(e))
+
+    def process_content_bulk(self, content, *args, **kwargs):
+        """Processes an array of documents, sharded across the backends.
+
+        Args:
+            content (list): List of documents to be processed, each containing "text" field.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+                profiler (RequestProfiler): If provided, the dispatch of the shards is timed as a span.
+                deadline (float): If provided, the `time.monotonic()` time by which the results are needed,
+                    forwarded to the backends as the remaining time. The documents of the shards that could not
+                    be dispatched before the deadline are returned as deferred.
+
+        Returns:
+            list: Processing results in the order of the documents.
+        """
+        return self._fan_out("/api/process_bulk", content, {}, kwargs.get("profiler"), kwargs.get("deadline"))
+
+    def process_content_screen(self, content, *args, **kwargs):
+        """Screens an array of documents, sharded across the backends (see `MedCatProcessor.process_content_screen`).
+
+        Returns:
+            list: Screening results in the order of the documents.
+        """
+        extra_payload = {"include_spans": kwargs.get("include_spans", True)}
+        if kwargs.get("cuis") is not None:
+            extra_payload["cuis"] = list(kwargs["cuis"])
+        return self._fan_out("/api/screen", content, extra_payload)
+
+    def get_concept(self, cui):
+        """Looks the concept up on a backend (see `MedCatProcessor.get_concept`).
+
+        Returns:
+            dict: Concept information, or None when the concept is not found.
+
+        Raises:
+            ValueError: If the concept index is not enabled on the backends.
+        """
+        try:
+            return self._dispatch("/api/concepts/%s" % quote(cui, safe=""), method="GET")["result"]
+        except BackendError as e:
+            if e.status_code == 404:
+                return None
+            raise self._get_request_error(e)
+
+    def search_concepts(self, query, *args, **kwargs):
+        """Searches the concepts on a backend (see `MedCatProcessor.search_concepts`).
+
+        Returns:
+            list: Matching concepts, best first.
+
+        Raises:
+            ValueError: If the concept index is not enabled on the backends, or the search mode is not valid.
+        """
+        params = {"q": query, "limit": kwargs.get("limit", 10), "mode": kwargs.get("mode", "auto"),
+                  "min_similarity": kwargs.get("min_similarity", 0.3)}
+        try:
+            return self._dispatch("/api/concepts/search", params=params, method="GET")["result"]
+        except BackendError as e:
+            raise self._get_request_error(e)
+
+    def _fan_out(self, path, content, extra_payload, profiler=None, deadline=None):
+        """Splits the documents into length-balanced shards, at least one per concurrent backend slot and of
+        about APP_COORDINATOR_SHARD_CHARS characters, and dispatches them concurrently.
+
+        Returns:
+            list: Results in the order of the documents.
+        """
+        if len(content) == 0:
+            return []
+
+        lengths = [len(document.get("text") or "") if isinstance(document, dict) else 0 for document in content]
+        n_shards = max(len(self.backends) * self.backend_concurrency,
+                       math.ceil(sum(lengths) / max(1, self.shard_chars)))
+        shards = split_balanced(lengths, n_shards)
+
+        span = profiler.span("dispatch", shard_count=len(shards)) if profiler is not None else nullcontext()
+        with span:
+            futures = [self.executor.submit(self._process_shard, path, content, shard, extra_payload, deadline)
+                       for shard in shards]
+            results = [None] * len(content)
+            for shard, future in zip(shards, futures):
+                for doc_idx, result in zip(shard, future.result()):
+                    results[doc_idx] = result
+        return results
+
+    def _process_shard(self, path, content, shard, extra_payload, deadline):
+        documents = [content[doc_idx] for doc_idx in shard]
+        payload = dict(extra_payload, content=documents)
+
+        try:
+            results = self._dispatch(path, payload, deadline=deadline)["result"]
+        except DeadlineReached:
+            return [self._get_deferred_result(document) for document in documents]
+        except BackendError as e:
+            return [self._get_error_result(document, str(e)) for document in documents]
+
+        if len(results) != len(documents):
+            return [self._get_error_result(document, "The backend returned %d results for %d documents" %
+                                           (len(results), len(documents))) for document in documents]
+        return results
+
+    def _dispatch(self, path, payload=None, deadline=None, method="POST", params=None):
+        """Posts the payload to the least loaded healthy backend, retrying on another backend when it fails.
+        When a deadline is given, each attempt is made with the time remaining, forwarded to the backend as
+        "deadline_ms", and no attempt is made once the deadline is reached.
+
+        Returns:
+            dict: Response content of the backend.
+
+        Raises:
+            DeadlineReached: If the deadline was reached before a backend could process the request.
+            BackendError: If no backend could process the request.
+        """
+        tried = set()
+        errors = []
+        for _ in range(self.retries + 1):
+            timeout = None
+            if deadline is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    raise DeadlineReached()
+                payload = dict(payload, deadline_ms=timeout * 1000)
+            backend = self._acquire_backend(tried)
+            if backend is None:
+                break
+            tried.add(backend)
+            try:
+                return self._send(backend, method, path, payload, params, timeout)
+            except BackendError as e:
+                self.log.warning("Backend %s failed to process %s: %s", backend.url, path, e)
+                errors.append("%s: %s" % (backend.url, e))
+                if not e.retryable:
+                    raise
+            finally:
+                self._release_backend(backend)
+        raise BackendError(("No backend could process the request (%s)" % "; ".join(errors)) if errors else
+                           "No backend available")
+
+    def _send(self, backend, method, path, payload, params, timeout):
+        try:
+            response = self.session.request(method, backend.url + path, json=payload, params=params,
+                                            timeout=min(timeout or self.timeout, self.timeout))
+        except requests.RequestException as e:
+            self._mark_failure(backend)
+            raise BackendError(repr(e))
+
+        if response.status_code >= 500 or response.status_code == 429:
+            self._mark_failure(backend)
+            raise BackendError("HTTP %d %s" % (response.status_code, response.text[:200]),
+                               status_code=response.status_code)
+        if response.status_code != 200:
+            # the request itself is invalid, another backend would refuse it as well
+            raise BackendError("HTTP %d %s" % (response.status_code, response.text[:200]), retryable=False,
+                               status_code=response.status_code)
+
+        try:
+            content = response.json()
+        except ValueError as e:
+            self._mark_failure(backend)
+            raise BackendError("Invalid response: %s" % repr(e))
+
+        with self._lock:
+            backend.failed_at = None
+        return content
+
+    def _acquire_backend(self, excluded):
+        # the least loaded backend, healthy ones first, round-robin between equally loaded ones
+        with self._lock:
+            candidates = [backend for backend in self.backends if backend not in excluded]
+            if not candidates:
+                return None
+            start = next(self._next_backend)
+            order = {backend: (start + i) % len(self.backends) for i, backend in enumerate(self.backends)}
+            backend = min(candidates, key=lambda b: (not b.is_healthy(self.cooldown), b.in_flight, order[b]))
+            backend.in_flight += 1
+            backend.requests += 1
+            return backend
+
+    def _release_backend(self, backend):
+        with self._lock:
+            backend.in_flight -= 1
+
+    def _mark_failure(self, backend):
+        with self._lock:
+            backend.failures += 1
+            backend.failed_at = time.monotonic()
+
+    def _get_backend_info(self):
+        # the application info of the first backend that answers, fetched once
+        if self._backend_info is None:
+            for backend in sorted(self.backends, key=lambda b: not b.is_healthy(self.cooldown)):
+                try:
+                    response = self.session.get(backend.url + "/api/info", timeout=min(10.0, self.timeout))
+                    if response.status_code == 200:
+                        info = response.json()
+                        self._backend_info = {key: value for key, value in info.items()
+                                              if key not in ("memory", "cpu", "bulk_tuning")}
+                        break
+                except requests.RequestException as e:
+                    self.log.warning("Could not get the info of backend %s: %s", backend.url, repr(e))
+        return self._backend_info or {"service_app_name": os.getenv("APP_NAME", "MedCAT")}
+
+    @staticmethod
+    def _get_request_error(error):
+        # the requests refused by the backends are refused by the coordinator as well
+        if error.status_code == 400:
+            return ValueError(str(error).split(" ", 2)[-1])
+        return RuntimeError(str(error))
+
+    @staticmethod
+    def _get_error_result(document, error):
+        result = {"text": document.get("text") if isinstance(document, dict) else None,
+                  "annotations": [],
+                  "success": False,
+                  "errors": [error],
+                  "timestamp": NlpProcessor._get_timestamp()}
+        if isinstance(document, dict) and "footer" in document:
+            result["footer"] = document["footer"]
+        return result
+
+    @staticmethod
+    def _get_deferred_result(document):
+        result = {"text": document.get("text") if isinstance(document, dict) else None,
+                  "annotations": [],
+                  "success": False,
+                  "deferred": True,
+                  "deferred_reason": DEFERRED_REASON,
+                  "timestamp": NlpProcessor._get_timestamp()}
+        if isinstance(document, dict) and "footer" in document:
+            result["footer"] = document["footer"]
+        return result
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import difflib
+import threading
+from collections import OrderedDict
+
+from medcat_service.nlp_processor.text_utils import expand_to_line_boundaries, merge_spans, shift_entity
+
+
+class DocumentVersionStore:
+    """
+    Bounded (LRU) store keeping the last annotated version of each document, keyed by its `doc_id`.
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self._docs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, doc_id):
+        """Returns the stored version of a document, or None if it is not (or no longer) stored.
+
+        Args:
+            doc_id (str): Document identifier.
+
+        Returns:
+            dict: Stored entry with "version", "text", "line_offsets" and "entities" fields.
+        """
+        with self._lock:
+            entry = self._docs.get(doc_id)
+            if entry is not None:
+                self._docs.move_to_end(doc_id)
+            return entry
+
+    def put(self, doc_id, version, text, line_offsets, entities):
+        """Stores the annotated version of a document, evicting the least recently used ones if full.
+
+        Args:
+            doc_id (str): Document identifier.
+            version: Document version, as provided by the client (can be None).
+            text (str): Document text.
+            line_offsets (list): Line start offsets of the text.
+            entities (list): List of MedCAT entities found in the text.
+        """
+        with self._lock:
+            self._docs[doc_id] = {"version": version,
+                                  "text": text,
+                                  "line_offsets": line_offsets,
+                                  "entities": entities}
+            self._docs.move_to_end(doc_id)
+            while len(self._docs) > self.max_size:
+                self._docs.popitem(last=False)
+
+    def __len__(self):
+        return len(self._docs)
+
+
+def is_stale_version(version, stored_version):
+    """Checks whether the provided document version is older than the stored one.
+
+    Args:
+        version: Version provided with the request.
+        stored_version: Version stored alongside the previous annotations.
+
+    Returns:
+        bool: True only when both versions are present, comparable and the provided one is older.
+    """
+    if version is None or stored_version is None:
+        return False
+    try:
+        return version < stored_version
+    except TypeError:
+        return False
+
+
+def diff_documents(old_text, old_line_offsets, new_text, new_line_offsets):
+    """Computes the line-level difference between two versions of a document.
+
+    Args:
+        old_text (str): Previous version of the text.
+        old_line_offsets (list): Line start offsets of the previous version.
+        new_text (str): New version of the text.
+        new_line_offsets (list): Line start offsets of the new version.
+
+    Returns:
+        tuple: (changed_spans, equal_blocks), where changed_spans is a list of (start, end) spans of the
+            new text that were modified and equal_blocks is a list of (old_start, old_end, new_start)
+            character ranges that are identical in both versions.
+    """
+    old_lines = old_text.splitlines(keepends=True)
+    new_lines = new_text.splitlines(keepends=True)
+
+    def _to_char(line_offsets, text_len, line_idx):
+        return line_offsets[line_idx] if line_idx < len(line_offsets) else text_len
+
+    changed_spans, equal_blocks = [], []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        new_start = _to_char(new_line_offsets, len(new_text), j1)
+        new_end = _to_char(new_line_offsets, len(new_text), j2)
+        if tag == "equal":
+            equal_blocks.append((_to_char(old_line_offsets, len(old_text), i1),
+                                 _to_char(old_line_offsets, len(old_text), i2),
+                                 new_start))
+        else:
+            changed_spans.append((new_start, new_end))
+
+    return changed_spans, equal_blocks
+
+
+def get_reannotation_windows(changed_spans, new_text, new_line_offsets, margin):
+    """Expands the changed spans of a document by a context margin, snapped to line boundaries.
+
+    Args:
+        changed_spans (list): List of (start, end) spans of the new text that were modified.
+        new_text (str): New version of the text.
+        new_line_offsets (list): Line start offsets of the new text.
+        margin (int): Number of characters of context to include on both sides of each change.
+
+    Returns:
+        list: Sorted, non-overlapping (start, end) windows of the new text that need to be re-annotated.
+    """
+    windows = [expand_to_line_boundaries(new_line_offsets, len(new_text), start, end, margin)
+               for start, end in changed_spans]
+    return merge_spans(windows)
+
+
+def carry_over_entities(old_entities, equal_blocks, windows):
+    """Maps the entities of the previous version onto the new one, keeping only those found in unchanged
+    text and outside of the re-annotated windows.
+
+    Args:
+        old_entities (list): List of MedCAT entities of the previous version.
+        equal_blocks (list): List of (old_start, old_end, new_start) unchanged character ranges.
+        windows (list): List of (start, end) windows of the new text that are re-annotated.
+
+    Returns:
+        list: Entities with their offsets shifted to the new text.
+    """
+    kept = []
+    for entity in old_entities:
+        for old_start, old_end, new_start in equal_blocks:
+            if old_start <= entity["start"] and entity["end"] <= old_end:
+                shifted = shift_entity(entity, new_start - old_start)
+                if not any(shifted["start"] < w_end and w_start < shifted["end"] for w_start, w_end in windows):
+                    kept.append(shifted)
+                break
+    return kept
@@ -2,8 +2,13 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import math
 import os
+import tempfile
+import threading
 import time
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager, nullcontext
 from datetime import datetime, timezone
 
 import simplejson as json
@@ -11,9 +16,30 @@ from medcat.cat import CAT
 from medcat.cdb import CDB
 from medcat.config import Config
 from medcat.meta_cat import MetaCAT
+from medcat.ner.transformers_ner import TransformersNER
 from medcat.utils.ner.deid import DeIdModel
 from medcat.vocab import Vocab
 
+from medcat_service.nlp_processor.bulk_tuner import MEDCAT_BATCH_CHARS, BulkTuner
+from medcat_service.nlp_processor.concept_index import load_or_build_index
+from medcat_service.nlp_processor.incremental import (DocumentVersionStore, carry_over_entities, diff_documents,
+                                                      get_reannotation_windows, is_stale_version)
+from medcat_service.nlp_processor.meta_batching import annotate_meta_batched, supports_batching
+from medcat_service.nlp_processor.onnx_meta_cat import enable_onnx_backend
+from medcat_service.nlp_processor.parallel_segments import (SegmentPool, annotate_meta, merge_segment_entities,
+                                                            split_with_overlap)
+from medcat_service.nlp_processor.screening import load_or_compile
+from medcat_service.nlp_processor.segment_cache import SegmentCache
+from medcat_service.nlp_processor.spill_buffer import SpillBuffer
+from medcat_service.nlp_processor.text_utils import get_line_offsets, merge_entities, shift_entity
+from medcat_service.utils import get_available_cpus, get_cpu_quota, get_peak_rss_mb, get_rss_mb, release_memory
+
+# additional information of the entities, as returned by `CAT.get_entities`
+ENTITY_ADDL_INFO = ["cui2icd10", "cui2ontologies", "cui2snomed"]
+
+# reason reported for the documents of a bulk request not processed before its deadline
+DEFERRED_REASON = "Request deadline reached before the document was processed"
+
 
 class NlpProcessor:
     """
@@ -33,12 +59,68 @@ class NlpProcessor:
     def get_app_info(self):
         pass
 
+    def get_memory_info(self):
+        """
+        Returns the memory usage of the worker process
+        :return: dict with the current and peak RSS (MB) and the RSS ceiling the worker is recycled at
+        """
+        return {"rss_mb": round(get_rss_mb(), 1),
+                "peak_rss_mb": round(get_peak_rss_mb(), 1),
+                "worker_max_rss_mb": float(os.getenv("APP_WORKER_MAX_RSS_MB", 0))}
+
+    def get_cpu_info(self):
+        """
+        Returns the CPUs the worker process runs on and the number of threads it uses
+        :return: dict with the CPU ids, the cgroup CPU quota and the thread / subprocess counts
+        """
+        return {"cpus": get_available_cpus(),
+                "cpu_quota": get_cpu_quota(),
+                "cpu_layout": os.getenv("APP_CPU_LAYOUT", "none").lower(),
+                "torch_threads": int(os.getenv("APP_TORCH_THREADS", -1)),
+                "bulk_nproc": int(os.getenv("APP_BULK_NPROC", 8)),
+                "bulk_torch_threads": int(os.getenv("APP_BULK_TORCH_THREADS", -1))}
+
+    def get_bulk_tuning_info(self):
+        """
+        Returns the bulk processing configuration, as tuned at runtime when APP_BULK_TUNING is enabled
+        :return: dict with the number of subprocesses and the batch size in characters
+        """
+        return {"enabled": False,
+                "nproc": int(os.getenv("APP_BULK_NPROC", 8)),
+                "batch_size_chars": int(os.getenv("APP_BULK_BATCH_CHARS", MEDCAT_BATCH_CHARS))}
+
+    def get_meta_tasks(self):
+        """
+        Returns the names of the meta-annotation tasks of the model
+        :return: list of the task (category) names
+        """
+        return []
+
     def process_content(self, content, *args, **kwargs):
         pass
 
     def process_content_bulk(self, content, *args, **kwargs):
         pass
 
+    def process_content_screen(self, content, *args, **kwargs):
+        pass
+
+    def get_concept(self, cui):
+        """
+        Returns the information of a concept of the CDB
+        :param cui: the CUI of the concept
+        :return: dict with the concept information, or None when the concept is not found
+        """
+        pass
+
+    def search_concepts(self, query, *args, **kwargs):
+        """
+        Searches the concepts of the CDB by name
+        :param query: the name, or beginning of a name, to search for
+        :return: list of the matching concepts, best first
+        """
+        pass
+
     @staticmethod
     def _get_timestamp():
         """
@@ -66,10 +148,38 @@ class MedCatProcessor(NlpProcessor):
         self.entity_output_mode = os.getenv("ANNOTATIONS_ENTITY_OUTPUT_MODE", "dict").lower()
 
         self.bulk_nproc = int(os.getenv("APP_BULK_NPROC", 8))
+        self.bulk_deduplicate = os.getenv("APP_BULK_DEDUPLICATE", "True").lower() == "true"
         self.torch_threads = int(os.getenv("APP_TORCH_THREADS", -1))
+        self.bulk_torch_threads = int(os.getenv("APP_BULK_TORCH_THREADS", -1))
+        # the batch size is left to MedCAT unless set
+        self.bulk_batch_chars = int(os.environ["APP_BULK_BATCH_CHARS"]) if os.getenv("APP_BULK_BATCH_CHARS") else None
+
+        # the number of subprocesses and the batch size can be tuned at runtime from the measured throughput
+        self.bulk_tuner = None
+        if os.getenv("APP_BULK_TUNING", "False").lower() == "true":
+            self.bulk_tuner = self._create_bulk_tuner()
+
+        # bulk requests sent with a deadline are processed in shards, no new shard being started once the
+        # deadline is near, the remaining documents are then deferred
+        self.bulk_shard_chars = int(os.getenv("APP_BULK_SHARD_CHARS", 500000))
+        self.bulk_deadline_margin = float(os.getenv("APP_BULK_DEADLINE_MARGIN_MS", 500)) / 1000
+
+        # past this budget, the annotations of the documents of a bulk request are spilled to a temporary file
+        # and read back one at a time when the response is written
+        self.bulk_memory_budget = int(float(os.getenv("APP_BULK_MEMORY_BUDGET_MB", 0)) * 1024 * 1024)
+        self.bulk_spill_dir = os.getenv("APP_BULK_SPILL_DIR") or None
+        self.bulk_meta_cat_batching = os.getenv("APP_BULK_META_CAT_BATCHING", "True").lower() == "true"
+        self.meta_cat_batch_size = int(os.getenv("APP_META_CAT_BATCH_SIZE", 0)) or None
         self.DEID_MODE = eval(os.getenv("DEID_MODE", "False"))
         self.DEID_REDACT = eval(os.getenv("DEID_REDACT", "True"))
         self.model_card_info = {}
+        self.cui_filter = None
+
+        # incremental re-annotation of documents resubmitted with a "doc_id" (and optionally "version")
+        self.incremental_mode = os.getenv("APP_INCREMENTAL_ANNOTATION", "False").lower() == "true"
+        self.incremental_context_margin = int(os.getenv("APP_INCREMENTAL_CONTEXT_MARGIN", 200))
+        self.incremental_max_changed_ratio = float(os.getenv("APP_INCREMENTAL_MAX_CHANGED_RATIO", 0.5))
+        self.document_store = DocumentVersionStore(max_size=int(os.getenv("APP_INCREMENTAL_STORE_SIZE", 1000)))
 
         # this is available to constrain torch threads when there
         # isn't a GPU
@@ -83,6 +193,48 @@ class MedCatProcessor(NlpProcessor):
         self.cat = self._create_cat()
         self.cat.train = os.getenv("APP_TRAINING_MODE", False)
 
+        # optionally, run the MetaCAT models through ONNX Runtime
+        if os.getenv("APP_META_CAT_BACKEND", "torch").lower() == "onnx":
+            self._enable_onnx_meta_cats()
+
+        # dictionary-only screening of the documents for the CDB names, bypassing the MedCAT pipeline
+        self.screening_automaton = None
+        if os.getenv("APP_SCREENING", "False").lower() == "true":
+            self.screening_automaton = load_or_compile(self.cat.cdb, os.getenv("APP_SCREENING_CACHE_DIR"))
+
+        # lookup of the concepts by CUI and search of their names, restricted to the CUIs passing the filters
+        self.concept_index = None
+        if os.getenv("APP_CONCEPT_INDEX", "False").lower() == "true":
+            self.concept_index = load_or_build_index(self.cat.cdb, self.cui_filter,
+                                                     os.getenv("APP_CONCEPT_INDEX_CACHE_DIR"))
+
+        # paragraph-level annotation cache for templated / boilerplate text
+        self.segment_cache = None
+        if os.getenv("APP_SEGMENT_CACHE", "False").lower() == "true":
+            self.segment_cache = SegmentCache(model_version=self._get_model_version(),
+                                              max_size=int(os.getenv("APP_SEGMENT_CACHE_SIZE", 10000)),
+                                              context_margin=int(os.getenv("APP_SEGMENT_CACHE_CONTEXT_MARGIN", 100)))
+
+        # documents sent to /api/process longer than APP_PARALLEL_DOC_MIN_CHARS are split into overlapping
+        # segments annotated in parallel by a persistent pool of subprocesses
+        self.parallel_doc_min_chars = int(os.getenv("APP_PARALLEL_DOC_MIN_CHARS", 0))
+        self.parallel_doc_segment_chars = int(os.getenv("APP_PARALLEL_DOC_SEGMENT_CHARS", 50000))
+        self.parallel_doc_overlap_chars = int(os.getenv("APP_PARALLEL_DOC_OVERLAP_CHARS", 1000))
+        self.segment_pool = None
+        if self.parallel_doc_min_chars > 0 and self.segment_cache is not None:
+            # the documents are then all annotated paragraph by paragraph through the cache
+            self.log.warning("APP_SEGMENT_CACHE takes precedence over APP_PARALLEL_DOC_MIN_CHARS, the long documents "
+                             "are not annotated in parallel segments")
+        elif self.parallel_doc_min_chars > 0:
+            self.segment_pool = SegmentPool(self, int(os.getenv("APP_PARALLEL_DOC_NPROC", 0)) or self.bulk_nproc)
+
+        # spaCy interns the strings of every unseen token for the lifetime of the pipeline, the pipeline is
+        # re-created from the loaded models when its vocab grew by more than APP_VOCAB_MAX_GROWTH strings
+        self.vocab_max_growth = int(os.getenv("APP_VOCAB_MAX_GROWTH", 500000))
+        self.vocab_resets = 0
+        self._vocab_lock = threading.Lock()
+        self._vocab_baseline = self._get_vocab_size()
+
         self.log.info("MedCAT processor is ready")
 
     def get_app_info(self):
@@ -98,6 +250,39 @@ class MedCatProcessor(NlpProcessor):
                 "model_card_info": self.model_card_info
                 }
 
+    def get_bulk_tuning_info(self):
+        """Returns the bulk processing configuration, together with the state of its controller when tuned.
+
+        Returns:
+            dict: Number of subprocesses ("nproc") and batch size in characters ("batch_size_chars"), plus
+                the bounds, measurements and last changes when tuned.
+        """
+        if self.bulk_tuner is not None:
+            return self.bulk_tuner.get_info()
+        return {"enabled": False, "nproc": self.bulk_nproc,
+                "batch_size_chars": self.bulk_batch_chars or MEDCAT_BATCH_CHARS}
+
+    def get_meta_tasks(self):
+        """Returns the names of the meta-annotation tasks of the model, in the order of the MetaCAT models.
+
+        Returns:
+            list: Task (category) names.
+        """
+        return [meta_cat.config.general["category_name"] for meta_cat in getattr(self.cat, "_meta_cats", [])]
+
+    def get_memory_info(self):
+        """Returns the memory usage of the worker process, including the growth of the spaCy vocab.
+
+        Returns:
+            dict: Memory information stored as KVPs.
+        """
+        memory_info = super().get_memory_info()
+        memory_info.update({"vocab_strings": self._get_vocab_size(),
+                            "vocab_strings_baseline": self._vocab_baseline,
+                            "vocab_max_growth": self.vocab_max_growth,
+                            "vocab_resets": self.vocab_resets})
+        return memory_info
+
     def process_entities(self, entities, *args, **kwargs):
         """Process entities for repsonse and serialisation
         """
@@ -122,6 +307,7 @@ class MedCatProcessor(NlpProcessor):
                     ("Subject", ["Patient", "Family"])] would filter entities where each
                     entity.meta_anns['Presence']['value'] is 'True' and
                     entity.meta_anns['Subject']['value'] is 'Patient' or 'Family'
+                profiler (RequestProfiler): If provided, the processing stages are timed as spans of the profiler.
 
         Returns:
             dict: Processing result containing document with extracted annotations stored as KVPs.
@@ -142,13 +328,24 @@ class MedCatProcessor(NlpProcessor):
         # when it contains any non-blank characters
 
         start_time_ns = time.time_ns()
+        incremental_info = None
+        segment_cache_info = None
+        profiler = kwargs.get("profiler")
 
         if self.DEID_MODE:
             entities = self.cat.get_entities(text)["entities"]
             text = self.cat.deid_text(text, redact=self.DEID_REDACT)
         else:
             if text is not None and len(text.strip()) > 0:
-                entities = self.cat.get_entities(text)
+                if self.incremental_mode and content.get("doc_id") is not None:
+                    entities, incremental_info = self._get_entities_incremental(text, content["doc_id"],
+                                                                                content.get("version"), profiler)
+                elif self.segment_cache is not None:
+                    entities, segment_cache_info = self._get_entities_segmented(text, profiler)
+                elif self.segment_pool is not None and len(text) >= self.parallel_doc_min_chars:
+                    entities = self._get_entities_parallel(text, profiler)
+                else:
+                    entities = self._get_entities(text, profiler)
             else:
                 entities = []
 
@@ -156,11 +353,14 @@ class MedCatProcessor(NlpProcessor):
 
         if kwargs.get("meta_anns_filters"):
             meta_anns_filters = kwargs.get("meta_anns_filters")
-            entities = [e for e in entities['entities'].values() if
-                        all(e['meta_anns'][task]['value'] in filter_values
-                            for task, filter_values in meta_anns_filters)]
+            with MedCatProcessor._span(profiler, "meta_anns_filters"):
+                entities = [e for e in entities['entities'].values() if
+                            all(e['meta_anns'][task]['value'] in filter_values
+                                for task, filter_values in meta_anns_filters)]
 
         entities = self.process_entities(entities, **kwargs)
+        if profiler is not None:
+            entities = profiler.timed_iter(entities, "process_entities")
 
         nlp_result = {
             "text": str(text),
@@ -170,17 +370,32 @@ class MedCatProcessor(NlpProcessor):
             "elapsed_time":  elapsed_time
         }
 
+        if incremental_info is not None:
+            nlp_result["incremental"] = incremental_info
+
+        if segment_cache_info is not None:
+            nlp_result["segment_cache"] = segment_cache_info
+
+        self._check_vocab_growth()
+
         # append the footer
         if "footer" in content:
             nlp_result["footer"] = content["footer"]
 
         return nlp_result
 
-    def process_content_bulk(self, content):
+    def process_content_bulk(self, content, *args, **kwargs):
         """Processes an array of documents extracting the annotations.
 
         Args:
             content (list): List of documents to be processed, each containing "text" field.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+                profiler (RequestProfiler): If provided, the processing stages are timed as spans of the profiler.
+                    The MedCAT pipeline runs in subprocesses, hence it is timed as a whole.
+                deadline (float): If provided, the `time.monotonic()` time by which the results are needed.
+                    The documents are then processed in shards of APP_BULK_SHARD_CHARS characters, and the
+                    documents of the shards that could not complete before the deadline are returned as deferred.
 
         Returns:
             list: Processing results containing documents with extracted annotations, stored as KVPs.
@@ -188,7 +403,11 @@ class MedCatProcessor(NlpProcessor):
         # use generators both to provide input documents and to provide resulting annotations
         # to avoid too many mem-copies
         invalid_doc_ids = []
+        duplicate_doc_ids = {}
+        deferred_doc_ids = set()
         ann_res = []
+        profiler = kwargs.get("profiler")
+        deadline = kwargs.get("deadline")
 
         start_time_ns = time.time_ns()
 
@@ -197,15 +416,145 @@ class MedCatProcessor(NlpProcessor):
                 ann_res = self.cat.deid_multi_texts(MedCatProcessor._generate_input_doc(content, invalid_doc_ids),
                                                     redact=self.DEID_REDACT)
             else:
-                ann_res = self.cat.multiprocessing_batch_char_size(
-                    MedCatProcessor._generate_input_doc(content, invalid_doc_ids), nproc=self.bulk_nproc)
+                # identical documents are only sent once for processing
+                input_docs = MedCatProcessor._generate_input_doc(content, invalid_doc_ids,
+                                                                 duplicate_doc_ids if self.bulk_deduplicate else None)
+                if profiler is not None:
+                    input_docs = profiler.timed_iter(input_docs, "generate_input_doc")
+
+                spill_buffer = SpillBuffer(self.bulk_memory_budget, self.bulk_spill_dir) \
+                    if self.bulk_memory_budget > 0 else None
+
+                with MedCatProcessor._span(profiler, "multiprocessing_batch_char_size") as span, \
+                        self._bulk_torch_threads():
+                    if deadline is not None:
+                        ann_res, deferred_doc_ids = self._process_shards_until(input_docs, deadline, spill_buffer)
+                    else:
+                        ann_res = self._process_bulk(input_docs, spill_buffer)
+                    if profiler is not None:
+                        entity_count = ann_res.entity_count if isinstance(ann_res, SpillBuffer) else \
+                            sum(len(ann["entities"]) for ann in ann_res.values())
+                        span["attributes"].update(doc_count=len(ann_res), entity_count=entity_count)
 
         except Exception as e:
             self.log.error(repr(e))
 
         additional_info = {"elapsed_time": str((time.time_ns() - start_time_ns) / 10e8)}
+        if self.bulk_deduplicate and not self.DEID_MODE:
+            additional_info["deduplicated_docs"] = len(duplicate_doc_ids)
+
+        if deferred_doc_ids:
+            self.log.warning("Request deadline reached, deferring %d of %d documents", len(deferred_doc_ids),
+                             len(content))
+
+        result = self._generate_result(content, ann_res, invalid_doc_ids, additional_info, duplicate_doc_ids,
+                                       deferred_doc_ids)
+        if isinstance(ann_res, SpillBuffer):
+            if ann_res.spilled_count > 0:
+                self.log.info("Spilled the annotations of %d of %d documents to disk (%d bytes)",
+                              ann_res.spilled_count, len(content), ann_res.spilled_bytes)
+            result = MedCatProcessor._close_when_done(result, ann_res)
+        if profiler is not None:
+            result = profiler.timed_iter(result, "generate_result")
+        return result
+
+    def process_content_screen(self, content, *args, **kwargs):
+        """Screens an array of documents for the names of the CDB, with the compiled name automaton only: the
+        text is matched in a single pass over its tokens, without the spaCy pipeline, the disambiguation or the
+        meta-annotations. Of overlapping names, the leftmost-longest one is kept.
+
+        Args:
+            content (list): List of documents to be screened, each containing "text" field.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+                cuis (list): If provided, only the names of these CUIs are reported.
+                include_spans (bool): Whether to return the matched names as "annotations". Defaults to True.
+
+        Returns:
+            Iterable: Screening results, one per document, with the "matched" flag and the sorted "cuis" found.
+
+        Raises:
+            ValueError: If the screening mode is not enabled.
+        """
+        if self.screening_automaton is None:
+            raise ValueError("The screening mode is not enabled, set APP_SCREENING=True")
+
+        cuis = set(kwargs["cuis"]) if kwargs.get("cuis") is not None else None
+        return self._generate_screening_result(content, cuis, kwargs.get("include_spans", True))
+
+    def _generate_screening_result(self, content, cuis, include_spans):
+        """Generator function screening the documents one by one.
+
+        Args:
+            content (list): List of documents to be screened.
+            cuis (set): CUIs to report, or None for all.
+            include_spans (bool): Whether to return the matched names as "annotations".
+
+        Yields:
+            dict: Screening result of the document.
+        """
+        cdb = self.cat.cdb
+        for document in content:
+            text = document.get("text") if isinstance(document, dict) else None
+            annotations, found_cuis = [], set()
+            if isinstance(text, str):
+                for start, end, _, name_cuis in self.screening_automaton.find(text):
+                    for cui in name_cuis:
+                        if cuis is not None and cui not in cuis:
+                            continue
+                        found_cuis.add(cui)
+                        if include_spans:
+                            annotations.append({"cui": cui, "pretty_name": cdb.get_name(cui),
+                                                "source_value": text[start:end], "start": start, "end": end})
+
+            result = {"matched": bool(found_cuis),
+                      "cuis": sorted(found_cuis),
+                      "success": True,
+                      "timestamp": NlpProcessor._get_timestamp()}
+            if include_spans:
+                result["annotations"] = annotations
+            if isinstance(document, dict) and "footer" in document:
+                result["footer"] = document["footer"]
+            yield result
+
+    def get_concept(self, cui):
+        """Returns the information of a concept, from the concept index.
 
-        return self._generate_result(content, ann_res, invalid_doc_ids, additional_info)
+        Args:
+            cui (str): CUI of the concept.
+
+        Returns:
+            dict: The "cui", "pretty_name", "names" and "type_ids" of the concept, or None when it is not in the CDB
+                or is filtered out.
+
+        Raises:
+            ValueError: If the concept index is not enabled.
+        """
+        if self.concept_index is None:
+            raise ValueError("The concept index is not enabled, set APP_CONCEPT_INDEX=True")
+        return self.concept_index.get_concept(cui)
+
+    def search_concepts(self, query, *args, **kwargs):
+        """Searches the concepts by name, from the concept index (see `ConceptIndex.search`).
+
+        Args:
+            query (str): Name, or beginning of a name, to search for.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+                limit (int): Max number of concepts. Defaults to 10.
+                mode (str): "auto", "prefix" or "fuzzy". Defaults to "auto".
+                min_similarity (float): Min similarity of the fuzzy matches. Defaults to 0.3.
+
+        Returns:
+            list: Matching concepts, best first.
+
+        Raises:
+            ValueError: If the concept index is not enabled, or the search mode is not valid.
+        """
+        if self.concept_index is None:
+            raise ValueError("The concept index is not enabled, set APP_CONCEPT_INDEX=True")
+        return self.concept_index.search(query, limit=kwargs.get("limit", 10), mode=kwargs.get("mode", "auto"),
+                                         min_similarity=kwargs.get("min_similarity", 0.3))
 
     def retrain_medcat(self, content, replace_cdb):
         """Retrains Medcat and redeploys model.
@@ -233,6 +582,439 @@ class MedCatProcessor(NlpProcessor):
 
         return {"results": [p, r, f1, tp_dict, fp_dict, fn_dict]}
 
+    def _process_bulk(self, input_docs, ann_res=None):
+        """Annotates the documents with the current bulk processing configuration, recording its throughput
+        when it is tuned.
+
+        Args:
+            input_docs (Iterable): Consecutive tuples of (idx, document).
+            ann_res (SpillBuffer, optional): If provided, the documents are annotated batch by batch, the
+                annotations of each batch being added to it. Defaults to None.
+
+        Returns:
+            dict: Annotations of the documents by idx.
+        """
+        if ann_res is not None:
+            batch_chars = self.bulk_tuner.get_config()[1] if self.bulk_tuner is not None else \
+                self.bulk_batch_chars or MEDCAT_BATCH_CHARS
+            for batch, _ in MedCatProcessor._iter_batches(input_docs, batch_chars):
+                ann_res.update(self._process_bulk(batch))
+            return ann_res
+
+        if self.bulk_tuner is None:
+            return self._annotate_batch(input_docs, self.bulk_nproc, self.bulk_batch_chars)
+
+        nproc, batch_chars = self.bulk_tuner.get_config()
+        input_docs = list(input_docs)
+        start_time = time.monotonic()
+        ann_res = self._annotate_batch(input_docs, nproc, batch_chars)
+        self.bulk_tuner.record((nproc, batch_chars), sum(len(text) for _, text in input_docs),
+                               time.monotonic() - start_time)
+        return ann_res
+
+    def _process_shards_until(self, input_docs, deadline, ann_res=None):
+        """Annotates the documents shard by shard, starting a new shard only when it is expected to complete
+        before the deadline, given the throughput of the previous shards.
+
+        Args:
+            input_docs (Iterable): Consecutive tuples of (idx, document).
+            deadline (float): The `time.monotonic()` time by which the results are needed.
+            ann_res (SpillBuffer, optional): If provided, the annotations of each shard are added to it.
+                Defaults to None.
+
+        Returns:
+            tuple: (annotations of the processed documents by idx, set of the idx of the deferred documents)
+        """
+        shards = list(MedCatProcessor._iter_batches(input_docs, self.bulk_shard_chars))
+
+        ann_res = {} if ann_res is None else ann_res
+        elapsed, processed_chars = 0.0, 0
+        for i, (shard, shard_chars) in enumerate(shards):
+            time_left = deadline - time.monotonic() - self.bulk_deadline_margin
+            expected_time = elapsed * shard_chars / processed_chars if processed_chars > 0 else 0
+            if time_left <= 0 or expected_time > time_left:
+                return ann_res, {doc_id for deferred_shard, _ in shards[i:] for doc_id, _ in deferred_shard}
+
+            start_time = time.monotonic()
+            nproc = self.bulk_tuner.get_config()[0] if self.bulk_tuner is not None else self.bulk_nproc
+            ann_res.update(self._annotate_batch(shard, nproc, self.bulk_shard_chars))
+            elapsed += time.monotonic() - start_time
+            processed_chars += shard_chars
+        return ann_res, set()
+
+    def _annotate_batch(self, input_docs, nproc, batch_size_chars):
+        """Annotates a batch of documents with the MedCAT subprocesses. When APP_BULK_META_CAT_BATCHING is
+        enabled, the subprocesses only run the named entity recognition and linking, the MetaCAT models being
+        then run over the entities of all the documents at once, in batches of similar length.
+
+        Args:
+            input_docs (Iterable): Consecutive tuples of (idx, document).
+            nproc (int): Number of subprocesses.
+            batch_size_chars (int): Number of characters per batch of the subprocesses, None for the MedCAT
+                default.
+
+        Returns:
+            dict: Annotations of the documents by idx.
+        """
+        kwargs = {"batch_size_chars": batch_size_chars} if batch_size_chars is not None else {}
+        meta_cat_pipes = self._get_batched_meta_cat_pipes()
+        if not meta_cat_pipes:
+            return self.cat.multiprocessing_batch_char_size(input_docs, nproc=nproc, **kwargs)
+
+        input_docs = list(input_docs)
+        with self._pipes_disabled([name for name, _ in meta_cat_pipes]):
+            ann_res = self.cat.multiprocessing_batch_char_size(input_docs, nproc=nproc,
+                                                               separate_nn_components=False, **kwargs)
+        annotate_meta_batched([meta_cat for _, meta_cat in meta_cat_pipes], ann_res, dict(input_docs),
+                              batch_size=self.meta_cat_batch_size)
+        return ann_res
+
+    def _get_batched_meta_cat_pipes(self):
+        """Returns the enabled MetaCAT pipes of the pipeline when they can all be batched across documents.
+
+        Returns:
+            list: Tuples of (pipe name, MetaCAT), empty when MedCAT should run them itself.
+        """
+        if not self.bulk_meta_cat_batching:
+            return []
+
+        spacy_nlp = self.cat.pipe.spacy_nlp
+        meta_cat_pipes = self._get_meta_cat_pipes()
+        # the transformers NER models have to run before the MetaCAT models
+        if any(isinstance(spacy_nlp.get_pipe(name), TransformersNER) for name in spacy_nlp.pipe_names) or \
+                not all(supports_batching(meta_cat) for _, meta_cat in meta_cat_pipes):
+            return []
+        return meta_cat_pipes
+
+    def _get_meta_cat_pipes(self):
+        """Returns the enabled MetaCAT pipes of the pipeline.
+
+        Returns:
+            list: Tuples of (pipe name, MetaCAT), in the order of the pipeline.
+        """
+        spacy_nlp = self.cat.pipe.spacy_nlp
+        pipes = [(name, spacy_nlp.get_pipe(name)) for name in spacy_nlp.pipe_names]
+        return [(name, pipe) for name, pipe in pipes if isinstance(pipe, MetaCAT)]
+
+    @contextmanager
+    def _pipes_disabled(self, names):
+        """Context manager disabling pipes of the MedCAT pipeline, as MedCAT does while it runs its neural
+        components separately, and restoring the torch threads MedCAT sets to 1 for its subprocesses.
+        """
+        import torch
+        torch_threads = torch.get_num_threads()
+        spacy_nlp = self.cat.pipe.spacy_nlp
+        for name in names:
+            spacy_nlp.disable_pipe(name)
+        try:
+            yield
+        finally:
+            for name in names:
+                spacy_nlp.enable_pipe(name)
+            torch.set_num_threads(torch_threads)
+
+    @staticmethod
+    def _iter_batches(input_docs, batch_chars):
+        """Generator function grouping the documents into batches of at least `batch_chars` characters
+        (but the last one).
+
+        Args:
+            input_docs (Iterable): Consecutive tuples of (idx, document).
+            batch_chars (int): Number of characters per batch.
+
+        Yields:
+            tuple: Consecutive tuples of (list of (idx, document), number of characters).
+        """
+        batch, chars = [], 0
+        for doc_id, text in input_docs:
+            batch.append((doc_id, text))
+            chars += len(text)
+            if chars >= batch_chars:
+                yield batch, chars
+                batch, chars = [], 0
+        if batch:
+            yield batch, chars
+
+    @staticmethod
+    def _close_when_done(results, ann_res):
+        """Generator function yielding the results, then deleting the spilled annotations."""
+        try:
+            yield from results
+        finally:
+            ann_res.close()
+
+    @contextmanager
+    def _bulk_torch_threads(self):
+        """Context manager setting the number of torch threads to APP_BULK_TORCH_THREADS while the bulk
+        processing subprocesses are created, so that they inherit it and do not oversubscribe the CPUs.
+        """
+        if self.bulk_torch_threads <= 0:
+            yield
+            return
+
+        import torch
+        torch_threads = torch.get_num_threads()
+        torch.set_num_threads(self.bulk_torch_threads)
+        try:
+            yield
+        finally:
+            torch.set_num_threads(torch_threads)
+
+    def _get_entities(self, text, profiler=None, disabled_pipes=()):
+        """Runs the MedCAT pipeline on the text, timing each pipeline component when profiling.
+
+        Args:
+            text (str): Text to be annotated.
+            profiler (RequestProfiler, optional): Profiler of the current request. Defaults to None.
+            disabled_pipes (tuple, optional): Names of the pipes not run for this text, the shared pipeline being
+                left unchanged. Defaults to ().
+
+        Returns:
+            dict: Entities stored in the same format as returned by `CAT.get_entities`.
+        """
+        if profiler is None and not disabled_pipes:
+            with self._memory_zone():
+                return self.cat.get_entities(text)
+
+        if profiler is None:
+            # mirrors CAT.get_entities, skipping the disabled pipes
+            self.cat.config.linking.train = False
+            text = self.cat._get_trimmed_text(text)
+            with self._memory_zone():
+                doc = self.cat.pipe.spacy_nlp(text, disable=list(disabled_pipes)) if len(text) > 0 else None
+                return self.cat._doc_to_out(doc, only_cui=False, addl_info=ENTITY_ADDL_INFO)
+
+        # mirrors CAT.get_entities, running the spaCy pipeline one component at a time
+        with profiler.span("get_entities", doc_length=len(text)) as span:
+            self.cat.config.linking.train = False
+            text = self.cat._get_trimmed_text(text)
+            doc = None
+            with self._memory_zone():
+                if len(text) > 0:
+                    nlp = self.cat.pipe.spacy_nlp
+                    with profiler.span("spacy:tokenizer"):
+                        doc = nlp.make_doc(text)
+                    for name, component in nlp.pipeline:
+                        if name in disabled_pipes:
+                            continue
+                        with profiler.span(MedCatProcessor._get_component_span_name(name, component)):
+                            doc = component(doc)
+                with profiler.span("doc_to_out"):
+                    out = self.cat._doc_to_out(doc, only_cui=False, addl_info=ENTITY_ADDL_INFO)
+            span["attributes"]["entity_count"] = len(out["entities"])
+        return out
+
+    @staticmethod
+    def _get_component_span_name(name, component):
+        if isinstance(component, MetaCAT):
+            return "meta_cat:" + component.config.general.category_name
+        return {"cat_ner": "ner", "cat_linker": "linking"}.get(name, "spacy:" + name)
+
+    def _memory_zone(self):
+        """Returns the spaCy memory zone (spaCy >= 3.8), which releases the strings interned while processing
+        a document once the output was generated, or a no-op context with older spaCy versions."""
+        nlp = self.cat.pipe.spacy_nlp if hasattr(self.cat, "pipe") else None
+        return nlp.memory_zone() if hasattr(nlp, "memory_zone") else nullcontext()
+
+    def _get_vocab_size(self):
+        """Returns the number of strings interned in the vocab of the spaCy pipeline, or 0 without a pipeline."""
+        return len(self.cat.pipe.spacy_nlp.vocab.strings) if hasattr(self.cat, "pipe") else 0
+
+    def _check_vocab_growth(self):
+        """Re-creates the spaCy pipeline, reusing the loaded CDB, vocab and MetaCAT models, once the spaCy vocab
+        grew by more than `vocab_max_growth` strings since it was loaded. This brings the vocab back to the
+        baseline of the freshly loaded spaCy model. Requests already running keep using the previous pipeline.
+
+        The pipeline is re-created with `CAT._create_pipeline`, a private method of MedCAT (1.x) also used by
+        `CAT.__init__`, so it has to be checked again whenever the pinned MedCAT version is upgraded.
+        """
+        if self.vocab_max_growth <= 0 or self._get_vocab_size() - self._vocab_baseline <= self.vocab_max_growth:
+            return
+
+        with self._vocab_lock:
+            vocab_size = self._get_vocab_size()
+            if vocab_size - self._vocab_baseline <= self.vocab_max_growth:
+                return
+            self.log.info("spaCy vocab grew from %d to %d strings, re-creating the pipeline",
+                          self._vocab_baseline, vocab_size)
+            self.cat._create_pipeline(self.cat.config)
+            self.vocab_resets += 1
+            self._vocab_baseline = self._get_vocab_size()
+
+        release_memory()
+
+    @staticmethod
+    def _span(profiler, name, **attributes):
+        """Returns a span of the profiler, or a no-op context when the request is not profiled."""
+        return profiler.span(name, **attributes) if profiler is not None else nullcontext({"attributes": {}})
+
+    def _get_entities_incremental(self, text, doc_id, version=None, profiler=None):
+        """Annotates a new version of a previously processed document, re-running MedCAT only on the changed
+        regions (plus a context margin) and shifting the offsets of the entities found in the unchanged text.
+        The MetaCAT models are then run over all the entities of the new version, as their context may have
+        changed beyond the re-annotated regions.
+
+        Args:
+            text (str): Text of the new document version.
+            doc_id (str): Document identifier.
+            version (optional): Document version, older versions than the stored one are processed in full
+                and do not replace it.
+            profiler (RequestProfiler, optional): Profiler of the current request. Defaults to None.
+
+        Returns:
+            tuple: (entities, incremental_info), entities being stored in the same format as returned by
+                `CAT.get_entities` and incremental_info holding the stats of the partial pass.
+        """
+        line_offsets = get_line_offsets(text)
+        stored = self.document_store.get(doc_id)
+        stale = stored is not None and is_stale_version(version, stored["version"])
+
+        windows = [(0, len(text))]
+        carried_over = []
+        if stored is not None and not stale:
+            changed_spans, equal_blocks = diff_documents(stored["text"], stored["line_offsets"], text, line_offsets)
+            windows = get_reannotation_windows(changed_spans, text, line_offsets, self.incremental_context_margin)
+            if sum(end - start for start, end in windows) > self.incremental_max_changed_ratio * len(text):
+                windows = [(0, len(text))]
+            else:
+                carried_over = carry_over_entities(stored["entities"], equal_blocks, windows)
+
+        found = []
+        meta_cat_pipes = self._get_meta_cat_pipes()
+        meta_cat_names = tuple(name for name, _ in meta_cat_pipes)
+        for start, end in windows:
+            if start < end:
+                window_entities = self._get_entities(text[start:end], profiler,
+                                                     disabled_pipes=meta_cat_names)["entities"]
+                found.extend(shift_entity(entity, start) for entity in window_entities.values())
+
+        entities = merge_entities(carried_over + found)
+        with MedCatProcessor._span(profiler, "meta_cat"):
+            annotate_meta([meta_cat for _, meta_cat in meta_cat_pipes], entities, text)
+        if not stale:
+            self.document_store.put(doc_id, version, text, line_offsets, list(entities["entities"].values()))
+
+        incremental_info = {"doc_id": doc_id,
+                            "version": version,
+                            "reannotated_chars": sum(end - start for start, end in windows),
+                            "reused_entities": len(carried_over)}
+        return entities, incremental_info
+
+    def _get_entities_segmented(self, text, profiler=None):
+        """Annotates a document paragraph by paragraph, re-using the cached entities of the paragraphs (and their
+        context margin) that were already annotated with the same model.
+
+        Args:
+            text (str): Document text.
+            profiler (RequestProfiler, optional): Profiler of the current request. Defaults to None.
+
+        Returns:
+            tuple: (entities, segment_cache_info), entities being stored in the same format as returned by
+                `CAT.get_entities` and segment_cache_info holding the hit ratio and number of characters skipped.
+        """
+        found = []
+        hits, chars_skipped = 0, 0
+        plan = self.segment_cache.plan(text)
+
+        for segment in plan:
+            start, end = segment["start"], segment["end"]
+            if segment["entities"] is not None:
+                hits += 1
+                chars_skipped += end - start
+            else:
+                window_start, window_end = segment["window"]
+                window_entities = self._get_entities(text[window_start:window_end], profiler)["entities"].values()
+                # entities are assigned to the segment they start in, the context margin belongs to its neighbours
+                segment["entities"] = [shift_entity(entity, window_start - start) for entity in window_entities
+                                       if start <= entity["start"] + window_start < end]
+                self.segment_cache.put(segment["key"], segment["entities"])
+
+            found.extend(shift_entity(entity, start) for entity in segment["entities"])
+
+        segment_cache_info = {"segments": len(plan),
+                              "hits": hits,
+                              "hit_ratio": hits / len(plan),
+                              "chars_skipped": chars_skipped}
+        return merge_entities(found), segment_cache_info
+
+    def _get_entities_parallel(self, text, profiler=None):
+        """Annotates a long document in segments cut at paragraph / sentence boundaries, each one within a window
+        of context overlapping its neighbours, the segments being annotated in parallel by the persistent pool.
+        The entities are merged back with their offsets corrected, each one being kept from the segment it starts
+        in, then the MetaCAT models are run over the entities of the whole document, batched as in a single pass.
+        The document is annotated in a single pass when the pool is broken.
+
+        Args:
+            text (str): Document text.
+            profiler (RequestProfiler, optional): Profiler of the current request. Defaults to None.
+
+        Returns:
+            dict: Entities stored in the same format as returned by `CAT.get_entities`.
+        """
+        # trimmed as MedCAT does in a single pass, so that the same text is annotated
+        text = self.cat._get_trimmed_text(text)
+        segments = split_with_overlap(text, self.parallel_doc_segment_chars, self.parallel_doc_overlap_chars)
+        meta_cat_pipes = self._get_meta_cat_pipes()
+        with MedCatProcessor._span(profiler, "parallel_segments", doc_length=len(text), segments=len(segments),
+                                   nproc=self.segment_pool.nproc) as span:
+            try:
+                segment_entities = self.segment_pool.get_entities(
+                    [text[start:end] for start, end in (segment["window"] for segment in segments)],
+                    disabled_pipes=tuple(name for name, _ in meta_cat_pipes))
+            except BrokenProcessPool:
+                self.log.warning("The pool annotating the segments of long documents is broken, annotating the "
+                                 "document in a single pass")
+                return self._get_entities(text, profiler)
+            entities = merge_segment_entities(segments, segment_entities,
+                                              allow_overlapping=self.cat.config.general.show_nested_entities)
+            span["attributes"]["entity_count"] = len(entities["entities"])
+
+        with MedCatProcessor._span(profiler, "meta_cat"):
+            annotate_meta([meta_cat for _, meta_cat in meta_cat_pipes], entities, text)
+        return entities
+
+    def _get_model_version(self):
+        """Returns a string identifying the loaded model, used to key cached annotations.
+
+        Returns:
+            str: Model identifier.
+        """
+        return ":".join(str(part) for part in [self.app_model, self.app_version, self.cat.config.version.id,
+                                               self.model_card_info.get("meta_cat_model_names")])
+
+    def _create_bulk_tuner(self):
+        """Creates the controller of the bulk processing configuration, the number of subprocesses being capped
+        by the CPUs available to the worker and its CPU quota.
+
+        Returns:
+            BulkTuner: The controller.
+        """
+        max_nproc = min(int(os.getenv("APP_BULK_NPROC_MAX", self.bulk_nproc)), len(get_available_cpus()))
+        cpu_quota = get_cpu_quota()
+        if cpu_quota:
+            max_nproc = min(max_nproc, max(1, math.ceil(cpu_quota)))
+        max_batch_latency = float(os.getenv("APP_BULK_TUNING_MAX_BATCH_LATENCY_MS", 0)) / 1000
+
+        return BulkTuner(nproc_bounds=(int(os.getenv("APP_BULK_NPROC_MIN", 1)), max_nproc),
+                         batch_chars_bounds=(int(os.getenv("APP_BULK_BATCH_CHARS_MIN", 100000)),
+                                             int(os.getenv("APP_BULK_BATCH_CHARS_MAX", 10000000))),
+                         nproc=self.bulk_nproc, batch_chars=self.bulk_batch_chars,
+                         window=int(os.getenv("APP_BULK_TUNING_WINDOW", 50)),
+                         max_batch_latency=max_batch_latency or None)
+
+    def _enable_onnx_meta_cats(self):
+        """Switches the inference of the MetaCAT models to ONNX Runtime, exporting them to APP_META_CAT_ONNX_DIR
+        first when needed. Each model falls back to torch when its export does not match the torch model.
+        """
+        onnx_dir = os.getenv("APP_META_CAT_ONNX_DIR", os.path.join(tempfile.gettempdir(), "medcat_onnx"))
+        quantize = os.getenv("APP_META_CAT_ONNX_QUANTIZE", "False").lower() == "true"
+
+        backends = {}
+        for meta_cat in getattr(self.cat, "_meta_cats", []):
+            backends[meta_cat.config.general["category_name"]] = enable_onnx_backend(
+                meta_cat, onnx_dir, quantize=quantize, num_threads=max(self.torch_threads, 0))
+        self.model_card_info["meta_cat_backends"] = backends
+
     def _populate_model_card_info(self, config: Config):
         """Populates model card information from config.
 
@@ -265,6 +1047,7 @@ class MedCatProcessor(NlpProcessor):
             with open(os.getenv("APP_MODEL_CUI_FILTER_PATH")) as cui_file:
                 all_lines = (line.rstrip() for line in cui_file)
                 cuis_to_keep = [line for line in all_lines if line]  # filter blank lines
+            self.cui_filter = cuis_to_keep
 
         model_pack_path = os.getenv("APP_MEDCAT_MODEL_PACK", "").strip()
 
@@ -350,25 +1133,36 @@ class MedCatProcessor(NlpProcessor):
     # helper generator functions to avoid multiple copies of data
     #
     @staticmethod
-    def _generate_input_doc(documents, invalid_doc_idx):
+    def _generate_input_doc(documents, invalid_doc_idx, duplicate_doc_idx=None):
         """Generator function returning documents to be processed.
 
         Args:
             documents (list): Array of input documents that contain "text" field.
             invalid_doc_idx (list): Array that will contain invalid document idx.
+            duplicate_doc_idx (dict, optional): If provided, documents whose text was already yielded are skipped
+                and this dict will map their idx to the idx of the first identical document. Defaults to None.
 
         Yields:
             tuple: Consecutive tuples of (idx, document).
         """
+        # texts are looked up by their hash, the dict only keeps references to the input strings
+        first_doc_idx = {}
         for i in range(0, len(documents)):
             # assume the document to be processed only when it is not blank
             if documents[i] is not None and "text" in documents[i] and documents[i]["text"] is not None \
                     and len(documents[i]["text"].strip()) > 0:
+                if duplicate_doc_idx is not None:
+                    text = documents[i]["text"]
+                    if text in first_doc_idx:
+                        duplicate_doc_idx[i] = first_doc_idx[text]
+                        continue
+                    first_doc_idx[text] = i
                 yield i, documents[i]["text"]
             else:
                 invalid_doc_idx.append(i)
 
-    def _generate_result(self, in_documents, annotations, invalid_doc_idx, additional_info={}):
+    def _generate_result(self, in_documents, annotations, invalid_doc_idx, additional_info={},
+                         duplicate_doc_idx={}, deferred_doc_idx=()):
         """Generator function merging the resulting annotations with the input documents.
 
         Args:
@@ -376,6 +1170,10 @@ class MedCatProcessor(NlpProcessor):
             annotations (dict): Array of annotations extracted from documents.
             invalid_doc_idx (list): Array of invalid document idx.
             additional_info (dict, optional): Additional information to include in results. Defaults to {}.
+            duplicate_doc_idx (dict, optional): Mapping of duplicate document idx to the idx of the processed
+                identical document. Defaults to {}.
+            deferred_doc_idx (set, optional): Idx of the documents not processed before the request deadline.
+                Defaults to ().
 
         Yields:
             dict: Merged document with annotations.
@@ -383,10 +1181,20 @@ class MedCatProcessor(NlpProcessor):
 
         for i in range(len(in_documents)):
             in_ct = in_documents[i]
-            if not self.DEID_MODE and i in annotations.keys():
+            ann_idx = duplicate_doc_idx.get(i, i)
+            if ann_idx in deferred_doc_idx:
+                # the client can resubmit the deferred documents only
+                out_res = {"text": in_ct["text"],
+                           "annotations": [],
+                           "success": False,
+                           "deferred": True,
+                           "deferred_reason": DEFERRED_REASON,
+                           "timestamp": NlpProcessor._get_timestamp()}
+                out_res.update(additional_info)
+            elif not self.DEID_MODE and ann_idx in annotations.keys():
                 # generate output for valid annotations
 
-                entities = self.process_entities(annotations.get(i))
+                entities = self.process_entities(annotations.get(ann_idx))
 
                 # parse the result
                 out_res = {"text": str(in_ct["text"]),
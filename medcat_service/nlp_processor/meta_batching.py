@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import copy
+import json
+import logging
+import os
+import sys
+import time
+
+from medcat.utils.meta_cat.data_utils import json_to_fake_spacy
+from medcat.utils.meta_cat.ml_utils import predict
+
+log = logging.getLogger("MetaCatBatching")
+log.setLevel(level=os.getenv("APP_LOG_LEVEL", logging.INFO))
+
+
+def supports_batching(meta_cat):
+    """Returns whether the entities of a MetaCAT can be batched across documents, i.e. it annotates the
+    entities of the documents (rather than a span group or the overlapping entities).
+
+    Args:
+        meta_cat (MetaCAT): MetaCAT model.
+
+    Returns:
+        bool: Whether the MetaCAT can be batched.
+    """
+    general = meta_cat.config.general
+    return not general.get("span_group") and not general.get("annotate_overlapping")
+
+
+def collect_samples(meta_cat, docs, id2text):
+    """Collects the context windows of the entities of all the documents, as MetaCAT samples.
+
+    Args:
+        meta_cat (MetaCAT): MetaCAT model, whose tokenizer and context size are used.
+        docs (dict): Annotations of the documents by idx, as returned by MedCAT.
+        id2text (dict): Texts of the documents by idx.
+
+    Returns:
+        tuple: (samples of [token ids, center positions], tuples of (doc idx, entity id) of the samples)
+    """
+    lowercase = meta_cat.config.general["lowercase"]
+    fake_docs = list(json_to_fake_spacy({idx: doc for idx, doc in docs.items() if doc["entities"]}, id2text))
+    if not fake_docs:
+        return [], []
+
+    tokenised = meta_cat.tokenizer([doc.text.lower() if lowercase else doc.text for doc in fake_docs])
+    samples, owners = [], []
+    for doc, tokens in zip(fake_docs, tokenised):
+        ent_id2ind, doc_samples = meta_cat.prepare_document(doc, input_ids=tokens["input_ids"],
+                                                            offset_mapping=tokens["offset_mapping"],
+                                                            lowercase=lowercase)
+        doc_owners = [None] * len(doc_samples)
+        for ent_id, ind in ent_id2ind.items():
+            doc_owners[ind] = (doc.id, ent_id)
+        samples.extend(doc_samples)
+        owners.extend(doc_owners)
+    return samples, owners
+
+
+def get_length_buckets(samples, batch_size):
+    """Groups the samples into batches of similar token length, so that each batch is padded evenly.
+
+    Args:
+        samples (list): Samples of [token ids, center positions].
+        batch_size (int): Number of samples per batch.
+
+    Returns:
+        list: Lists of sample indices, the shortest samples first.
+    """
+    order = sorted(range(len(samples)), key=lambda i: len(samples[i][0]))
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def annotate_meta_batched(meta_cats, docs, id2text, batch_size=None):
+    """Runs the MetaCAT models over the entities of all the documents at once, in batches of samples of similar
+    length, the predictions being scattered back to the "meta_anns" of the entities, in place.
+
+    Args:
+        meta_cats (list): MetaCAT models.
+        docs (dict): Annotations of the documents by idx, as returned by MedCAT with the MetaCAT models disabled.
+        id2text (dict): Texts of the documents by idx.
+        batch_size (int, optional): Number of samples per batch. Defaults to the "batch_size_eval" of each model.
+
+    Returns:
+        int: Number of annotated entities (per model).
+    """
+    num_samples = 0
+    for meta_cat in meta_cats:
+        config = meta_cat.config
+        category_name = config.general["category_name"]
+        id2category_value = {v: k for k, v in config.general["category_value2id"].items()}
+        try:
+            samples, owners = collect_samples(meta_cat, docs, id2text)
+            for bucket in get_length_buckets(samples, batch_size or config.general["batch_size_eval"]):
+                predictions, confidences = predict(meta_cat.model, [samples[i] for i in bucket], config)
+                for i, prediction, confidence in zip(bucket, predictions, confidences):
+                    doc_idx, ent_id = owners[i]
+                    docs[doc_idx]["entities"][ent_id]["meta_anns"][category_name] = {
+                        "value": id2category_value[prediction],
+                        "confidence": float(confidence),
+                        "name": category_name}
+            num_samples = max(num_samples, len(samples))
+        except Exception as e:
+            # as MedCAT does, the entities are then left without this meta-annotation
+            log.warning("Failed to run the %s MetaCAT model: %s", category_name, repr(e), exc_info=True)
+    return num_samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m medcat_service.nlp_processor.meta_batching",
+                                     description="Benchmarks the meta-annotation of the bulk processing: the MetaCAT "
+                                                 "models run by MedCAT over the documents of a batch, against the "
+                                                 "entities of all the documents batched by length. The model is "
+                                                 "loaded as configured for the service (APP_MODEL_* / "
+                                                 "APP_MEDCAT_MODEL_PACK).")
+    parser.add_argument("texts", help="text file with one document per line, or a JSONL file of {\"text\": ...}")
+    parser.add_argument("--num-docs", type=int, default=None,
+                        help="number of documents, the texts being cycled through (default: all the texts)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="number of entities per batch (default: batch_size_eval of the models)")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed runs, the best one being reported")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="[%(asctime)s] [%(levelname)s] %(name)s: %(message)s", level=logging.INFO)
+
+    from medcat.meta_cat import MetaCAT
+
+    from medcat_service.nlp_processor.medcat_processor import MedCatProcessor
+
+    with open(args.texts, encoding="utf-8") as f:
+        texts = [json.loads(line)["text"] if line.lstrip().startswith("{") else line.strip() for line in f]
+    texts = [text for text in texts if text.strip()]
+    num_docs = args.num_docs or len(texts)
+    id2text = {idx: texts[idx % len(texts)] for idx in range(num_docs)}
+
+    cat = MedCatProcessor().cat
+    nn_components = [(name, component) for name, component in cat.pipe.spacy_nlp.components
+                     if isinstance(component, MetaCAT)]
+    if not nn_components:
+        log.error("The model has no MetaCAT models")
+        return 1
+
+    # named entities only, the meta-annotations being benchmarked separately
+    for name, _ in nn_components:
+        cat.pipe.spacy_nlp.disable_pipe(name)
+    docs = {idx: cat.get_entities(text) for idx, text in id2text.items()}
+    num_entities = sum(len(doc["entities"]) for doc in docs.values())
+
+    def run(annotate):
+        best, result = None, None
+        for _ in range(args.repeat):
+            result = copy.deepcopy(docs)
+            start_time = time.perf_counter()
+            annotate(result)
+            elapsed = time.perf_counter() - start_time
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    meta_cats = [component for _, component in nn_components]
+    current_time, current = run(lambda result: cat._run_nn_components(result, nn_components, id2text=id2text))
+    batched_time, batched = run(lambda result: annotate_meta_batched(meta_cats, result, id2text, args.batch_size))
+
+    agreement = [current[idx]["entities"][ent_id]["meta_anns"].get(meta_cat.config.general["category_name"], {})
+                 .get("value") == meta_ann.get("value")
+                 for idx, doc in batched.items() for ent_id, entity in doc["entities"].items()
+                 for meta_cat in meta_cats
+                 for meta_ann in [entity["meta_anns"].get(meta_cat.config.general["category_name"], {})]]
+
+    print("documents: %d, entities: %d, MetaCAT models: %d" % (num_docs, num_entities, len(meta_cats)))
+    for label, elapsed in [("current", current_time), ("batched", batched_time)]:
+        print("%-8s %10.1f ms %10.1f us/entity" % (label, elapsed * 1000, elapsed * 1e6 / max(1, num_entities)))
+    print("speed-up: %.2fx, identical predictions: %.2f%%" % (current_time / batched_time,
+                                                              100 * sum(agreement) / max(1, len(agreement))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import hashlib
+import logging
+import os
+import random
+import sys
+
+import numpy as np
+import torch
+from medcat.utils.meta_cat.ml_utils import predict
+from torch import nn
+
+try:
+    # onnx is needed by the export of the torch models
+    import onnx  # noqa: F401
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+log = logging.getLogger("OnnxMetaCAT")
+log.setLevel(level=os.getenv("APP_LOG_LEVEL", logging.INFO))
+
+ONNX_OPSET_VERSION = 17
+
+# parity requirements of the ONNX models against the torch ones: share of identical predictions and max absolute
+# difference of the confidences, on a set of synthetic samples
+PARITY_SAMPLES = 64
+PARITY_MIN_AGREEMENT = {False: 1.0, True: 0.95}
+PARITY_MAX_CONFIDENCE_DIFF = {False: 1e-3, True: 0.1}
+
+
+class ExportableMetaCAT(nn.Module):
+    """
+    Wraps the torch model of a MetaCAT (LSTM or BERT) with a traceable forward pass, taking the center positions
+    of the entities as a padded [batch, positions] tensor instead of a list of lists. The center positions of a
+    sample are padded by repeating one of them, which does not change the max pooling over them.
+    """
+
+    def __init__(self, model, config):
+        super().__init__()
+        self.model = model
+        self.config = config
+
+    def forward(self, input_ids, attention_mask, center_positions):
+        if self.config.model["model_name"] == "lstm":
+            return self._forward_lstm(input_ids, attention_mask, center_positions)
+        return self._forward_bert(input_ids, attention_mask, center_positions)
+
+    def _forward_lstm(self, input_ids, attention_mask, center_positions):
+        # mirrors medcat.utils.meta_cat.models.LSTM.forward
+        model, config = self.model, self.config.model
+        x = model.embeddings(input_ids)
+        x = nn.utils.rnn.pack_padded_sequence(x, attention_mask.sum(1).view(-1).cpu(), batch_first=True,
+                                              enforce_sorted=False)
+        x, hidden = model.rnn(x)
+        x, _ = nn.utils.rnn.pad_packed_sequence(x, batch_first=True, total_length=input_ids.size(1))
+
+        if config["ignore_cpos"]:
+            x = hidden[0].view(config["num_layers"], config["num_directions"], -1,
+                               config["hidden_size"] // config["num_directions"])
+            x = x[-1, :, :, :].permute(1, 2, 0).reshape(-1, config["hidden_size"])
+        else:
+            x = _max_pool_positions(x, center_positions)
+
+        return model.fc1(model.d1(x))
+
+    def _forward_bert(self, input_ids, attention_mask, center_positions):
+        # mirrors medcat.utils.meta_cat.models.BertForMetaAnnotation.forward
+        model = self.model
+        outputs = model.bert(input_ids, attention_mask=attention_mask, output_hidden_states=True)
+        x = torch.cat((_max_pool_positions(outputs.last_hidden_state, center_positions), outputs[1]), dim=1)
+
+        x = model.relu(model.fc1(model.dropout(x)))
+        architecture = self.config.model.model_architecture_config
+        if architecture is None or architecture["fc2"] is True:
+            x = model.dropout(model.relu(model.fc2(x)))
+            if architecture is None or architecture["fc3"] is True:
+                x = model.dropout(model.relu(model.fc3(x)))
+        return model.fc4(x)
+
+
+class OnnxMetaCATModel(nn.Module):
+    """
+    Drop-in replacement of the torch model of a MetaCAT, running the inference through ONNX Runtime. The session
+    is created lazily in each process, as ONNX Runtime sessions cannot be shared with forked processes.
+    """
+
+    def __init__(self, onnx_path, padding_idx, num_threads=0):
+        super().__init__()
+        self.onnx_path = onnx_path
+        self.padding_idx = padding_idx
+        self.num_threads = num_threads
+        self._session = None
+        self._session_pid = None
+
+    def forward(self, input_ids, center_positions, attention_mask=None, ignore_cpos=False):
+        if attention_mask is None:
+            attention_mask = input_ids != self.padding_idx
+
+        inputs = {"input_ids": input_ids.cpu().numpy().astype(np.int64),
+                  "attention_mask": attention_mask.cpu().numpy().astype(np.int64),
+                  "center_positions": pad_center_positions(center_positions)}
+        logits = self._get_session().run(["logits"], inputs)[0]
+        return torch.from_numpy(logits)
+
+    def _get_session(self):
+        if self._session is None or self._session_pid != os.getpid():
+            options = onnxruntime.SessionOptions()
+            if self.num_threads > 0:
+                options.intra_op_num_threads = self.num_threads
+            self._session = onnxruntime.InferenceSession(self.onnx_path, options,
+                                                         providers=["CPUExecutionProvider"])
+            self._session_pid = os.getpid()
+        return self._session
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_session"], state["_session_pid"] = None, None
+        return state
+
+
+def pad_center_positions(center_positions):
+    """Converts the center positions of a batch, a list of lists of token positions, to a padded array.
+
+    Args:
+        center_positions (list): Center positions (one or more token positions) of each sample.
+
+    Returns:
+        np.ndarray: [batch, positions] array, padded by repeating the first center position of each sample.
+    """
+    center_positions = [positions if isinstance(positions, (list, tuple)) else [positions]
+                        for positions in center_positions]
+    max_positions = max((len(positions) for positions in center_positions), default=1)
+    return np.array([list(positions) + [positions[0]] * (max_positions - len(positions))
+                     for positions in center_positions], dtype=np.int64).reshape(-1, max_positions)
+
+
+def _max_pool_positions(hidden, center_positions):
+    # max over the hidden states at the center positions of each sample: [batch, sequence, hidden] -> [batch, hidden]
+    index = center_positions.unsqueeze(-1).expand(-1, -1, hidden.size(-1))
+    return torch.gather(hidden, 1, index).max(dim=1)[0]
+
+
+def get_onnx_path(meta_cat, onnx_dir, quantize=False):
+    """Returns the path of the ONNX export of a MetaCAT model, keyed by the hash of the model weights.
+
+    Args:
+        meta_cat (MetaCAT): MetaCAT model.
+        onnx_dir (str): Directory of the exported models.
+        quantize (bool): Whether the int8 quantised model is used. Defaults to False.
+
+    Returns:
+        str: Path of the ONNX model.
+    """
+    # MetaCAT.get_hash() is not used, as it changes with every load of models without a training date
+    hasher = hashlib.sha1(str(meta_cat.config.model).encode("utf-8"))
+    for name, tensor in meta_cat.model.state_dict().items():
+        hasher.update(name.encode("utf-8"))
+        hasher.update(tensor.detach().cpu().numpy().tobytes())
+
+    file_name = "%s-%s%s.onnx" % (meta_cat.config.general["category_name"], hasher.hexdigest()[:16],
+                                  "-int8" if quantize else "")
+    return os.path.join(onnx_dir, file_name.replace(os.sep, "_"))
+
+
+def export_meta_cat(meta_cat, onnx_path, quantize=False):
+    """Exports the torch model of a MetaCAT to ONNX, optionally applying dynamic int8 quantisation of the weights.
+
+    Args:
+        meta_cat (MetaCAT): MetaCAT model.
+        onnx_path (str): Path of the exported model.
+        quantize (bool): Whether to quantise the weights to int8. Defaults to False.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(onnx_path)), exist_ok=True)
+    module = ExportableMetaCAT(meta_cat.model, meta_cat.config).eval()
+
+    input_ids = torch.ones((2, 8), dtype=torch.long)
+    attention_mask = torch.ones((2, 8), dtype=torch.long)
+    center_positions = torch.tensor([[1, 2], [3, 3]], dtype=torch.long)
+
+    export_path = onnx_path + ".fp32.tmp" if quantize else onnx_path + ".tmp"
+    torch.onnx.export(module, (input_ids, attention_mask, center_positions), export_path,
+                      input_names=["input_ids", "attention_mask", "center_positions"], output_names=["logits"],
+                      dynamic_axes={"input_ids": {0: "batch", 1: "sequence"},
+                                    "attention_mask": {0: "batch", 1: "sequence"},
+                                    "center_positions": {0: "batch", 1: "positions"},
+                                    "logits": {0: "batch"}},
+                      opset_version=ONNX_OPSET_VERSION, dynamo=False)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(export_path, onnx_path + ".tmp", weight_type=QuantType.QInt8)
+        os.remove(export_path)
+
+    os.replace(onnx_path + ".tmp", onnx_path)
+
+
+def check_parity(meta_cat, onnx_model, quantize=False, n_samples=PARITY_SAMPLES):
+    """Compares the predictions of the ONNX model with the ones of the torch model of the MetaCAT, on synthetic
+    samples of various lengths.
+
+    Args:
+        meta_cat (MetaCAT): MetaCAT model, still holding its torch model.
+        onnx_model (OnnxMetaCATModel): The ONNX model.
+        quantize (bool): Whether the ONNX model is quantised, which allows for larger differences.
+            Defaults to False.
+        n_samples (int): Number of samples. Defaults to 64.
+
+    Returns:
+        tuple: (passed, stats), stats holding the "agreement" and "max_confidence_diff".
+    """
+    config = meta_cat.config
+    rng = random.Random(0)
+    vocab_size = config.general["vocab_size"] or meta_cat.tokenizer.get_size()
+    pad_id = config.model["padding_idx"]
+    max_length = min(int(config.general["cntx_left"] + config.general["cntx_right"] + 1) * 2, 512)
+
+    data = []
+    for _ in range(n_samples):
+        length = rng.randint(2, max_length)
+        input_ids = [token_id if token_id != pad_id else (pad_id + 1) % vocab_size
+                     for token_id in (rng.randrange(vocab_size) for _ in range(length))]
+        start = rng.randrange(length)
+        data.append((input_ids, list(range(start, min(length, start + rng.randint(1, 3))))))
+
+    torch_predictions, torch_confidences = predict(meta_cat.model, data, config)
+    onnx_predictions, onnx_confidences = predict(onnx_model, data, config)
+
+    stats = {"agreement": float(np.mean(np.asarray(torch_predictions) == np.asarray(onnx_predictions))),
+             "max_confidence_diff": float(np.max(np.abs(np.asarray(torch_confidences) -
+                                                        np.asarray(onnx_confidences))))}
+    min_agreement = float(os.getenv("APP_META_CAT_ONNX_MIN_AGREEMENT", PARITY_MIN_AGREEMENT[quantize]))
+    passed = stats["agreement"] >= min_agreement and \
+        stats["max_confidence_diff"] <= PARITY_MAX_CONFIDENCE_DIFF[quantize]
+    return passed, stats
+
+
+def enable_onnx_backend(meta_cat, onnx_dir, quantize=False, num_threads=0):
+    """Switches the inference of a MetaCAT to ONNX Runtime, exporting the model first if it was not exported yet.
+    The torch model is kept when onnx and ONNX Runtime are not installed, the export fails or the outputs of the
+    ONNX model do not match the torch ones.
+
+    Args:
+        meta_cat (MetaCAT): MetaCAT model.
+        onnx_dir (str): Directory of the exported models.
+        quantize (bool): Whether to use the int8 quantised model. Defaults to False.
+        num_threads (int): Number of ONNX Runtime threads, 0 for the ONNX Runtime default. Defaults to 0.
+
+    Returns:
+        str: The backend in use: "onnx", "onnx-int8" or "torch".
+    """
+    category_name = meta_cat.config.general["category_name"]
+    if onnxruntime is None:
+        log.warning("onnx and onnxruntime are not installed (see requirements-onnx.txt), MetaCAT %s runs on torch",
+                    category_name)
+        return "torch"
+
+    try:
+        onnx_path = get_onnx_path(meta_cat, onnx_dir, quantize)
+        if not os.path.exists(onnx_path):
+            log.info("Exporting MetaCAT %s to %s", category_name, onnx_path)
+            export_meta_cat(meta_cat, onnx_path, quantize)
+
+        onnx_model = OnnxMetaCATModel(onnx_path, meta_cat.config.model["padding_idx"], num_threads)
+        passed, stats = check_parity(meta_cat, onnx_model, quantize)
+    except Exception:
+        log.exception("Cannot run MetaCAT %s with ONNX Runtime, falling back to torch", category_name)
+        return "torch"
+
+    if not passed:
+        log.warning("ONNX model of MetaCAT %s does not match the torch model (%s), falling back to torch",
+                    category_name, stats)
+        return "torch"
+
+    log.info("MetaCAT %s runs with ONNX Runtime (%s)", category_name, stats)
+    meta_cat.model = onnx_model
+    return "onnx-int8" if quantize else "onnx"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m medcat_service.nlp_processor.onnx_meta_cat",
+                                     description="Exports MetaCAT models to ONNX, checking the parity of the "
+                                                 "exported models with the torch ones.")
+    parser.add_argument("meta_cat_dirs", nargs="+", help="directories of the saved MetaCAT models")
+    parser.add_argument("--output-dir", required=True, help="directory of the exported models")
+    parser.add_argument("--quantize", action="store_true", help="apply dynamic int8 quantisation of the weights")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="[%(asctime)s] [%(levelname)s] %(name)s: %(message)s", level=logging.INFO)
+
+    from medcat.meta_cat import MetaCAT
+
+    failed = 0
+    for meta_cat_dir in args.meta_cat_dirs:
+        meta_cat = MetaCAT.load(meta_cat_dir)
+        onnx_path = get_onnx_path(meta_cat, args.output_dir, args.quantize)
+        if enable_onnx_backend(meta_cat, args.output_dir, args.quantize) == "torch":
+            failed += 1
+        else:
+            log.info("Exported %s to %s", meta_cat_dir, onnx_path)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from medcat.utils.meta_cat.data_utils import json_to_fake_spacy
+
+from medcat_service.nlp_processor.segment_cache import PARAGRAPH_SEPARATOR
+from medcat_service.nlp_processor.text_utils import merge_entities, shift_entity
+
+log = logging.getLogger("ParallelSegments")
+log.setLevel(level=os.getenv("APP_LOG_LEVEL", logging.INFO))
+
+# boundaries the documents are split at, in order of preference: paragraphs, sentences, then any whitespace
+SENTENCE_END = re.compile(r"[.!?;:]\s+|\n\s*")
+WHITESPACE = re.compile(r"\s+")
+BOUNDARIES = (PARAGRAPH_SEPARATOR, SENTENCE_END, WHITESPACE)
+
+# processor shared with the forked workers of the pool, so that the model is loaded only once
+_processor = None
+
+
+def split_with_overlap(text, segment_chars, overlap_chars):
+    """Splits the text into consecutive segments of at most `segment_chars` characters, cut at paragraph
+    boundaries when possible, then at sentence boundaries, then at whitespace. Each segment is annotated
+    within a window extending it by up to `overlap_chars` characters of context on both sides.
+
+    Args:
+        text (str): Input text.
+        segment_chars (int): Max number of characters per segment.
+        overlap_chars (int): Number of characters of context added on both sides of each segment.
+
+    Returns:
+        list: One dict per segment with the "start" and "end" of the segment and the "window" (the span of
+            text to annotate), the segments covering the whole text.
+    """
+    segments = []
+    start = 0
+    while start < len(text):
+        end = len(text)
+        if end - start > segment_chars:
+            # segments of at least half the max size, so that a missing boundary does not create tiny segments
+            end = _find_boundary(text, start + segment_chars // 2, start + segment_chars, last=True) or \
+                start + segment_chars
+        # the windows are cut between tokens, as far from the segment as the overlap allows
+        window_start, window_end = max(0, start - overlap_chars), min(len(text), end + overlap_chars)
+        if window_start > 0:
+            window_start = _find_boundary(text, window_start, start, last=False, patterns=(WHITESPACE,)) or \
+                window_start
+        if window_end < len(text):
+            window_end = _find_boundary(text, end, window_end, last=True, patterns=(WHITESPACE,)) or window_end
+        segments.append({"start": start, "end": end, "window": (window_start, window_end)})
+        start = end
+    return segments
+
+
+def merge_segment_entities(segments, segment_entities, allow_overlapping=False):
+    """Merges the entities found in the windows of the segments. Each entity is kept from the segment it starts
+    in, the entities found in the context of the neighbouring segments being dropped. Unless overlapping
+    entities are allowed, the longest of two overlapping entities found by neighbouring segments is kept,
+    as MedCAT does within a document.
+
+    Args:
+        segments (list): Segments, as returned by `split_with_overlap`.
+        segment_entities (list): Entities found in the window of each segment, with offsets relative to the window.
+        allow_overlapping (bool, optional): Whether overlapping entities are kept. Defaults to False.
+
+    Returns:
+        dict: Entities stored in the same format as returned by `CAT.get_entities`.
+    """
+    found = []
+    for segment, entities in zip(segments, segment_entities):
+        window_start = segment["window"][0]
+        found.extend(shift_entity(entity, window_start) for entity in entities
+                     if segment["start"] <= entity["start"] + window_start < segment["end"])
+
+    if allow_overlapping:
+        return merge_entities(found)
+
+    kept = []
+    for entity in sorted(found, key=lambda e: (e["start"], e["end"])):
+        if kept and entity["start"] < kept[-1]["end"]:
+            if entity["end"] - entity["start"] > kept[-1]["end"] - kept[-1]["start"]:
+                kept[-1] = entity
+            continue
+        kept.append(entity)
+    return merge_entities(kept)
+
+
+def annotate_meta(meta_cats, entities, text):
+    """Runs the MetaCAT models over the entities of a whole document, as MedCAT does when it runs them apart
+    from the rest of the pipeline, so that the entities are batched as in a single pass over the document.
+
+    Args:
+        meta_cats (list): MetaCAT models, in the order of the pipeline.
+        entities (dict): Entities of the document, in the format returned by `CAT.get_entities`, their
+            "meta_anns" being updated in place.
+        text (str): Document text.
+    """
+    if not meta_cats or not entities["entities"]:
+        return
+    fake_docs = json_to_fake_spacy({0: entities}, id2text={0: text})
+    for meta_cat in meta_cats:
+        fake_docs = meta_cat.pipe(fake_docs)
+    for fake_doc in fake_docs:
+        for ent in fake_doc.ents:
+            # a new dict, as the entities may share theirs with the entities they were copied from
+            entity = entities["entities"][ent._.id]
+            entity["meta_anns"] = dict(entity.get("meta_anns") or {}, **ent._.meta_anns)
+
+
+class SegmentPool:
+    """
+    Persistent pool of subprocesses annotating the segments of long documents. The subprocesses are forked
+    from the worker on first use, once the model is loaded, and are re-used by the next requests. A pool
+    whose subprocess died is re-created on the next request.
+    """
+
+    def __init__(self, processor, nproc):
+        """
+        Args:
+            processor (MedCatProcessor): Processor whose pipeline the subprocesses run.
+            nproc (int): Number of subprocesses.
+        """
+        self.processor = processor
+        self.nproc = nproc
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def get_entities(self, texts, disabled_pipes=()):
+        """Annotates the texts in the subprocesses.
+
+        Args:
+            texts (list): Texts to annotate.
+            disabled_pipes (tuple, optional): Names of the pipes of the pipeline not run. Defaults to ().
+
+        Returns:
+            list: Entities found in each text, in the order of the texts.
+
+        Raises:
+            BrokenProcessPool: If a subprocess died, the pool being re-created on the next call.
+        """
+        executor = self._get_executor()
+        try:
+            return list(executor.map(_get_segment_entities, texts, [disabled_pipes] * len(texts)))
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            raise
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _get_executor(self):
+        global _processor
+        with self._lock:
+            if self._executor is None:
+                _processor = self.processor
+                # the subprocesses are all forked on the first task, inheriting APP_BULK_TORCH_THREADS
+                with self.processor._bulk_torch_threads():
+                    executor = ProcessPoolExecutor(max_workers=self.nproc,
+                                                   mp_context=multiprocessing.get_context("fork"),
+                                                   initializer=_init_segment_worker)
+                    executor.submit(os.getpid).result()
+                self._executor = executor
+                log.info("Started %d subprocesses annotating the segments of long documents", self.nproc)
+            return self._executor
+
+
+def _init_segment_worker():
+    # the lock may have been held by another thread of the worker when the subprocess was forked
+    _processor._vocab_lock = threading.Lock()
+
+
+def _get_segment_entities(text, disabled_pipes):
+    with _processor._pipes_disabled(disabled_pipes):
+        entities = list(_processor._get_entities(text)["entities"].values())
+    # the vocab of the subprocesses grows with the segments they annotate, as the one of the worker does
+    _processor._check_vocab_growth()
+    return entities
+
+
+def _find_boundary(text, lo, hi, last, patterns=BOUNDARIES):
+    """Returns the first (or last) boundary within ]lo, hi[ of the most preferred kind found there, or None."""
+    for pattern in patterns:
+        positions = [lo + match.end() for match in pattern.finditer(text[lo:hi])]
+        positions = [position for position in positions if lo < position < hi]
+        if positions:
+            return positions[-1] if last else positions[0]
+    return None
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from array import array
+from collections import deque
+
+from medcat_service.utils.pickle_cache import load_or_build
+
+log = logging.getLogger("Screening")
+log.setLevel(level=os.getenv("APP_LOG_LEVEL", logging.INFO))
+
+# the text and the CDB names are tokenised alike: words and sentence punctuation, so that e.g. "type-2" and
+# "type 2" match the same names while names are not matched across sentences
+TOKEN_PATTERN = re.compile(r"\w+|[.;:!?]")
+
+# bumped whenever the pickled automaton layout changes, so that stale caches are not loaded
+AUTOMATON_FORMAT_VERSION = 1
+
+# transitions are keyed by (state << TOKEN_BITS) + token id
+TOKEN_BITS = 32
+
+
+class NameAutomaton:
+    """
+    Aho-Corasick automaton over the tokens of the CDB names, matching all the names found in a text in a single
+    pass over its tokens. The transitions are kept in a single dict keyed by integers and the failure / output
+    links in arrays, which keeps the automaton compact enough for full-size CDBs.
+    """
+
+    def __init__(self):
+        self.names = []
+        self._token_ids = {}
+        self._goto = {}
+        self._children = [[]]
+        self._fail = array("l", [0])
+        self._out = array("l", [0])
+        self._name_at = array("l", [-1])
+
+    @property
+    def num_states(self):
+        return len(self._name_at)
+
+    def add_name(self, name, cuis):
+        """Adds a name, the automaton must be compiled again afterwards.
+
+        Args:
+            name (str): Name, tokenised as the text.
+            cuis (Iterable): CUIs of the name.
+
+        Returns:
+            bool: Whether the name was added, i.e. it has at least one token.
+        """
+        tokens = TOKEN_PATTERN.findall(name.lower())
+        if not tokens:
+            return False
+
+        state = 0
+        for token in tokens:
+            token_id = self._token_ids.setdefault(token, len(self._token_ids))
+            key = (state << TOKEN_BITS) + token_id
+            next_state = self._goto.get(key)
+            if next_state is None:
+                next_state = len(self._name_at)
+                self._goto[key] = next_state
+                self._children[state].append((token_id, next_state))
+                self._children.append([])
+                self._fail.append(0)
+                self._out.append(0)
+                self._name_at.append(-1)
+            state = next_state
+
+        if self._name_at[state] < 0:
+            self._name_at[state] = len(self.names)
+            self.names.append((len(tokens), name, tuple(cuis)))
+        else:
+            # the same tokens, e.g. names only differing in their punctuation
+            length, first_name, first_cuis = self.names[self._name_at[state]]
+            self.names[self._name_at[state]] = (length, first_name, tuple(dict.fromkeys(first_cuis + tuple(cuis))))
+        return True
+
+    def compile(self):
+        """Computes the failure and output links, breadth-first."""
+        queue = deque()
+        for _, child in self._children[0]:
+            self._fail[child] = 0
+            queue.append(child)
+
+        while queue:
+            state = queue.popleft()
+            for token_id, child in self._children[state]:
+                fail = self._fail[state]
+                while fail and (fail << TOKEN_BITS) + token_id not in self._goto:
+                    fail = self._fail[fail]
+                fail = self._goto.get((fail << TOKEN_BITS) + token_id, 0)
+                self._fail[child] = fail if fail != child else 0
+                # the next state along the failure links where a name ends
+                self._out[child] = self._fail[child] if self._name_at[self._fail[child]] >= 0 \
+                    else self._out[self._fail[child]]
+                queue.append(child)
+
+    def tokenise(self, text):
+        """Splits the text into tokens.
+
+        Returns:
+            tuple: (token ids, -1 for the tokens not in any name, start offsets, end offsets)
+        """
+        token_ids, starts, ends = [], [], []
+        get_token_id = self._token_ids.get
+        for match in TOKEN_PATTERN.finditer(text):
+            token_ids.append(get_token_id(match.group().lower(), -1))
+            starts.append(match.start())
+            ends.append(match.end())
+        return token_ids, starts, ends
+
+    def iter_matches(self, text):
+        """Generator function finding all the names in the text, overlapping ones included.
+
+        Args:
+            text (str): Text to search.
+
+        Yields:
+            tuple: Consecutive tuples of (start, end, name index) ordered by their end.
+        """
+        token_ids, starts, ends = self.tokenise(text)
+        goto, fail, out, name_at, names = self._goto, self._fail, self._out, self._name_at, self.names
+
+        state = 0
+        for i, token_id in enumerate(token_ids):
+            if token_id < 0:
+                # no name has this token, all the partial matches end here
+                state = 0
+                continue
+            while True:
+                next_state = goto.get((state << TOKEN_BITS) + token_id)
+                if next_state is not None:
+                    state = next_state
+                    break
+                if state == 0:
+                    break
+                state = fail[state]
+
+            match_state = state if name_at[state] >= 0 else out[state]
+            while match_state:
+                name_index = name_at[match_state]
+                yield starts[i - names[name_index][0] + 1], ends[i], name_index
+                match_state = out[match_state]
+
+    def find(self, text):
+        """Finds the names in the text, keeping the leftmost-longest of overlapping matches.
+
+        Args:
+            text (str): Text to search.
+
+        Returns:
+            list: Tuples of (start, end, name, cuis) ordered by their start.
+        """
+        matches = sorted(self.iter_matches(text), key=lambda match: (match[0], -match[1]))
+        found, last_end = [], -1
+        for start, end, name_index in matches:
+            if start >= last_end:
+                _, name, cuis = self.names[name_index]
+                found.append((start, end, name, cuis))
+                last_end = end
+        return found
+
+    def __getstate__(self):
+        # the children lists are only needed to compile the automaton
+        state = dict(self.__dict__)
+        state["_children"] = None
+        return state
+
+
+def get_cdb_fingerprint(cdb):
+    """Returns a hash of the names of the CDB, and of the settings the automaton is built with.
+
+    Args:
+        cdb (CDB): MedCAT concept database.
+
+    Returns:
+        str: Hex digest.
+    """
+    digest = hashlib.sha1()
+    digest.update(("%d:%s:%s:" % (AUTOMATON_FORMAT_VERSION, cdb.config.general.separator,
+                                  cdb.config.ner.min_name_len)).encode("utf-8"))
+    for name, cuis in cdb.name2cuis.items():
+        digest.update(name.encode("utf-8"))
+        digest.update(("\0" + "\0".join(cuis) + "\n").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def compile_cdb(cdb):
+    """Compiles the names of the CDB into an automaton. The names shorter than `config.ner.min_name_len`
+    characters are left out, as MedCAT does.
+
+    Args:
+        cdb (CDB): MedCAT concept database.
+
+    Returns:
+        NameAutomaton: The compiled automaton.
+    """
+    separator = cdb.config.general.separator
+    min_name_len = cdb.config.ner.min_name_len
+
+    automaton = NameAutomaton()
+    for name, cuis in cdb.name2cuis.items():
+        if cuis and len(name.replace(separator, "")) >= min_name_len:
+            automaton.add_name(name.replace(separator, " "), cuis)
+    automaton.compile()
+    return automaton
+
+
+def load_or_compile(cdb, cache_dir=None):
+    """Loads the automaton of the CDB from the cache directory, compiling it (and caching it) when missing.
+
+    Args:
+        cdb (CDB): MedCAT concept database.
+        cache_dir (str, optional): Cache directory. Defaults to a "medcat_screening" directory in the temp dir.
+
+    Returns:
+        NameAutomaton: The compiled automaton.
+    """
+    cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "medcat_screening")
+    cache_path = os.path.join(cache_dir, "automaton-%s.pkl" % get_cdb_fingerprint(cdb))
+
+    def compile_and_log():
+        automaton = compile_cdb(cdb)
+        log.info("Compiled the screening automaton: %d names, %d states", len(automaton.names), automaton.num_states)
+        return automaton
+
+    return load_or_build(cache_path, compile_and_log, "screening automaton")
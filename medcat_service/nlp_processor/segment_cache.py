@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from medcat_service.nlp_processor.text_utils import expand_to_line_boundaries, get_line_offsets
+
+# paragraphs / sections are separated by at least one blank line
+PARAGRAPH_SEPARATOR = re.compile(r"\n[ \t\r\f\v]*\n\s*")
+
+
+def split_paragraphs(text):
+    """Splits the text into consecutive paragraph segments, each one including its trailing separator.
+
+    Args:
+        text (str): Input text.
+
+    Returns:
+        list: List of (start, end) spans covering the whole text.
+    """
+    segments = []
+    start = 0
+    for match in PARAGRAPH_SEPARATOR.finditer(text):
+        segments.append((start, match.end()))
+        start = match.end()
+    if start < len(text) or not segments:
+        segments.append((start, len(text)))
+    return segments
+
+
+class SegmentCache:
+    """
+    Bounded (LRU) cache of the entities found in text segments, keyed by the hash of the segment, its context
+    margin and the model version. Used to skip re-annotating boilerplate text shared across documents.
+    """
+
+    def __init__(self, model_version, max_size=10000, context_margin=100):
+        self.model_version = model_version
+        self.max_size = max_size
+        self.context_margin = context_margin
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def plan(self, text):
+        """Splits the text into segments and looks each of them up in the cache.
+
+        Args:
+            text (str): Input text.
+
+        Returns:
+            list: One dict per segment with the "key", "start", "end", "window" (the span of text to annotate
+                on a cache miss, including the context margin) and "entities" (None on a cache miss) fields.
+        """
+        line_offsets = get_line_offsets(text)
+        plan = []
+        for start, end in split_paragraphs(text):
+            window = expand_to_line_boundaries(line_offsets, len(text), start, end, self.context_margin)
+            key = self._get_key(text, start, end, window)
+            plan.append({"key": key, "start": start, "end": end, "window": window, "entities": self.get(key)})
+        return plan
+
+    def get(self, key):
+        with self._lock:
+            entities = self._entries.get(key)
+            if entities is not None:
+                self._entries.move_to_end(key)
+            return entities
+
+    def put(self, key, entities):
+        """Stores the entities of a segment, with their offsets relative to the segment start.
+
+        Args:
+            key (str): Segment key, as returned in the segment plan.
+            entities (list): List of MedCAT entities.
+        """
+        with self._lock:
+            self._entries[key] = entities
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _get_key(self, text, start, end, window):
+        hasher = hashlib.sha1(self.model_version.encode("utf-8"))
+        hasher.update(str(start - window[0]).encode("utf-8"))
+        hasher.update(str(end - window[0]).encode("utf-8"))
+        hasher.update(text[window[0]:window[1]].encode("utf-8", errors="surrogatepass"))
+        return hasher.hexdigest()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import pickle
+import tempfile
+from collections.abc import Mapping
+
+log = logging.getLogger("SpillBuffer")
+log.setLevel(level=os.getenv("APP_LOG_LEVEL", logging.INFO))
+
+
+class SpillBuffer(Mapping):
+    """
+    Read-only mapping of the per-document results of a bulk request, by idx, bounded in memory: the results are
+    kept in memory until their pickled size reaches the budget, the next ones being appended to an anonymous
+    temporary file and read back from it, one at a time, when the response is written.
+    """
+
+    def __init__(self, max_memory_bytes, spill_dir=None):
+        """
+        Args:
+            max_memory_bytes (int): Size of the results kept in memory, as pickled.
+            spill_dir (str, optional): Directory of the temporary file. Defaults to the temp dir.
+        """
+        self.max_memory_bytes = max_memory_bytes
+        self.spill_dir = spill_dir
+        self.memory_bytes = 0
+        self.spilled_bytes = 0
+        # counted as the results are added, so that the spilled results need not be read back to count them
+        self.entity_count = 0
+        self._in_memory = {}
+        self._spilled = {}
+        self._file = None
+        self._flushed = True
+
+    @property
+    def spilled_count(self):
+        return len(self._spilled)
+
+    def add(self, idx, result):
+        """Adds the result of a document, spilling it to disk when the memory budget is used up.
+
+        Args:
+            idx (int): Idx of the document.
+            result (Any): Picklable result.
+        """
+        data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        if isinstance(result, dict):
+            self.entity_count += len(result.get("entities") or ())
+        if not self._spilled and self.memory_bytes + len(data) <= self.max_memory_bytes:
+            self._in_memory[idx] = result
+            self.memory_bytes += len(data)
+            return
+
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(dir=self.spill_dir)
+            log.info("Bulk results over the memory budget of %d bytes, spilling to disk", self.max_memory_bytes)
+        offset = self._file.seek(0, os.SEEK_END)
+        self._file.write(data)
+        self._flushed = False
+        self._spilled[idx] = (offset, len(data))
+        self.spilled_bytes += len(data)
+
+    def update(self, results):
+        """Adds the results of documents.
+
+        Args:
+            results (dict): Results by idx.
+        """
+        for idx, result in results.items():
+            self.add(idx, result)
+
+    def close(self):
+        """Deletes the temporary file, the spilled results being no longer available."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __getitem__(self, idx):
+        if idx in self._in_memory:
+            return self._in_memory[idx]
+        offset, length = self._spilled[idx]
+        if not self._flushed:
+            self._file.flush()
+            self._flushed = True
+        return pickle.loads(os.pread(self._file.fileno(), length, offset))
+
+    def __contains__(self, idx):
+        return idx in self._in_memory or idx in self._spilled
+
+    def __iter__(self):
+        yield from self._in_memory
+        yield from self._spilled
+
+    def __len__(self):
+        return len(self._in_memory) + len(self._spilled)
+
+    def __del__(self):
+        self.close()
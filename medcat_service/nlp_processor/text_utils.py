@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import bisect
+
+
+def get_line_offsets(text):
+    """Returns the start offsets of every line in the text.
+
+    Args:
+        text (str): Input text.
+
+    Returns:
+        list: Character offsets at which each line starts, the first one always being 0.
+    """
+    offsets = [0]
+    for line in text.splitlines(keepends=True)[:-1]:
+        offsets.append(offsets[-1] + len(line))
+    return offsets
+
+
+def expand_to_line_boundaries(line_offsets, text_len, start, end, margin=0):
+    """Expands a character span by a margin and snaps it outwards to the enclosing line boundaries.
+
+    Args:
+        line_offsets (list): Line start offsets, as returned by `get_line_offsets`.
+        text_len (int): Length of the text the offsets refer to.
+        start (int): Span start.
+        end (int): Span end.
+        margin (int, optional): Number of characters of context added on both sides. Defaults to 0.
+
+    Returns:
+        tuple: (start, end) of the expanded span.
+    """
+    start = max(0, start - margin)
+    end = min(text_len, end + margin)
+
+    start = line_offsets[bisect.bisect_right(line_offsets, start) - 1]
+    next_line = bisect.bisect_left(line_offsets, end)
+    end = line_offsets[next_line] if next_line < len(line_offsets) else text_len
+
+    return start, end
+
+
+def merge_spans(spans):
+    """Merges overlapping or touching spans.
+
+    Args:
+        spans (list): List of (start, end) tuples.
+
+    Returns:
+        list: Sorted list of non-overlapping (start, end) tuples.
+    """
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def shift_entity(entity, offset):
+    """Returns a copy of a MedCAT entity with its character offsets shifted.
+
+    Args:
+        entity (dict): MedCAT entity, as found in the output of `CAT.get_entities`.
+        offset (int): Number of characters to shift the entity by.
+
+    Returns:
+        dict: The shifted entity.
+    """
+    entity = dict(entity)
+    entity["start"] += offset
+    entity["end"] += offset
+    return entity
+
+
+def merge_entities(entities):
+    """Builds a MedCAT-like output dict from a list of entities, re-assigning the entity ids by position.
+
+    Args:
+        entities (list): List of MedCAT entities.
+
+    Returns:
+        dict: Entities stored in the same format as returned by `CAT.get_entities`.
+    """
+    out = {"entities": {}, "tokens": []}
+    for idx, entity in enumerate(sorted(entities, key=lambda e: (e["start"], e["end"]))):
+        entity["id"] = idx
+        out["entities"][idx] = entity
+    return out
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from .nlp_service import MedCatService, NlpService
+from .nlp_service import CoordinatorService, MedCatService, NlpService
 
-__all__ = ['NlpService', 'MedCatService']
+__all__ = ['NlpService', 'MedCatService', 'CoordinatorService']
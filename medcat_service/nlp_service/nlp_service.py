@@ -3,7 +3,7 @@
 
 import injector
 
-from medcat_service.nlp_processor import MedCatProcessor
+from medcat_service.nlp_processor import CoordinatorProcessor, MedCatProcessor
 
 
 class NlpService:
@@ -31,3 +31,13 @@ class MedCatService(NlpService):
     def __init__(self, nlp_processor: MedCatProcessor):
         super().__init__()
         self.nlp = nlp_processor
+
+
+class CoordinatorService(NlpService):
+    """"
+    Coordinator Service -- wrapper around the coordinator processor, dispatching the documents to MedCAT services
+    """
+    @injector.inject
+    def __init__(self, nlp_processor: CoordinatorProcessor):
+        super().__init__()
+        self.nlp = nlp_processor
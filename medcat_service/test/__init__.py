@@ -1,2 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+
+import os
+
+# the gRPC tests fork the bulk processing workers while the server threads are running, which requires the gRPC
+# fork handlers to be disabled before grpc is first imported (see medcat_service.grpc_server)
+os.environ.setdefault("GRPC_ENABLE_FORK_SUPPORT", "false")
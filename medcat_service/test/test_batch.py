@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import torch
+
+import medcat_service.batch.annotator as annotator
+import medcat_service.test.common as common
+import medcat_service.test.test_service as test_service
+from medcat_service.batch import annotate_directory
+from medcat_service.nlp_processor import MedCatProcessor
+from medcat_service.utils.arrow_results import pq
+
+
+class TestBatchAnnotation(unittest.TestCase):
+    """
+    Implementation of test cases for the offline batch annotation
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        test_service.TestMedcatService._setup_logging(cls)
+        test_service.TestMedcatService._setup_medcat_processor(cls)
+        cls.processor = MedCatProcessor()
+
+    def setUp(self):
+        self.input_dir = tempfile.mkdtemp()
+        self.output_dir = tempfile.mkdtemp()
+
+        docs = [common.get_example_short_document(), common.get_example_long_document()] * 3
+        with open(os.path.join(self.input_dir, "notes.jsonl"), "w") as f:
+            for i, doc in enumerate(docs):
+                f.write(json.dumps({"id": "doc-%d" % i, "text": doc}) + "\n")
+
+        os.makedirs(os.path.join(self.input_dir, "letters"))
+        with open(os.path.join(self.input_dir, "letters", "letters.csv"), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["id", "text"])
+            writer.writeheader()
+            writer.writerows({"id": "letter-%d" % i, "text": doc} for i, doc in enumerate(docs[:4]))
+
+    def tearDown(self):
+        shutil.rmtree(self.input_dir)
+        shutil.rmtree(self.output_dir)
+
+    def _read_output(self):
+        results = {}
+        for file_name in os.listdir(self.output_dir):
+            if file_name.endswith(".jsonl") and file_name != "checkpoint.jsonl":
+                with open(os.path.join(self.output_dir, file_name)) as f:
+                    results.update((result["id"], result) for result in map(json.loads, f))
+        return results
+
+    def testAnnotateDirectory(self):
+        stats = annotate_directory(self.input_dir, self.output_dir, processor=self.processor, nproc=2, shard_size=4)
+        self.assertEqual(stats["docs"], 10)
+        self.assertEqual(stats["eta_sec"], 0)
+
+        results = self._read_output()
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(result["success"] for result in results.values()))
+        self.assertGreater(len(results["doc-1"]["annotations"][0]), 0)
+        self.assertNotIn("text", results["doc-1"])
+        self.assertEqual(sorted(f for f in os.listdir(self.output_dir) if f != "checkpoint.jsonl"),
+                         ["letters__letters-000000.jsonl", "notes-000000.jsonl", "notes-000001.jsonl"])
+
+    def testAnnotateDirectoryMalformedDocuments(self):
+        with open(os.path.join(self.input_dir, "malformed.jsonl"), "w") as f:
+            f.write(json.dumps({"id": "number", "text": 42}) + "\n")
+            f.write(json.dumps({"id": "object", "text": {"body": "Patient has diabetes."}}) + "\n")
+            f.write(json.dumps({"id": "valid", "text": common.get_example_short_document()}) + "\n")
+
+        stats = annotate_directory(self.input_dir, self.output_dir, processor=self.processor, nproc=2, shard_size=4)
+        self.assertEqual(stats["docs"], 13)
+
+        results = self._read_output()
+        self.assertEqual(len(results), 13)
+        for doc_id in ["number", "object"]:
+            self.assertFalse(results[doc_id]["success"])
+            self.assertIn("'text' field should be a string", results[doc_id]["errors"][0])
+        self.assertTrue(results["valid"]["success"])
+
+    def testAnnotateDirectoryResume(self):
+        annotate_directory(self.input_dir, self.output_dir, processor=self.processor, nproc=2, shard_size=4)
+        os.remove(os.path.join(self.output_dir, "notes-000001.jsonl"))
+
+        stats = annotate_directory(self.input_dir, self.output_dir, processor=self.processor, nproc=2, shard_size=4)
+        self.assertEqual(stats["processed_docs"], 2)
+        self.assertEqual(stats["docs"], 10)
+        self.assertEqual(len(self._read_output()), 10)
+
+        with self.assertRaises(ValueError):
+            annotate_directory(self.input_dir, self.output_dir, processor=self.processor, nproc=2, shard_size=8)
+
+    @unittest.skipIf(pq is None, "pyarrow is not installed")
+    def testAnnotateDirectoryParquetOutput(self):
+        annotate_directory(self.input_dir, self.output_dir, processor=self.processor, nproc=2, shard_size=4,
+                           output_format="parquet")
+        self.assertEqual(sorted(f for f in os.listdir(self.output_dir) if f != "checkpoint.jsonl"),
+                         ["letters__letters-000000.parquet", "notes-000000.parquet", "notes-000001.parquet"])
+
+        table = pq.read_table(os.path.join(self.output_dir, "notes-000001.parquet"))
+        self.assertGreater(table.num_rows, 0)
+        self.assertEqual(set(table.column("doc_id").to_pylist()), {"doc-4", "doc-5"})
+        self.assertEqual(set(table.column("doc_index").to_pylist()), {0, 1})
+        self.assertTrue(all(table.column("success").to_pylist()))
+        starts, ends = table.column("start").to_pylist(), table.column("end").to_pylist()
+        self.assertTrue(all(end > start for start, end in zip(starts, ends) if start is not None))
+
+    def testWorkerInitialisation(self):
+        self.addCleanup(torch.set_num_threads, torch.get_num_threads())
+        with mock.patch.object(annotator, "_processor", self.processor), \
+                mock.patch.object(self.processor, "segment_pool", mock.Mock()), \
+                mock.patch.object(self.processor, "bulk_torch_threads", -1):
+            annotator._init_worker()
+            # the workers do not inherit the torch threads nor the segment pool of the parent
+            self.assertEqual(torch.get_num_threads(), 1)
+            self.assertIsNone(self.processor.segment_pool)
+
+
+if __name__ == '__main__':
+    unittest.main()
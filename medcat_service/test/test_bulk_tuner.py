@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from medcat_service.nlp_processor.bulk_tuner import BulkTuner
+
+
+class TestBulkTuner(unittest.TestCase):
+    """
+    Implementation of test cases for the adaptive bulk processing controller, against a simulated throughput
+    """
+
+    @staticmethod
+    def _run(tuner, throughput, runs, chars=1000000):
+        # runs bulk requests of `chars` characters, their time following the throughput of the configuration
+        for _ in range(runs):
+            config = tuner.get_config()
+            tuner.record(config, chars, chars / throughput(*config))
+
+    def testConvergesToFastestConfig(self):
+        # throughput peaking at 4 subprocesses and 400000 chars per batch
+        def throughput(nproc, batch_chars):
+            return 100000 * (4 - abs(nproc - 4)) * (1 - abs(batch_chars - 400000) / 2000000)
+
+        tuner = BulkTuner(nproc_bounds=(1, 6), batch_chars_bounds=(50000, 1600000), nproc=1, batch_chars=100000)
+        self._run(tuner, throughput, 100)
+
+        self.assertEqual(tuner.best, (4, 400000))
+        self.assertEqual(tuner.get_info()["best"], {"nproc": 4, "batch_size_chars": 400000})
+        self.assertTrue(any(change["reason"].startswith("adopted") for change in tuner.get_info()["history"]))
+
+    def testStaysWithinBounds(self):
+        tuner = BulkTuner(nproc_bounds=(2, 3), batch_chars_bounds=(100000, 200000), nproc=8, batch_chars=10)
+        self.assertEqual(tuner.get_config(), (3, 100000))
+
+        seen = set()
+        for _ in range(50):
+            seen.add(tuner.get_config())
+            self._run(tuner, lambda nproc, batch_chars: nproc * batch_chars / 1000, 1)
+        self.assertTrue(all(2 <= nproc <= 3 and 100000 <= batch_chars <= 200000 for nproc, batch_chars in seen))
+        self.assertEqual(tuner.best, (3, 200000))
+
+    def testSlowBatchesArePenalised(self):
+        # larger batches are faster overall, but the batches of 400000 chars take longer than the max latency
+        def throughput(nproc, batch_chars):
+            return 10000 + batch_chars / 100
+
+        tuner = BulkTuner(nproc_bounds=(1, 1), batch_chars_bounds=(100000, 400000), batch_chars=100000,
+                          max_batch_latency=20)
+        self._run(tuner, throughput, 20)
+
+        self.assertEqual(tuner.best, (1, 200000))
+
+    def testAdaptsToChangingThroughput(self):
+        tuner = BulkTuner(nproc_bounds=(1, 2), batch_chars_bounds=(100000, 100000), nproc=1, window=10)
+        self._run(tuner, lambda nproc, batch_chars: 1000 * nproc, 20)
+        self.assertEqual(tuner.best, (2, 100000))
+
+        # e.g. concurrent traffic now competing for the CPUs
+        self._run(tuner, lambda nproc, batch_chars: 1000 / nproc, 40)
+        self.assertEqual(tuner.best, (1, 100000))
+
+    def testSmallRunsAreIgnored(self):
+        tuner = BulkTuner(nproc_bounds=(1, 4), batch_chars_bounds=(100000, 100000), min_chars=20000)
+        self._run(tuner, lambda nproc, batch_chars: 1000, 10, chars=100)
+
+        self.assertEqual(tuner.get_info()["configs"], [])
+        self.assertEqual(tuner.get_config(), (4, 100000))
+
+
+if __name__ == '__main__':
+    unittest.main()
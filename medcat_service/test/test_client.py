@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Response
+
+import medcat_service.test.test_service as test_service
+from medcat_service.client import AsyncMedCATClient, MedCATClient, MedCATClientError
+from medcat_service.utils.arrow_results import iter_entities
+
+
+class OverloadedApp:
+    """
+    WSGI middleware answering the next requests with the statuses queued in `statuses`, as an overloaded service
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.statuses = []
+        self.content_encodings = []
+
+    def __call__(self, environ, start_response):
+        self.content_encodings.append(environ.get("HTTP_CONTENT_ENCODING"))
+        if self.statuses:
+            return Response("Overloaded", status=self.statuses.pop(0),
+                            headers={"Retry-After": "0"})(environ, start_response)
+        return self.app(environ, start_response)
+
+
+class TestMedCATClient(unittest.TestCase):
+    """
+    Implementation of test cases for the Python client of the service, run against the Flask app
+    """
+
+    TEXTS = ["The patient was prescribed aspirin.", "No rash.", "Kidney failure and heart problems.",
+             "Nothing here.", "Clonidine and vyvanse were stopped.", "Aspirin for the heart."]
+
+    @classmethod
+    def setUpClass(cls):
+        test_service.TestMedcatService._setup_logging(cls)
+        test_service.TestMedcatService._setup_medcat_processor(cls)
+        test_service.TestMedcatService._setup_flask_app(cls)
+
+        cls.wsgi_app = OverloadedApp(cls.app)
+        cls.server = make_server("127.0.0.1", 0, cls.wsgi_app, threaded=True)
+        cls.url = "http://127.0.0.1:%d" % cls.server.server_port
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.wsgi_app.statuses = []
+        self.wsgi_app.content_encodings = []
+
+    def _check_results(self, results, texts):
+        self.assertEqual([result["text"] for result in results], texts)
+        self.assertTrue(all(result["success"] for result in results))
+
+    def testConcurrentCallsAreBatched(self):
+        with MedCATClient(self.url, max_batch_delay=0.5, compress_min_bytes=0) as client:
+            with ThreadPoolExecutor(max_workers=len(self.TEXTS)) as executor:
+                results = list(executor.map(client.process, self.TEXTS))
+            stats = client.get_stats()
+
+        self._check_results(results, self.TEXTS)
+        self.assertEqual(stats["documents"], len(self.TEXTS))
+        self.assertLess(stats["requests"], len(self.TEXTS))
+        self.assertGreaterEqual(stats["bulk_requests"], 1)
+        self.assertIn("gzip", self.wsgi_app.content_encodings)
+
+    def testBulkIsSplitByCharacters(self):
+        with MedCATClient(self.url, max_batch_chars=80, max_in_flight=2, compression="zstd") as client:
+            results = client.process_bulk(self.TEXTS)
+            stats = client.get_stats()
+            info = client.info()
+
+        self._check_results(results, self.TEXTS)
+        # 77 + 70 characters
+        self.assertEqual(stats["bulk_requests"], 2)
+        self.assertEqual(stats["requests"], 2)
+        self.assertIn("service_app_name", info)
+
+    def testFilteredDocumentsAreSentAlone(self):
+        with MedCATClient(self.url) as client:
+            result = client.process(self.TEXTS[0], meta_anns_filters=[["Status", ["NoSuchValue"]]])
+            self.assertEqual(client.get_stats()["bulk_requests"], 0)
+        self.assertEqual(result["text"], self.TEXTS[0])
+        self.assertEqual(list(iter_entities(result["annotations"])), [])
+
+    def testRetries(self):
+        self.wsgi_app.statuses = [503, 429]
+        with MedCATClient(self.url, backoff=0.01) as client:
+            self.assertIn("service_app_name", client.info())
+            self.assertEqual(client.get_stats()["retries"], 2)
+
+        self.wsgi_app.statuses = [503] * 3
+        with MedCATClient(self.url, retries=1, backoff=0.01) as client:
+            with self.assertRaises(MedCATClientError) as context:
+                client.process("aspirin")
+            self.assertEqual(context.exception.status_code, 503)
+            self.assertEqual(client.get_stats()["errors"], 1)
+
+        # the requests refused by the service are not retried
+        self.wsgi_app.statuses = [400]
+        with MedCATClient(self.url) as client:
+            with self.assertRaises(MedCATClientError):
+                client.info()
+            self.assertEqual(client.get_stats()["retries"], 0)
+
+    def testAsyncClient(self):
+        async def process():
+            async with AsyncMedCATClient(self.url, max_batch_delay=0.5, max_pending_docs=4) as client:
+                results = await client.process_bulk(self.TEXTS)
+                single = await client.process(self.TEXTS[1])
+                return results, single, client.get_stats()
+
+        results, single, stats = asyncio.run(process())
+        self._check_results(results + [single], self.TEXTS + [self.TEXTS[1]])
+        self.assertGreaterEqual(stats["bulk_requests"], 1)
+        self.assertLess(stats["requests"], len(self.TEXTS) + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import medcat_service.nlp_processor.concept_index as concept_index
+from medcat_service.nlp_processor.concept_index import ConceptIndex, load_or_build_index
+
+
+class TestConceptIndex(unittest.TestCase):
+    """
+    Implementation of test cases for the concept lookup and search indexes
+    """
+
+    CUI2NAMES = {"C01": {"heart"}, "C02": {"heart~attack", "myocardial~infarction"}, "C03": {"heart~failure"},
+                 "C04": {"kidney~failure", "renal~failure"}, "C05": {"heartburn"}, "C06": {"hypertension"}}
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cdb = SimpleNamespace(cui2names={cui: set(names) for cui, names in self.CUI2NAMES.items()},
+                                   cui2preferred_name={"C02": "Myocardial infarction"},
+                                   cui2type_ids={cui: {"T047"} for cui in self.CUI2NAMES},
+                                   get_name=lambda cui: self.cdb.cui2preferred_name.get(cui, cui),
+                                   config=SimpleNamespace(general=SimpleNamespace(separator="~"),
+                                                          linking=SimpleNamespace(filters=SimpleNamespace(
+                                                              cuis=set(), cuis_exclude=set()))))
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def _build(self, cui_filter=None):
+        return load_or_build_index(self.cdb, cui_filter, self.cache_dir)
+
+    def testGetConcept(self):
+        index = self._build()
+        self.assertEqual(index.get_concept("C02"), {"cui": "C02", "pretty_name": "Myocardial infarction",
+                                                    "names": ["heart attack", "myocardial infarction"],
+                                                    "type_ids": ["T047"]})
+        self.assertIsNone(index.get_concept("C99"))
+
+    def testPrefixSearch(self):
+        index = self._build()
+        result = index.search("Heart", mode="prefix")
+        # the shortest names first, each concept once
+        self.assertEqual([(match["cui"], match["name"]) for match in result],
+                         [("C01", "heart"), ("C05", "heartburn"), ("C02", "heart attack"), ("C03", "heart failure")])
+        self.assertEqual(result[0]["score"], 1.0)
+
+        self.assertEqual([match["cui"] for match in index.search("heart-f", mode="prefix")], ["C03"])
+        self.assertEqual(len(index.search("heart", limit=2, mode="prefix")), 2)
+        self.assertEqual(index.search("lung", mode="prefix"), [])
+
+    def testFuzzySearch(self):
+        index = self._build()
+        result = index.search("hart failur", mode="fuzzy")
+        self.assertEqual(result[0]["cui"], "C03")
+        self.assertEqual(result[0]["match"], "fuzzy")
+        self.assertLess(result[0]["score"], 1.0)
+        self.assertIn("C04", [match["cui"] for match in result])
+        self.assertEqual(index.search("hart failur", mode="fuzzy", min_similarity=0.9), [])
+
+        # the prefix matches are completed with the fuzzy ones
+        result = index.search("hypertensoin")
+        self.assertEqual([(match["cui"], match["match"]) for match in result][0], ("C06", "fuzzy"))
+        result = index.search("renal")
+        self.assertEqual([(match["cui"], match["match"]) for match in result][0], ("C04", "prefix"))
+
+        with self.assertRaises(ValueError):
+            index.search("heart", mode="regex")
+
+    def testCuiFiltersAreHonoured(self):
+        self.cdb.config.linking.filters.cuis_exclude = {"C03"}
+        index = self._build(cui_filter=["C01", "C02", "C03"])
+        self.assertEqual(sorted(index.concepts), ["C01", "C02"])
+        self.assertEqual([match["cui"] for match in index.search("heart")], ["C01", "C02"])
+        self.assertIsNone(index.get_concept("C04"))
+
+    def testIndexIsCached(self):
+        index = self._build()
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        cached = self._build()
+        self.assertIsNot(cached, index)
+        self.assertIsInstance(cached, ConceptIndex)
+        self.assertEqual(cached.search("kidney"), index.search("kidney"))
+
+        # a filtered index is cached apart
+        self._build(cui_filter=["C04"])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def testCacheWritableByOthersIsIgnored(self):
+        self._build()
+        cache_path = os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+        os.chmod(cache_path, 0o666)
+
+        with mock.patch.object(concept_index, "build_index", wraps=concept_index.build_index) as build_index:
+            index = self._build()
+        # the index is built again, the cache file not being trusted
+        build_index.assert_called_once()
+        self.assertEqual(sorted(index.concepts), sorted(self.CUI2NAMES))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+from flask import Flask, Response
+from werkzeug.serving import make_server
+
+import medcat_service.test.common as common
+import medcat_service.test.test_service as test_service
+from medcat_service.app import app as medcat_app
+from medcat_service.nlp_processor.coordinator import split_balanced
+
+
+def _serve(app):
+    server = make_server("localhost", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://localhost:%d" % server.server_port
+
+
+def _create_failing_app(delay=0):
+    # backend answering every request with a server error after `delay` seconds, counting the requests
+    app = Flask("failing")
+    app.hits = 0
+
+    @app.route("/api/<path:path>", methods=["GET", "POST"])
+    def fail(path):
+        app.hits += 1
+        time.sleep(delay)
+        return Response("Service unavailable", status=503)
+    return app
+
+
+class TestCoordinator(unittest.TestCase):
+    """
+    Implementation of test cases for the coordinator mode, against local MedCAT service instances
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        test_service.TestMedcatService._setup_logging(cls)
+        test_service.TestMedcatService._setup_medcat_processor(cls)
+
+        # the same MedCAT app served by two instances, plus a failing one and an unreachable one, the processor
+        # of the backends being created by a first request with the concept index enabled
+        with mock.patch.dict(os.environ, {"APP_CONCEPT_INDEX": "True"}):
+            cls.backend_app = medcat_app.create_app()
+            cls.backend_app.test_client().get("/api/info")
+        cls.servers, cls.backend_urls = zip(*[_serve(cls.backend_app) for _ in range(2)])
+        cls.failing_app = _create_failing_app()
+        cls.failing_server, cls.failing_url = _serve(cls.failing_app)
+        cls.slow_failing_server, cls.slow_failing_url = _serve(_create_failing_app(delay=1))
+        cls.unreachable_url = "http://localhost:9"
+
+    @classmethod
+    def tearDownClass(cls):
+        for server in cls.servers + (cls.failing_server, cls.slow_failing_server):
+            server.shutdown()
+
+    def _create_coordinator(self, backend_urls, **env):
+        # the processor is created on the first request
+        env = dict(env, APP_COORDINATOR_BACKENDS=",".join(backend_urls), APP_COORDINATOR_BACKEND_CONCURRENCY="1")
+        patcher = mock.patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        app = medcat_app.create_app()
+        app.testing = True
+        return app.test_client()
+
+    def testSplitBalanced(self):
+        lengths = [100, 5, 60, 40, 50, 5, 10]
+        shards = split_balanced(lengths, 3)
+
+        self.assertEqual(sorted(i for shard in shards for i in shard), list(range(len(lengths))))
+        self.assertEqual(sorted(sum(lengths[i] for i in shard) for shard in shards), [80, 90, 100])
+        self.assertTrue(all(shard == sorted(shard) for shard in shards))
+        self.assertEqual(len(split_balanced([10, 20], 5)), 2)
+
+    def testProcessBulkAcrossBackends(self):
+        docs = ["%s %d" % (common.get_example_long_document(), i) for i in range(3)] + \
+            [common.get_example_short_document(), " "]
+        payload = common.create_payload_content_from_doc_bulk(docs)
+        client = self._create_coordinator(self.backend_urls)
+
+        response = client.post("/api/process_bulk", json=payload)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.get_data(as_text=True))
+
+        expected = json.loads(self.backend_app.test_client().post("/api/process_bulk", json=payload)
+                              .get_data(as_text=True))
+        self.assertEqual([res["text"] for res in data["result"]], docs)
+        self.assertEqual([res["annotations"] for res in data["result"]],
+                         [res["annotations"] for res in expected["result"]])
+        self.assertEqual(data["medcat_info"]["service_model"], expected["medcat_info"]["service_model"])
+        backends = data["medcat_info"]["coordinator"]["backends"]
+        self.assertTrue(all(backend["requests"] > 0 for backend in backends))
+
+    def testFailedShardsAreRetried(self):
+        self.failing_app.hits = 0
+        docs = [common.get_example_short_document(), common.get_example_long_document()]
+        client = self._create_coordinator([self.failing_url, self.unreachable_url, self.backend_urls[0]])
+
+        response = client.post("/api/process_bulk", json=common.create_payload_content_from_doc_bulk(docs))
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.get_data(as_text=True))
+
+        self.assertTrue(all(res["success"] for res in data["result"]))
+        self.assertGreater(len(data["result"][1]["annotations"]), 0)
+        self.assertGreater(self.failing_app.hits, 0)
+
+        info = json.loads(client.get("/api/info").get_data(as_text=True))
+        failures = {backend["url"]: backend["failures"] for backend in info["coordinator"]["backends"]}
+        self.assertGreater(failures[self.failing_url] + failures[self.unreachable_url], 0)
+        self.assertEqual(failures[self.backend_urls[0]], 0)
+
+    def testAllBackendsFailing(self):
+        docs = [common.get_example_short_document(), common.get_example_long_document()]
+        client = self._create_coordinator([self.failing_url], APP_COORDINATOR_RETRIES="1")
+
+        response = client.post("/api/process_bulk", json=common.create_payload_content_from_doc_bulk(docs))
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.get_data(as_text=True))
+
+        self.assertEqual([res["text"] for res in data["result"]], docs)
+        for res in data["result"]:
+            self.assertFalse(res["success"])
+            self.assertIn("HTTP 503", res["errors"][0])
+
+    def testRetriesStopAtTheDeadline(self):
+        docs = [common.get_example_short_document(), common.get_example_long_document()]
+        client = self._create_coordinator([self.slow_failing_url] * 2)
+
+        # the first attempts time out at the deadline, the shards are not retried past it
+        response = client.post("/api/process_bulk", json=common.create_payload_content_from_doc_bulk(docs),
+                               headers={"X-Deadline-Ms": "300"})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.get_data(as_text=True))
+
+        self.assertEqual([res["text"] for res in data["result"]], docs)
+        for res in data["result"]:
+            self.assertFalse(res["success"])
+            self.assertTrue(res["deferred"])
+
+    def testRetrainingIsNotAvailable(self):
+        client = self._create_coordinator(self.backend_urls)
+
+        response = client.post("/api/retrain_medcat", json={"content": {}, "replace_cdb": False})
+        self.assertEqual(response.status_code, 501)
+
+    def testConceptRequestsAreForwarded(self):
+        client = self._create_coordinator([self.failing_url] + list(self.backend_urls))
+
+        response = client.get("/api/concepts/search", query_string={"q": "aspirin"})
+        self.assertEqual(response.status_code, 200)
+        cui = json.loads(response.get_data(as_text=True))["result"][0]["cui"]
+
+        response = client.get("/api/concepts/" + cui)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.get_data(as_text=True))["result"]["names"], ["aspirin"])
+
+        self.assertEqual(client.get("/api/concepts/unknown-cui").status_code, 404)
+        self.assertEqual(client.get("/api/concepts/search", query_string={"q": "aspirin", "mode": "regex"})
+                         .status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from medcat_service.utils.cpu import get_cpu_layout, get_cpu_quota, get_numa_nodes, get_thread_counts, parse_cpu_list
+
+
+class TestCpuLayout(unittest.TestCase):
+    """
+    Implementation of test cases for the CPU topology-aware worker placement
+    """
+
+    def setUp(self):
+        self.sys_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.sys_dir)
+
+    def _write(self, path, content):
+        path = os.path.join(self.sys_dir, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def testParseCpuList(self):
+        self.assertEqual(parse_cpu_list("0-3,8,10-11\n"), [0, 1, 2, 3, 8, 10, 11])
+
+    def testCpuQuota(self):
+        self._write("v2/cpu.max", "250000 100000\n")
+        self._write("v2-unlimited/cpu.max", "max 100000\n")
+        self._write("v1/cpu,cpuacct/cpu.cfs_quota_us", "400000\n")
+        self._write("v1/cpu,cpuacct/cpu.cfs_period_us", "100000\n")
+
+        self.assertEqual(get_cpu_quota(os.path.join(self.sys_dir, "v2")), 2.5)
+        self.assertIsNone(get_cpu_quota(os.path.join(self.sys_dir, "v2-unlimited")))
+        self.assertEqual(get_cpu_quota(os.path.join(self.sys_dir, "v1")), 4)
+        self.assertIsNone(get_cpu_quota(os.path.join(self.sys_dir, "none")))
+
+    def testNumaNodes(self):
+        self._write("node0/cpulist", "0-3\n")
+        self._write("node1/cpulist", "4-7\n")
+
+        self.assertEqual(get_numa_nodes(list(range(2, 10)), self.sys_dir), [[2, 3], [4, 5, 6, 7], [8, 9]])
+
+    def testLayoutSplitsNumaNodes(self):
+        nodes = [list(range(0, 8)), list(range(8, 16))]
+        layout = get_cpu_layout(4, cpus=list(range(16)), numa_nodes=nodes, cpu_quota=None)
+
+        self.assertEqual(layout, [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11], [12, 13, 14, 15]])
+
+    def testLayoutIsDisjoint(self):
+        nodes = [list(range(0, 6)), list(range(6, 16))]
+        layout = get_cpu_layout(3, cpus=list(range(16)), numa_nodes=nodes, cpu_quota=None)
+        cpus = [cpu for worker_cpus in layout for cpu in worker_cpus]
+
+        self.assertEqual(sorted(cpus), list(range(16)))
+        # no worker spans both nodes
+        self.assertTrue(all(set(worker_cpus) <= set(nodes[0]) or set(worker_cpus) <= set(nodes[1])
+                            for worker_cpus in layout))
+
+    def testLayoutFollowsCpuQuota(self):
+        nodes = [list(range(0, 8)), list(range(8, 16))]
+        layout = get_cpu_layout(2, cpus=list(range(16)), numa_nodes=nodes, cpu_quota=4.5)
+
+        self.assertEqual(layout, [[0, 1], [2, 3]])
+
+    def testLayoutWithMoreWorkersThanCpus(self):
+        layout = get_cpu_layout(3, cpus=[0, 1], numa_nodes=[[0, 1]], cpu_quota=None)
+
+        self.assertEqual(layout, [[0], [1], [0]])
+
+    def testThreadCounts(self):
+        self.assertEqual(get_thread_counts(4, 8), {"torch_threads": 4, "blas_threads": 4, "bulk_nproc": 4,
+                                                   "bulk_torch_threads": 1})
+        self.assertEqual(get_thread_counts(8, 2)["bulk_torch_threads"], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
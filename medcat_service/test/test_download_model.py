@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import importlib.util
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+SCRIPT_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "scripts", "download_model.py")
+
+
+def _load_script():
+    spec = importlib.util.spec_from_file_location("download_model", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+download_model = _load_script()
+
+
+class _FileHandler(BaseHTTPRequestHandler):
+    """
+    Serves the files of the server from memory, with support for range requests. The first response for a path
+    listed in `server.interrupt` is cut after half of its body, to simulate a dropped connection.
+    """
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("Range")))
+        content = self.server.files.get(self.path)
+        if content is None:
+            self.send_error(404)
+            return
+
+        start, status = 0, 200
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") in (None, self._get_etag(content)):
+            start, status = int(range_header.split("=")[1].split("-")[0]), 206
+
+        body = content[start:]
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", self._get_etag(content))
+        if status == 206:
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (start, len(content) - 1, len(content)))
+        self.end_headers()
+
+        if self.path in self.server.interrupt:
+            self.server.interrupt.remove(self.path)
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+    @staticmethod
+    def _get_etag(content):
+        return '"%s"' % hashlib.md5(content).hexdigest()
+
+
+class TestDownloadModel(unittest.TestCase):
+    """
+    Implementation of test cases for the model download script, against a local HTTP server
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.vocab = os.urandom(3 * 1024 * 1024 + 17)
+        cls.cdb = os.urandom(2 * 1024 * 1024 + 5)
+        cls.meta_files = {"Status/config.json": b'{"general": {"category_name": "Status"}}',
+                          "Status/model.dat": os.urandom(1024 * 1024),
+                          "Status/bbpe-vocab.json": b"{}" * 50000}
+
+        # a deflated archive written to a non-seekable stream, with the sizes in data descriptors
+        meta = io.BytesIO()
+        with zipfile.ZipFile(_NonSeekable(meta), "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+            for name, content in cls.meta_files.items():
+                zip_file.writestr(name, content)
+        cls.meta = meta.getvalue()
+
+        cls.server = ThreadingHTTPServer(("localhost", 0), _FileHandler)
+        cls.server.files = {"/vocab.dat": cls.vocab, "/cdb.dat": cls.cdb, "/mc_status.zip": cls.meta}
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.models_dir = tempfile.mkdtemp()
+        self.server.requests = []
+        self.server.interrupt = set()
+
+        url = "http://localhost:%d" % self.server.server_address[1]
+        self.env = {"MODEL_NAME": "test",
+                    "MODEL_VOCAB_URL": url + "/vocab.dat",
+                    "MODEL_CDB_URL": url + "/cdb.dat",
+                    "MODEL_META_URL": url + "/mc_status.zip",
+                    "MODEL_VOCAB_SHA256": hashlib.sha256(self.vocab).hexdigest(),
+                    "MODEL_META_SHA256": hashlib.sha256(self.meta).hexdigest()}
+
+    def tearDown(self):
+        shutil.rmtree(self.models_dir)
+
+    def _assert_model(self, model_dir):
+        with open(os.path.join(model_dir, "vocab.dat"), "rb") as f:
+            self.assertEqual(f.read(), self.vocab)
+        with open(os.path.join(model_dir, "cdb.dat"), "rb") as f:
+            self.assertEqual(f.read(), self.cdb)
+        for name, content in self.meta_files.items():
+            with open(os.path.join(model_dir, name), "rb") as f:
+                self.assertEqual(f.read(), content)
+        self.assertFalse(os.path.exists(os.path.join(model_dir, "mc_status.zip")))
+
+    def testDownload(self):
+        self.assertEqual(download_model.main(self.env, self.models_dir), 0)
+
+        self._assert_model(os.path.join(self.models_dir, "test"))
+        self.assertEqual(sorted(path for path, _ in self.server.requests),
+                         ["/cdb.dat", "/mc_status.zip", "/vocab.dat"])
+
+    def testCachedArtefactsAreNotDownloaded(self):
+        self.assertEqual(download_model.main(self.env, self.models_dir), 0)
+        self.server.requests = []
+
+        env = dict(self.env, MODEL_NAME="copy")
+        self.assertEqual(download_model.main(env, self.models_dir), 0)
+
+        self._assert_model(os.path.join(self.models_dir, "copy"))
+        self.assertEqual(self.server.requests, [])
+
+    def testInterruptedDownloadIsResumed(self):
+        self.server.interrupt = {"/vocab.dat", "/mc_status.zip"}
+
+        with mock.patch.object(download_model.time, "sleep"):
+            self.assertEqual(download_model.main(self.env, self.models_dir), 0)
+
+        self._assert_model(os.path.join(self.models_dir, "test"))
+        resumed = {path: int(range_header[len("bytes="):-1]) for path, range_header in self.server.requests
+                   if range_header}
+        self.assertEqual(sorted(resumed.keys()), ["/mc_status.zip", "/vocab.dat"])
+        self.assertTrue(all(offset > 0 for offset in resumed.values()))
+
+    def testChecksumMismatch(self):
+        self.env["MODEL_CDB_SHA256"] = hashlib.sha256(b"another cdb").hexdigest()
+
+        self.assertEqual(download_model.main(self.env, self.models_dir), 1)
+
+        self.assertFalse(os.path.exists(os.path.join(self.models_dir, "test", "cdb.dat")))
+        self.assertTrue(os.path.exists(os.path.join(self.models_dir, "test", "vocab.dat")))
+        # downloaded again from scratch before failing
+        self.assertEqual([path for path, _ in self.server.requests].count("/cdb.dat"), 2)
+
+    def testStreamingUnzipper(self):
+        extract_dir = tempfile.mkdtemp(dir=self.models_dir)
+        unzipper = download_model.StreamingUnzipper(extract_dir)
+        for i in range(0, len(self.meta), 1000):
+            unzipper.feed(self.meta[i:i + 1000])
+        unzipper.close()
+
+        for name, content in self.meta_files.items():
+            with open(os.path.join(extract_dir, name), "rb") as f:
+                self.assertEqual(f.read(), content)
+
+
+class _NonSeekable(io.RawIOBase):
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.stream.write(data)
+
+
+if __name__ == '__main__':
+    unittest.main()
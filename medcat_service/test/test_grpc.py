@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import grpc
+
+import medcat_service.test.common as common
+import medcat_service.test.test_service as test_service
+from medcat_service.grpc_server import create_server
+from medcat_service.grpc_server import medcat_service_pb2 as pb2
+from medcat_service.grpc_server import medcat_service_pb2_grpc as pb2_grpc
+from medcat_service.grpc_server.servicer import MedCatServicer
+from medcat_service.nlp_processor import MedCatProcessor
+
+
+class TestGrpcServer(unittest.TestCase):
+    """
+    Implementation of test cases for the gRPC interface of the MedCAT service
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        test_service.TestMedcatService._setup_logging(cls)
+        test_service.TestMedcatService._setup_medcat_processor(cls)
+        cls.processor = MedCatProcessor()
+        cls.server, port = create_server(cls.processor, host="localhost", port=0)
+        cls.server.start()
+        cls.channel = grpc.insecure_channel("localhost:%d" % port)
+        cls.stub = pb2_grpc.MedCatStub(cls.channel)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.channel.close()
+        cls.server.stop(grace=None)
+
+    def testInfo(self):
+        response = self.stub.Info(pb2.InfoRequest())
+        self.assertEqual(response.service_app_name, "MedCAT")
+
+    def testProcess(self):
+        request = pb2.ProcessRequest(document=pb2.Document(id="doc-1", text=common.get_example_long_document()))
+        response = self.stub.Process(request)
+
+        self.assertTrue(response.result.success)
+        self.assertEqual(response.result.id, "doc-1")
+        self.assertGreater(len(response.result.entities), 0)
+        self.assertEqual(response.medcat_info.service_app_name, "MedCAT")
+
+    def testProcessBulk(self):
+        docs = [common.get_example_short_document(), common.get_example_long_document(), " "]
+        request = pb2.ProcessBulkRequest(documents=[pb2.Document(id=str(i), text=doc) for i, doc in enumerate(docs)])
+        response = self.stub.ProcessBulk(request)
+
+        self.assertEqual([result.id for result in response.results], ["0", "1", "2"])
+        self.assertGreater(len(response.results[1].entities), 0)
+        self.assertEqual(len(response.results[2].entities), 0)
+
+    def testProcessBulkDeadline(self):
+        docs = ["%s %d" % (common.get_example_long_document(), i) for i in range(3)]
+        request = pb2.ProcessBulkRequest(documents=[pb2.Document(id=str(i), text=doc) for i, doc in enumerate(docs)])
+        # a deadline within the margin kept for returning the results, nothing can be processed
+        response = self.stub.ProcessBulk(request, timeout=0.45)
+
+        self.assertEqual(len(response.results), len(docs))
+        for result in response.results:
+            self.assertFalse(result.success)
+            self.assertIn("deadline", result.errors[0])
+
+    def testConcurrentCallsKeepMetaAnns(self):
+        docs = ["%s %d" % (common.get_example_long_document(), i) for i in range(8)]
+
+        def process(i):
+            request = pb2.ProcessRequest(document=pb2.Document(id=str(i), text=docs[i]))
+            return [self.stub.Process(request).result]
+
+        def process_bulk(_):
+            request = pb2.ProcessBulkRequest(documents=[pb2.Document(id=str(i), text=doc)
+                                                        for i, doc in enumerate(docs)])
+            return list(self.stub.ProcessBulk(request).results)
+
+        # the single documents are processed while the bulk processing runs the MetaCAT models apart
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(process_bulk if i % 2 else process, i) for i in range(len(docs))]
+            results = [result for future in futures for result in future.result()]
+
+        entities = [entity for result in results for entity in result.entities]
+        self.assertGreater(len(entities), 0)
+        self.assertTrue(all("Status" in entity.meta_anns for entity in entities))
+
+    def testMetaAnnsFilters(self):
+        doc = common.get_example_long_document()
+
+        def _spans(entities):
+            return [(entity.start, entity.cui, entity.meta_anns["Status"].value) for entity in entities]
+
+        def filtered(task, values):
+            filters = [pb2.MetaAnnotationsFilter(task=task, values=values)]
+            response = self.stub.Process(pb2.ProcessRequest(document=pb2.Document(text=doc),
+                                                            meta_anns_filters=filters))
+            streamed = list(self.stub.ProcessStream(iter([pb2.ProcessRequest(document=pb2.Document(text=doc),
+                                                                             meta_anns_filters=filters)] * 2)))
+            # the same entities whether the documents are processed alone or in a stream batch
+            for stream_response in streamed:
+                self.assertEqual(_spans(stream_response.result.entities), _spans(response.result.entities))
+            return response.result.entities
+
+        entities = filtered("Status", ["Affirmed", "Other"])
+        self.assertGreater(len(entities), 0)
+        self.assertTrue(all(entity.meta_anns["Status"].value in ("Affirmed", "Other") for entity in entities))
+        self.assertEqual(len(filtered("Unknown", ["Affirmed"])), 0)
+
+    def testProcessStream(self):
+        docs = [common.get_example_short_document(), common.get_example_long_document()] * 10
+        requests = (pb2.ProcessRequest(document=pb2.Document(id=str(i), text=doc)) for i, doc in enumerate(docs))
+
+        results = {response.result.id: response.result for response in self.stub.ProcessStream(requests)}
+        self.assertEqual(set(results.keys()), set(str(i) for i in range(len(docs))))
+        self.assertTrue(all(result.success and len(result.entities) > 0 for result in results.values()))
+
+    def testStreamBatchesAreProcessedInProcess(self):
+        docs = [common.get_example_short_document(), common.get_example_long_document()]
+        batch = [pb2.ProcessRequest(document=pb2.Document(id=str(i), text=doc)) for i, doc in enumerate(docs)]
+
+        # the bulk processing subprocesses are only started for the batches of at least stream_bulk_min_chars
+        for min_chars, bulk_calls in [(sum(len(doc) for doc in docs) + 1, 0), (1, 1)]:
+            servicer = MedCatServicer(self.processor, stream_bulk_min_chars=min_chars)
+            with mock.patch.object(self.processor, "process_content_bulk",
+                                   wraps=self.processor.process_content_bulk) as process_content_bulk:
+                results = servicer._process_batch(batch)
+            self.assertEqual(process_content_bulk.call_count, bulk_calls)
+            self.assertEqual([result.id for result in results], ["0", "1"])
+            self.assertTrue(all(result.success and len(result.entities) > 0 for result in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
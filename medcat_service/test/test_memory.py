@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+from unittest import mock
+
+import config
+import medcat_service.test.common as common
+import medcat_service.test.test_service as test_service
+from medcat_service.nlp_processor import MedCatProcessor
+
+
+class TestVocabReset(unittest.TestCase):
+    """
+    Implementation of test cases for the re-creation of the spaCy pipeline once its vocab grew too much
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        test_service.TestMedcatService._setup_logging(cls)
+        test_service.TestMedcatService._setup_medcat_processor(cls)
+        cls.processor = MedCatProcessor()
+
+    def _reset_vocab(self):
+        vocab_resets = self.processor.vocab_resets
+        # any vocab is then past the allowed growth
+        self.processor._vocab_baseline = -2
+        with mock.patch.object(self.processor, "vocab_max_growth", 1):
+            self.processor._check_vocab_growth()
+        self.assertEqual(self.processor.vocab_resets, vocab_resets + 1)
+
+    def _annotate(self, text):
+        result = self.processor.process_content({"text": text})
+        return sorted((e["start"], e["end"], e["cui"], sorted((task, meta_ann["value"])
+                                                              for task, meta_ann in e["meta_anns"].items()))
+                      for e in next(result["annotations"]).values())
+
+    def testVocabResetKeepsAnnotations(self):
+        text = common.get_example_long_document()
+        spacy_nlp = self.processor.cat.pipe.spacy_nlp
+        expected = self._annotate(text)
+
+        self._reset_vocab()
+
+        self.assertIsNot(self.processor.cat.pipe.spacy_nlp, spacy_nlp)
+        self.assertEqual(self.processor.cat.pipe.spacy_nlp.pipe_names, spacy_nlp.pipe_names)
+        self.assertEqual(self.processor.cat.pipe.spacy_nlp.disabled, [])
+        self.assertEqual(self.processor._vocab_baseline, self.processor._get_vocab_size())
+        # the NER, linking and MetaCAT models are those already loaded
+        self.assertGreater(len(expected), 0)
+        self.assertTrue(all(len(meta_anns) > 0 for *_, meta_anns in expected))
+        self.assertEqual(self._annotate(text), expected)
+
+    def testVocabResetWhilePipesDisabled(self):
+        text = common.get_example_long_document()
+        expected = self._annotate(text)
+        meta_cat_names = [name for name, _ in self.processor._get_meta_cat_pipes()]
+        self.assertGreater(len(meta_cat_names), 0)
+
+        spacy_nlp = self.processor.cat.pipe.spacy_nlp
+        with self.processor._pipes_disabled(meta_cat_names):
+            self._reset_vocab()
+            # the pipeline re-created has all its pipes enabled, the disabled ones being those of the previous one
+            self.assertEqual(self.processor.cat.pipe.spacy_nlp.disabled, [])
+            self.assertEqual(spacy_nlp.disabled, meta_cat_names)
+
+        self.assertEqual(spacy_nlp.disabled, [])
+        self.assertEqual(self.processor.cat.pipe.spacy_nlp.disabled, [])
+        self.assertEqual(self._annotate(text), expected)
+
+
+class TestWorkerRecycling(unittest.TestCase):
+    """
+    Implementation of test cases for the recycling of the gunicorn workers over APP_WORKER_MAX_RSS_MB
+    """
+
+    def _post_request(self, max_rss_mb):
+        worker = mock.Mock(alive=True, pid=os.getpid())
+        with mock.patch.dict(os.environ, {"APP_WORKER_MAX_RSS_MB": max_rss_mb}):
+            config.post_request(worker, mock.Mock(), {}, mock.Mock())
+        return worker
+
+    def testWorkerRecycledOverMaxRss(self):
+        worker = self._post_request("1")
+        self.assertFalse(worker.alive)
+        worker.log.warning.assert_called_once()
+
+    def testWorkerKeptUnderMaxRss(self):
+        self.assertTrue(self._post_request("1000000").alive)
+        # no limit by default
+        self.assertTrue(self._post_request("0").alive)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import copy
+import unittest
+
+from medcat.meta_cat import MetaCAT
+
+import medcat_service.test.test_service as test_service
+from medcat_service.nlp_processor.medcat_processor import MedCatProcessor
+from medcat_service.nlp_processor.meta_batching import annotate_meta_batched, get_length_buckets
+
+
+class TestMetaBatching(unittest.TestCase):
+    """
+    Implementation of test cases for the MetaCAT inference batched across the documents of the bulk processing
+    """
+
+    TEXTS = ["The patient was prescribed aspirin and clonidine.",
+             "No rash was observed. The patient denies any heart problems, but has a history of kidney failure.",
+             "Vyvanse",
+             "Nothing to annotate here.",
+             "Aspirin was stopped due to a rash, clonidine continued for the heart, vyvanse in the morning."]
+
+    @classmethod
+    def setUpClass(cls):
+        test_service.TestMedcatService._setup_logging(cls)
+        test_service.TestMedcatService._setup_medcat_processor(cls)
+        cls.processor = MedCatProcessor()
+        cls.cat = cls.processor.cat
+        cls.nn_components = [(name, component) for name, component in cls.cat.pipe.spacy_nlp.components
+                             if isinstance(component, MetaCAT)]
+
+    def _get_entities(self):
+        spacy_nlp = self.cat.pipe.spacy_nlp
+        for name, _ in self.nn_components:
+            spacy_nlp.disable_pipe(name)
+        try:
+            return {idx: self.cat.get_entities(text) for idx, text in enumerate(self.TEXTS)}
+        finally:
+            for name, _ in self.nn_components:
+                spacy_nlp.enable_pipe(name)
+
+    def testLengthBuckets(self):
+        samples = [[[1] * length, [0]] for length in (5, 2, 9, 2, 7)]
+        self.assertEqual(get_length_buckets(samples, 2), [[1, 3], [0, 4], [2]])
+
+    def testPredictionsMatchMedCAT(self):
+        docs = self._get_entities()
+        id2text = dict(enumerate(self.TEXTS))
+        self.assertGreater(sum(len(doc["entities"]) for doc in docs.values()), 5)
+
+        expected = copy.deepcopy(docs)
+        self.cat._run_nn_components(expected, self.nn_components, id2text=id2text)
+        num_samples = annotate_meta_batched([component for _, component in self.nn_components], docs, id2text,
+                                            batch_size=3)
+
+        self.assertEqual(num_samples, sum(len(doc["entities"]) for doc in docs.values()))
+        for idx, doc in expected.items():
+            for ent_id, entity in doc["entities"].items():
+                meta_anns = docs[idx]["entities"][ent_id]["meta_anns"]
+                self.assertEqual(meta_anns.keys(), entity["meta_anns"].keys())
+                self.assertTrue(entity["meta_anns"])
+                for name, meta_ann in entity["meta_anns"].items():
+                    self.assertEqual(meta_anns[name]["value"], meta_ann["value"])
+                    self.assertAlmostEqual(meta_anns[name]["confidence"], meta_ann["confidence"], places=4)
+
+    def testBulkBatchesTheMetaCATs(self):
+        input_docs = list(enumerate(self.TEXTS))
+        ann_res = self.processor._annotate_batch(input_docs, nproc=2, batch_size_chars=100)
+
+        self.assertEqual(sorted(ann_res), list(range(len(self.TEXTS))))
+        entities = [entity for doc in ann_res.values() for entity in doc["entities"].values()]
+        self.assertTrue(entities)
+        self.assertTrue(all(entity["meta_anns"] for entity in entities))
+        # the MetaCAT models are enabled again for the next requests
+        self.assertTrue(all(name in self.cat.pipe.spacy_nlp.pipe_names for name, _ in self.nn_components))
+
+
+if __name__ == '__main__':
+    unittest.main()
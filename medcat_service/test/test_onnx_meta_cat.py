@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from medcat.meta_cat import MetaCAT
+
+import medcat_service.test.test_service as test_service
+from medcat_service.nlp_processor.onnx_meta_cat import (OnnxMetaCATModel, check_parity, enable_onnx_backend,
+                                                        get_onnx_path, onnxruntime)
+
+
+@unittest.skipIf(onnxruntime is None, "onnxruntime is not installed")
+class TestOnnxMetaCAT(unittest.TestCase):
+    """
+    Implementation of test cases for the ONNX Runtime backend of the MetaCAT models
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        test_service.TestMedcatService._setup_logging(cls)
+        test_service.TestMedcatService._setup_medcat_processor(cls)
+        cls.meta_cat_path = os.environ["APP_MODEL_META_PATH_LIST"].split(":")[0]
+
+    def setUp(self):
+        self.onnx_dir = tempfile.mkdtemp()
+        self.meta_cat = MetaCAT.load(self.meta_cat_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.onnx_dir)
+
+    def testEnableOnnxBackend(self):
+        self.assertEqual(enable_onnx_backend(self.meta_cat, self.onnx_dir), "onnx")
+        self.assertIsInstance(self.meta_cat.model, OnnxMetaCATModel)
+
+        # the exported model is re-used by the next loads of the same model
+        meta_cat = MetaCAT.load(self.meta_cat_path)
+        self.assertTrue(os.path.exists(get_onnx_path(meta_cat, self.onnx_dir)))
+
+        # annotations are the same as with the torch model
+        passed, stats = check_parity(meta_cat, self.meta_cat.model)
+        self.assertTrue(passed)
+        self.assertEqual(stats["agreement"], 1.0)
+
+    def testEnableOnnxBackendQuantized(self):
+        self.assertEqual(enable_onnx_backend(self.meta_cat, self.onnx_dir, quantize=True), "onnx-int8")
+        self.assertTrue(os.path.exists(get_onnx_path(MetaCAT.load(self.meta_cat_path), self.onnx_dir, quantize=True)))
+
+    def testEnableOnnxBackendFallback(self):
+        # an invalid exported model makes the MetaCAT fall back to torch
+        onnx_path = get_onnx_path(self.meta_cat, self.onnx_dir)
+        with open(onnx_path, "wb") as f:
+            f.write(b"not an onnx model")
+
+        torch_model = self.meta_cat.model
+        self.assertEqual(enable_onnx_backend(self.meta_cat, self.onnx_dir), "torch")
+        self.assertIs(self.meta_cat.model, torch_model)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+from unittest import mock
+
+import medcat_service.nlp_processor.parallel_segments as parallel_segments
+import medcat_service.test.common as common
+import medcat_service.test.test_service as test_service
+from medcat_service.nlp_processor.medcat_processor import MedCatProcessor
+from medcat_service.nlp_processor.parallel_segments import merge_segment_entities, split_with_overlap
+
+
+class TestParallelSegments(unittest.TestCase):
+    """
+    Implementation of test cases for the annotation of long documents in segments annotated in parallel
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        test_service.TestMedcatService._setup_logging(cls)
+        test_service.TestMedcatService._setup_medcat_processor(cls)
+        with mock.patch.dict(os.environ, {"APP_PARALLEL_DOC_MIN_CHARS": "1000",
+                                          "APP_PARALLEL_DOC_SEGMENT_CHARS": "400",
+                                          "APP_PARALLEL_DOC_OVERLAP_CHARS": "150",
+                                          "APP_SEGMENT_CACHE": "False"}):
+            cls.processor = MedCatProcessor()
+
+        # paragraphs, long lines and runs of text without any sentence boundary
+        paragraphs = [common.get_example_long_document(),
+                      common.get_example_short_document(),
+                      " ".join(["Aspirin, clonidine and vyvanse, then kidney failure with a rash"] * 12),
+                      common.get_example_long_document().replace("\n", " ")]
+        cls.document = "\n\n".join(paragraphs * 3)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.processor.segment_pool.close()
+
+    def testSplitWithOverlap(self):
+        segments = split_with_overlap(self.document, 400, 150)
+        self.assertGreater(len(segments), 5)
+        self.assertEqual(segments[0]["start"], 0)
+        self.assertEqual(segments[-1]["end"], len(self.document))
+        for segment, next_segment in zip(segments, segments[1:]):
+            self.assertEqual(segment["end"], next_segment["start"])
+            self.assertLessEqual(segment["end"] - segment["start"], 400)
+            # segments are cut at whitespace, after a paragraph or sentence end when there is one
+            self.assertTrue(self.document[segment["end"] - 1].isspace())
+        for segment in segments:
+            window_start, window_end = segment["window"]
+            self.assertLessEqual(segment["start"] - window_start, 150)
+            self.assertLessEqual(window_end - segment["end"], 150)
+            self.assertTrue(window_start == 0 or self.document[window_start - 1].isspace())
+
+    def testMergeRemovesOverlapDuplicates(self):
+        segments = [{"start": 0, "end": 10, "window": (0, 15)}, {"start": 10, "end": 20, "window": (5, 20)}]
+        # offsets relative to the windows, the entities of the overlap zones being found by both segments
+        segment_entities = [[{"id": 0, "cui": "C01", "start": 2, "end": 4},
+                             {"id": 1, "cui": "C02", "start": 8, "end": 12},
+                             {"id": 2, "cui": "C03", "start": 13, "end": 15}],
+                            [{"id": 0, "cui": "C02", "start": 3, "end": 7},
+                             {"id": 1, "cui": "C04", "start": 6, "end": 7},
+                             {"id": 2, "cui": "C03", "start": 8, "end": 10}]]
+        entities = merge_segment_entities(segments, segment_entities)["entities"]
+
+        self.assertEqual([(e["id"], e["cui"], e["start"], e["end"]) for e in entities.values()],
+                         [(0, "C01", 2, 4), (1, "C02", 8, 12), (2, "C03", 13, 15)])
+
+    def testParallelMatchesSinglePass(self):
+        expected = self.processor._get_entities(self.document)
+        self.assertGreater(len(expected["entities"]), 50)
+
+        result = self.processor.process_content({"text": self.document})
+        self.assertTrue(result["success"])
+        self.assertEqual(list(result["annotations"]), list(self.processor.process_entities(expected)))
+
+        # the pool is re-used, the short documents being annotated in a single pass
+        self.assertEqual(list(self.processor.process_content({"text": self.document})["annotations"]),
+                         list(self.processor.process_entities(expected)))
+        short = common.get_example_short_document()
+        self.assertEqual(list(self.processor.process_content({"text": short})["annotations"]),
+                         list(self.processor.process_entities(self.processor._get_entities(short))))
+
+    def testSegmentVocabGrowthIsChecked(self):
+        # the subprocesses run the same function, against the processor they were forked with
+        with mock.patch.object(parallel_segments, "_processor", self.processor), \
+                mock.patch.object(self.processor, "vocab_max_growth", 1):
+            vocab_resets = self.processor.vocab_resets
+            entities = parallel_segments._get_segment_entities(self.document[:400] + " unseenword%d" % id(self), ())
+        self.assertGreater(len(entities), 0)
+        self.assertEqual(self.processor.vocab_resets, vocab_resets + 1)
+
+    def testSegmentCacheTakesPrecedence(self):
+        with mock.patch.dict(os.environ, {"APP_PARALLEL_DOC_MIN_CHARS": "1000", "APP_SEGMENT_CACHE": "True"}), \
+                self.assertLogs("MedCatProcessor", level="WARNING") as logs:
+            processor = MedCatProcessor()
+        self.assertIsNone(processor.segment_pool)
+        self.assertIn("APP_SEGMENT_CACHE takes precedence", "".join(logs.output))
+        self.assertIn("segment_cache", processor.process_content({"text": self.document}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from medcat_service.nlp_processor.screening import NameAutomaton, get_cdb_fingerprint, load_or_compile
+
+
+class TestScreening(unittest.TestCase):
+    """
+    Implementation of test cases for the CDB name automaton of the screening mode
+    """
+
+    NAMES = {"heart": ["C01"], "heart~attack": ["C02"], "attack": ["C03"], "kidney~failure": ["C04"],
+             "acute~kidney~failure": ["C05"], "type~2~diabetes": ["C06", "C07"], "2~diabetes": ["C08"], "mi": ["C09"]}
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cdb = SimpleNamespace(name2cuis=dict(self.NAMES),
+                                   config=SimpleNamespace(general=SimpleNamespace(separator="~"),
+                                                          ner=SimpleNamespace(min_name_len=3)))
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def _compile(self, names):
+        automaton = NameAutomaton()
+        for name, cuis in names.items():
+            automaton.add_name(name.replace("~", " "), cuis)
+        automaton.compile()
+        return automaton
+
+    def testFindsAllMatches(self):
+        automaton = self._compile(self.NAMES)
+        text = "Acute kidney failure after a heart attack"
+
+        matches = {(text[start:end], automaton.names[name_index][1]) for start, end, name_index
+                   in automaton.iter_matches(text)}
+        self.assertEqual(matches, {("Acute kidney failure", "acute kidney failure"),
+                                   ("kidney failure", "kidney failure"), ("heart", "heart"),
+                                   ("heart attack", "heart attack"), ("attack", "attack")})
+
+    def testKeepsLeftmostLongestMatches(self):
+        automaton = self._compile(self.NAMES)
+        text = "Acute kidney failure after a HEART attack, type-2 diabetes."
+
+        found = [(text[start:end], cuis) for start, end, _, cuis in automaton.find(text)]
+        self.assertEqual(found, [("Acute kidney failure", ("C05",)), ("HEART attack", ("C02",)),
+                                 ("type-2 diabetes", ("C06", "C07"))])
+
+    def testNamesAreNotMatchedAcrossSentences(self):
+        automaton = self._compile(self.NAMES)
+        text = "Check the heart. Attack of pain"
+
+        found = [text[start:end] for start, end, _, _ in automaton.find(text)]
+        self.assertEqual(found, ["heart", "Attack"])
+
+    def testCompiledAutomatonIsCached(self):
+        automaton = load_or_compile(self.cdb, self.cache_dir)
+        cache_files = os.listdir(self.cache_dir)
+        self.assertEqual(cache_files, ["automaton-%s.pkl" % get_cdb_fingerprint(self.cdb)])
+        # the names shorter than min_name_len are left out
+        self.assertEqual(automaton.find("Suspected MI, heart attack"), [(14, 26, "heart attack", ("C02",))])
+
+        cached = load_or_compile(self.cdb, self.cache_dir)
+        self.assertIsNot(cached, automaton)
+        self.assertEqual(cached.find("Suspected MI, heart attack"), automaton.find("Suspected MI, heart attack"))
+
+        # a different CDB gets its own automaton
+        self.cdb.name2cuis["myocardial~infarction"] = ["C02"]
+        self.assertEqual(len(load_or_compile(self.cdb, self.cache_dir).find("myocardial infarction")), 1)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,21 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import gzip
+import importlib
 import json
 import logging
 import os
 import unittest
+from unittest import mock
 
+import zstandard
+
+import medcat_service.api.compression as compression
 import medcat_service.test.common as common
 from medcat_service.app import app as medcat_app
+from medcat_service.nlp_processor.spill_buffer import SpillBuffer
+from medcat_service.utils.arrow_results import iter_entities, pa
 
 
 class TestMedcatService(unittest.TestCase):
@@ -20,6 +28,8 @@ class TestMedcatService(unittest.TestCase):
     ENDPOINT_INFO_ENDPOINT = '/api/info'
     ENDPOINT_PROCESS_SINGLE = '/api/process'
     ENDPOINT_PROCESS_BULK = '/api/process_bulk'
+    ENDPOINT_SCREEN = '/api/screen'
+    ENDPOINT_CONCEPTS = '/api/concepts'
 
     # Static initialization methods
     #
@@ -55,7 +65,10 @@ class TestMedcatService(unittest.TestCase):
             cls.log.warning("OS ENV: APP_BULK_NPROC: not set -- setting to default: 8")
             os.environ["APP_BULK_NPROC"] = "8"
 
+        # the optional processing modes are left to their defaults, being enabled by their own test cases only
         os.environ["APP_TRAINING_MODE"] = "False"
+        os.environ["APP_PROFILING_TOKEN"] = "test-profiling-token"
+        os.environ["APP_BULK_SHARD_CHARS"] = "1000"
 
     @staticmethod
     def _setup_flask_app(cls):
@@ -66,6 +79,13 @@ class TestMedcatService(unittest.TestCase):
         cls.app.testing = True
         cls.client = cls.app.test_client()
 
+    @staticmethod
+    def _setup_flask_app_with_env(cls, env):
+        # the MedCAT processor of the app is created on the first request, with the given env variables set
+        with mock.patch.dict(os.environ, env):
+            TestMedcatService._setup_flask_app(cls)
+            cls.client.get(TestMedcatService.ENDPOINT_INFO_ENDPOINT)
+
     @staticmethod
     def _setup_logging(cls):
         log_format = '[%(asctime)s] [%(levelname)s] %(name)s: %(message)s'
@@ -122,6 +142,14 @@ class TestMedcatService(unittest.TestCase):
         response = self.client.get(self.ENDPOINT_INFO_ENDPOINT)
         self.assertEqual(response.status_code, 200)
 
+        data = json.loads(response.get_data(as_text=True))
+        self.assertGreater(data["memory"]["rss_mb"], 0)
+        self.assertGreaterEqual(data["memory"]["vocab_strings"], data["memory"]["vocab_strings_baseline"])
+        self.assertGreater(len(data["cpu"]["cpus"]), 0)
+        self.assertFalse(data["bulk_tuning"]["enabled"])
+        # the batch size is left to MedCAT by default
+        self.assertEqual(data["bulk_tuning"]["batch_size_chars"], 5000000)
+
     def testProcessSingleShortDoc(self):
         doc = common.get_example_short_document()
         self._testProcessSingleDoc(doc)
@@ -134,6 +162,29 @@ class TestMedcatService(unittest.TestCase):
 
         # TODO: check the returned annotations
 
+    def testProcessSingleDocProfiled(self):
+        doc = common.get_example_long_document()
+        payload = common.create_payload_content_from_doc_single(doc)
+        payload["profile"] = True
+
+        response = self.client.post(self.ENDPOINT_PROCESS_SINGLE, json=payload,
+                                    headers={"X-Profiling-Token": "test-profiling-token"})
+        self.assertEqual(response.status_code, 200)
+
+        data = json.loads(response.get_data(as_text=True))
+        self.assertGreater(len(data["result"]["annotations"][0]), 0)
+
+        stages = [path.split(";")[-1] for path in data["profile"]["breakdown"]]
+        for stage in ["get_entities", "spacy:tokenizer", "ner", "linking", "process_entities", "serialisation"]:
+            self.assertIn(stage, stages)
+        self.assertTrue(any(stage.startswith("meta_cat:") for stage in stages))
+        self.assertGreater(len(data["profile"]["folded_stacks"]), 0)
+
+        # the profile is only returned to authorised clients
+        response = self.client.post(self.ENDPOINT_PROCESS_SINGLE, json=payload)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("profile", json.loads(response.get_data(as_text=True)))
+
     def testProcessSingleBlankDocs(self):
         for doc in common.get_blank_documents():
             payload = common.create_payload_content_from_doc_single(doc)
@@ -155,6 +206,173 @@ class TestMedcatService(unittest.TestCase):
         for res in data["result"]:
             self.assertEqual(len(res["annotations"]), 0)
 
+    def testProcessBulkStreamedResponse(self):
+        docs = [common.get_example_long_document(), common.get_example_short_document(), " "] * 3
+        payload = common.create_payload_content_from_doc_bulk(docs)
+        expected = json.loads(self.client.post(self.ENDPOINT_PROCESS_BULK, json=payload).get_data(as_text=True))
+
+        with mock.patch.object(importlib.import_module("medcat_service.api.api"), "BULK_STREAMING", True):
+            response = self.client.post(self.ENDPOINT_PROCESS_BULK, json=payload)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual([(res["text"], res["annotations"]) for res in data["result"]],
+                         [(res["text"], res["annotations"]) for res in expected["result"]])
+        self.assertGreater(len(data["result"][0]["annotations"]), 0)
+
+    def testProcessBulkDuplicateDocs(self):
+        long_doc, short_doc = common.get_example_long_document(), common.get_example_short_document()
+        docs = [long_doc, short_doc, long_doc, " ", long_doc, short_doc]
+        payload = common.create_payload_content_from_doc_bulk(docs)
+
+        response = self.client.post(self.ENDPOINT_PROCESS_BULK, json=payload)
+        self.assertEqual(response.status_code, 200)
+
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual(len(data["result"]), len(docs))
+        for i in [0, 1, 2, 4, 5]:
+            self.assertEqual(data["result"][i]["deduplicated_docs"], 3)
+
+        # duplicates are given the annotations of the processed document
+        self.assertEqual(data["result"][0]["annotations"], data["result"][2]["annotations"])
+        self.assertEqual(data["result"][0]["annotations"], data["result"][4]["annotations"])
+        self.assertEqual(data["result"][1]["annotations"], data["result"][5]["annotations"])
+        self.assertEqual(data["result"][5]["text"], short_doc)
+
+    def testProcessBulkWithDeadline(self):
+        # distinct documents, spread over several shards
+        docs = ["%s %d" % (common.get_example_long_document(), i) for i in range(4)]
+        payload = common.create_payload_content_from_doc_bulk(docs)
+        payload["deadline_ms"] = 600000
+
+        response = self.client.post(self.ENDPOINT_PROCESS_BULK, json=payload)
+        self.assertEqual(response.status_code, 200)
+
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual(len(data["result"]), len(docs))
+        for res in data["result"]:
+            self.assertTrue(res["success"])
+            self.assertNotIn("deferred", res)
+            self.assertGreater(len(res["annotations"]), 0)
+
+    def testProcessBulkDeadlineReached(self):
+        docs = [common.get_example_long_document(), " ", common.get_example_short_document()]
+        payload = common.create_payload_content_from_doc_bulk(docs)
+
+        response = self.client.post(self.ENDPOINT_PROCESS_BULK, json=payload, headers={"X-Deadline-Ms": "1"})
+        self.assertEqual(response.status_code, 200)
+
+        data = json.loads(response.get_data(as_text=True))
+        for i in [0, 2]:
+            self.assertFalse(data["result"][i]["success"])
+            self.assertTrue(data["result"][i]["deferred"])
+            self.assertIn("deadline", data["result"][i]["deferred_reason"])
+            self.assertEqual(data["result"][i]["text"], docs[i])
+        # blank documents are not deferred
+        self.assertTrue(data["result"][1]["success"])
+
+        for deadline_ms in ["soon", "nan", "inf", "-inf"]:
+            response = self.client.post(self.ENDPOINT_PROCESS_BULK, json=payload,
+                                        headers={"X-Deadline-Ms": deadline_ms})
+            self.assertEqual(response.status_code, 400)
+
+        # the deferred documents are found in the Arrow output as well, to be resubmitted
+        if pa is not None:
+            response = self.client.post(self.ENDPOINT_PROCESS_BULK + "?format=arrow", json=payload,
+                                        headers={"X-Deadline-Ms": "1"})
+            rows = pa.ipc.open_stream(response.get_data()).read_all().to_pylist()
+            self.assertEqual([(row["doc_index"], row["success"], row["deferred"], row["cui"]) for row in rows],
+                             [(0, False, True, None), (1, True, False, None), (2, False, True, None)])
+
+    @unittest.skipIf(pa is None, "pyarrow is not installed")
+    def testProcessBulkArrowOutput(self):
+        docs = [common.get_example_short_document(), " ", common.get_example_long_document()]
+        payload = common.create_payload_content_from_doc_bulk(docs)
+        json_response = self.client.post(self.ENDPOINT_PROCESS_BULK, json=payload)
+        expected = [list(iter_entities(res["annotations"]))
+                    for res in json.loads(json_response.get_data(as_text=True))["result"]]
+
+        response = self.client.post(self.ENDPOINT_PROCESS_BULK + "?format=arrow", json=payload)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/vnd.apache.arrow.stream")
+
+        table = pa.ipc.open_stream(response.get_data()).read_all()
+        # one row per entity, or a single row for the documents without entities
+        self.assertEqual(table.num_rows, sum(max(1, len(entities)) for entities in expected))
+        self.assertIn("service_app_name", json.loads(table.schema.metadata[b"medcat_info"]))
+        self.assertNotIn("doc_id", table.column_names)
+
+        rows = table.to_pylist()
+        blank = [row for row in rows if row["doc_index"] == 1]
+        self.assertEqual([(row["success"], row["deferred"], row["cui"]) for row in blank], [(True, False, None)])
+        first = [row for row in rows if row["doc_index"] == 2][0]
+        self.assertEqual((first["cui"], first["start"], first["end"], first["type_ids"]),
+                         (expected[2][0]["cui"], expected[2][0]["start"], expected[2][0]["end"],
+                          expected[2][0]["type_ids"]))
+        for task, meta_ann in expected[2][0].get("meta_anns", {}).items():
+            self.assertEqual(first["meta_" + task], meta_ann["value"])
+            self.assertAlmostEqual(first["meta_%s_confidence" % task], meta_ann["confidence"])
+
+    @unittest.skipIf(pa is None, "pyarrow is not installed")
+    def testProcessSingleParquetOutput(self):
+        import pyarrow.parquet as pq
+
+        payload = {"content": {"text": common.get_example_short_document(), "doc_id": "note-1"}}
+        response = self.client.post(self.ENDPOINT_PROCESS_SINGLE, json=payload,
+                                    headers={"Accept": "application/vnd.apache.parquet"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/vnd.apache.parquet")
+
+        table = pq.read_table(pa.BufferReader(response.get_data()))
+        self.assertGreater(table.num_rows, 0)
+        self.assertEqual(set(table.column("doc_id").to_pylist()), {"note-1"})
+
+        payload["output_format"] = "xml"
+        response = self.client.post(self.ENDPOINT_PROCESS_SINGLE, json=payload)
+        self.assertEqual(response.status_code, 400)
+
+    def testProcessBulkCompressedDocs(self):
+        docs = [common.get_example_short_document(), common.get_example_long_document()]
+        body = json.dumps(common.create_payload_content_from_doc_bulk(docs)).encode("utf-8")
+
+        def zstd_decompress(data):
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+        for encoding, compress, decompress in [("gzip", gzip.compress, gzip.decompress),
+                                               ("zstd", zstandard.compress, zstd_decompress)]:
+            response = self.client.post(self.ENDPOINT_PROCESS_BULK, data=compress(body),
+                                        content_type="application/json",
+                                        headers={"Content-Encoding": encoding, "Accept-Encoding": encoding})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers["Content-Encoding"], encoding)
+            self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+
+            data = json.loads(decompress(response.get_data()))
+            self.assertEqual(len(data["result"]), len(docs))
+            for res in data["result"]:
+                self.assertGreater(len(res["annotations"]), 0)
+
+        # the uncompressed responses vary on the 'Accept-Encoding' header as well, unless compression is disabled
+        response = self.client.post(self.ENDPOINT_PROCESS_BULK, data=body, content_type="application/json")
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        with mock.patch.object(compression, "RESPONSE_COMPRESSION", False):
+            response = self.client.post(self.ENDPOINT_PROCESS_BULK, data=body, content_type="application/json",
+                                        headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertNotIn("Vary", response.headers)
+
+        response = self.client.post(self.ENDPOINT_PROCESS_BULK, data=b"not gzip", content_type="application/json",
+                                    headers={"Content-Encoding": "gzip"})
+        self.assertEqual(response.status_code, 400)
+
+        # the decompressed size is limited, however small the compressed body
+        with mock.patch.object(compression, "MAX_DECOMPRESSED_SIZE", len(body) - 1):
+            response = self.client.post(self.ENDPOINT_PROCESS_BULK, data=gzip.compress(body),
+                                        content_type="application/json", headers={"Content-Encoding": "gzip"})
+        self.assertEqual(response.status_code, 413)
+
     def testProcessBulkMultipleShortDocs(self):
         multiply_sizes = [1, 5, 10, 30, 100]
         doc = common.get_example_long_document()
@@ -177,5 +395,225 @@ class TestMedcatService(unittest.TestCase):
         # TODO: check annotations
 
 
+class TestMedcatServiceIncremental(unittest.TestCase):
+    """
+    Implementation of test cases for the incremental re-annotation of the documents sent with a "doc_id"
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        TestMedcatService._setup_logging(cls)
+        TestMedcatService._setup_medcat_processor(cls)
+        TestMedcatService._setup_flask_app_with_env(cls, {"APP_INCREMENTAL_ANNOTATION": "True"})
+
+    def testProcessSingleIncrementalDoc(self):
+        doc = "\n".join([common.get_example_long_document()] * 3)
+        edited_doc = doc + "\n            Aspirin stopped."
+
+        def _post(content):
+            response = self.client.post(TestMedcatService.ENDPOINT_PROCESS_SINGLE, json={"content": content})
+            self.assertEqual(response.status_code, 200)
+            return json.loads(response.get_data(as_text=True))["result"]
+
+        def _spans(result):
+            return sorted((e["start"], e["end"], e["cui"]) for e in result["annotations"][0].values())
+
+        def _meta_anns(result):
+            return sorted((e["start"], task, meta_ann["value"], round(meta_ann["confidence"], 4))
+                          for e in result["annotations"][0].values() for task, meta_ann in e["meta_anns"].items())
+
+        _post({"text": doc, "doc_id": "incremental-test", "version": 1})
+        # the MetaCAT pipes are skipped for the changed regions only, not disabled on the shared pipeline
+        with mock.patch("spacy.language.Language.disable_pipe", side_effect=AssertionError("shared pipe disabled")):
+            result = _post({"text": edited_doc, "doc_id": "incremental-test", "version": 2})
+        full_result = _post({"text": edited_doc})
+
+        self.assertGreater(result["incremental"]["reused_entities"], 0)
+        self.assertLess(result["incremental"]["reannotated_chars"], len(edited_doc))
+        self.assertEqual(_spans(result), _spans(full_result))
+        # the MetaCAT models are run again over the entities carried over, their context having changed
+        self.assertGreater(len(_meta_anns(full_result)), 0)
+        self.assertEqual(_meta_anns(result), _meta_anns(full_result))
+
+    def testProcessSingleInvalidDocId(self):
+        for doc_id in [["incremental-test"], {"id": 1}, 1.5, True]:
+            response = self.client.post(TestMedcatService.ENDPOINT_PROCESS_SINGLE,
+                                        json={"content": {"text": "Patient has diabetes.", "doc_id": doc_id}})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("doc_id", response.get_data(as_text=True))
+
+        response = self.client.post(TestMedcatService.ENDPOINT_PROCESS_SINGLE,
+                                    json={"content": {"text": "Patient has diabetes.", "doc_id": 42}})
+        self.assertEqual(response.status_code, 200)
+
+
+class TestMedcatServiceSegmentCache(unittest.TestCase):
+    """
+    Implementation of test cases for the paragraph-level annotation cache
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        TestMedcatService._setup_logging(cls)
+        TestMedcatService._setup_medcat_processor(cls)
+        TestMedcatService._setup_flask_app_with_env(cls, {"APP_SEGMENT_CACHE": "True"})
+
+    def testProcessSingleSegmentCachedDocs(self):
+        boilerplate = common.get_example_long_document()
+        docs = ["\n\n".join([boilerplate] * 3 + [common.get_example_short_document()]),
+                "\n\n".join([common.get_example_short_document()] + [boilerplate] * 3)]
+
+        results = []
+        for doc in docs:
+            payload = common.create_payload_content_from_doc_single(doc)
+            response = self.client.post(TestMedcatService.ENDPOINT_PROCESS_SINGLE, json=payload)
+            self.assertEqual(response.status_code, 200)
+            results.append(json.loads(response.get_data(as_text=True))["result"])
+
+        # the paragraph surrounded by the same context in both documents is taken from the cache
+        self.assertEqual(results[1]["segment_cache"]["segments"], 4)
+        self.assertGreater(results[1]["segment_cache"]["hits"], 0)
+        self.assertGreaterEqual(results[1]["segment_cache"]["chars_skipped"], len(boilerplate))
+
+        # and the cached entities are moved to the position of the paragraph in the new document
+        for entity in results[1]["annotations"][0].values():
+            self.assertEqual(docs[1][entity["start"]:entity["end"]], entity["source_value"])
+
+
+class TestMedcatServiceBulkTuning(unittest.TestCase):
+    """
+    Implementation of test cases for the runtime tuning of the bulk processing configuration
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        TestMedcatService._setup_logging(cls)
+        TestMedcatService._setup_medcat_processor(cls)
+        TestMedcatService._setup_flask_app_with_env(cls, {"APP_BULK_TUNING": "True"})
+
+    def testBulkTuningInfo(self):
+        docs = [common.get_example_long_document(), common.get_example_short_document()] * 3
+        payload = common.create_payload_content_from_doc_bulk(docs)
+        for deadline_ms in (None, 600000):
+            if deadline_ms is not None:
+                payload["deadline_ms"] = deadline_ms
+            response = self.client.post(TestMedcatService.ENDPOINT_PROCESS_BULK, json=payload)
+            self.assertEqual(response.status_code, 200)
+            results = json.loads(response.get_data(as_text=True))["result"]
+            self.assertTrue(all(res["success"] for res in results))
+
+        data = json.loads(self.client.get(TestMedcatService.ENDPOINT_INFO_ENDPOINT).get_data(as_text=True))
+        self.assertTrue(data["bulk_tuning"]["enabled"])
+        nproc_min, nproc_max = data["bulk_tuning"]["nproc_bounds"]
+        self.assertTrue(nproc_min <= data["bulk_tuning"]["nproc"] <= nproc_max <= len(data["cpu"]["cpus"]))
+
+
+class TestMedcatServiceScreeningAndConcepts(unittest.TestCase):
+    """
+    Implementation of test cases for the dictionary-only screening and the concept lookup and search
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        TestMedcatService._setup_logging(cls)
+        TestMedcatService._setup_medcat_processor(cls)
+        TestMedcatService._setup_flask_app_with_env(cls, {"APP_SCREENING": "True", "APP_CONCEPT_INDEX": "True"})
+
+    def testScreenDocs(self):
+        docs = [common.get_example_short_document(), " ", common.get_example_long_document()]
+        payload = common.create_payload_content_from_doc_bulk(docs)
+
+        response = self.client.post(TestMedcatService.ENDPOINT_SCREEN, json=payload)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual(len(data["result"]), len(docs))
+        self.assertTrue(data["result"][0]["matched"])
+        self.assertFalse(data["result"][1]["matched"])
+
+        # the matches agree with the full annotation for the names found as is
+        full = json.loads(self.client.post(TestMedcatService.ENDPOINT_PROCESS_BULK,
+                                           json=payload).get_data(as_text=True))
+        entity = list(iter_entities(full["result"][0]["annotations"]))[0]
+        screened = data["result"][0]["annotations"]
+        self.assertIn((entity["cui"], entity["start"], entity["end"]),
+                      [(match["cui"], match["start"], match["end"]) for match in screened])
+
+        # the same through the bulk API, for the given CUIs only
+        payload.update(screen=True, cuis=[entity["cui"]], include_spans=False)
+        response = self.client.post(TestMedcatService.ENDPOINT_PROCESS_BULK, json=payload)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual(data["result"][0]["cuis"], [entity["cui"]])
+        self.assertNotIn("annotations", data["result"][0])
+
+        payload["cuis"] = entity["cui"]
+        response = self.client.post(TestMedcatService.ENDPOINT_SCREEN, json=payload)
+        self.assertEqual(response.status_code, 400)
+
+    def testConceptLookupAndSearch(self):
+        response = self.client.get(TestMedcatService.ENDPOINT_CONCEPTS + "/search", query_string={"q": "kidney"})
+        self.assertEqual(response.status_code, 200)
+        match = json.loads(response.get_data(as_text=True))["result"][0]
+        self.assertEqual((match["name"], match["match"]), ("kidney failure", "prefix"))
+
+        response = self.client.get(TestMedcatService.ENDPOINT_CONCEPTS + "/" + match["cui"])
+        self.assertEqual(response.status_code, 200)
+        concept = json.loads(response.get_data(as_text=True))["result"]
+        self.assertEqual(concept["cui"], match["cui"])
+        self.assertEqual(concept["names"], ["kidney failure"])
+
+        # misspelt names are found by the fuzzy search
+        response = self.client.get(TestMedcatService.ENDPOINT_CONCEPTS + "/search",
+                                   query_string={"q": "klonidine", "mode": "fuzzy"})
+        result = json.loads(response.get_data(as_text=True))["result"]
+        self.assertEqual([match["name"] for match in result], ["clonidine"])
+
+        self.assertEqual(self.client.get(TestMedcatService.ENDPOINT_CONCEPTS + "/unknown-cui").status_code, 404)
+        self.assertEqual(self.client.get(TestMedcatService.ENDPOINT_CONCEPTS + "/search").status_code, 400)
+        self.assertEqual(self.client.get(TestMedcatService.ENDPOINT_CONCEPTS + "/search",
+                                         query_string={"q": "rash", "mode": "regex"}).status_code, 400)
+
+
+class TestMedcatServiceBoundedMemory(unittest.TestCase):
+    """
+    Implementation of test cases for the bulk processing with a memory budget, the annotations being spilled
+    to disk and the responses streamed
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        TestMedcatService._setup_logging(cls)
+        TestMedcatService._setup_medcat_processor(cls)
+        # the annotations of the bulk requests are spilled to disk past the first KB
+        TestMedcatService._setup_flask_app_with_env(cls, {"APP_BULK_MEMORY_BUDGET_MB": "0.001"})
+
+    def testProcessBulkSpilledResultsAreReadLazily(self):
+        docs = ["%s %d" % (common.get_example_long_document(), i) for i in range(20)]
+        payload = common.create_payload_content_from_doc_bulk(docs)
+        reads = []
+        spill_buffer_getitem = SpillBuffer.__getitem__
+
+        def getitem(buffer, idx):
+            reads.append(idx)
+            return spill_buffer_getitem(buffer, idx)
+
+        with mock.patch.object(importlib.import_module("medcat_service.api.api"), "BULK_STREAMING", True), \
+                mock.patch.object(compression, "COMPRESSION_CHUNK_SIZE", 1), \
+                mock.patch.object(SpillBuffer, "__getitem__", getitem):
+            response = self.client.post(TestMedcatService.ENDPOINT_PROCESS_BULK, json=payload, buffered=False)
+            self.assertEqual(response.status_code, 200)
+            chunks = iter(response.response)
+            body = [next(chunks)]
+            # the annotations are read back one document at a time while the body is sent
+            self.assertLess(len(reads), 2)
+            body.extend(chunks)
+            response.close()
+
+        self.assertEqual(len(reads), len(docs))
+        data = json.loads(b"".join(body))
+        self.assertEqual([res["text"] for res in data["result"]], docs)
+        self.assertTrue(all(len(res["annotations"][0]) > 0 for res in data["result"]))
+
+
 if __name__ == "__main__":
     unittest.main()
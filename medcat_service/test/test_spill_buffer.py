@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pickle
+import unittest
+
+from medcat_service.nlp_processor.spill_buffer import SpillBuffer
+
+
+class TestSpillBuffer(unittest.TestCase):
+    """
+    Implementation of test cases for the bounded-memory buffer of the bulk processing results
+    """
+
+    @staticmethod
+    def _get_result(idx):
+        return {"text": "document %d" % idx, "entities": {i: {"cui": "C%02d" % i, "start": i} for i in range(idx)}}
+
+    def testResultsAreSpilledPastTheBudget(self):
+        results = {idx: self._get_result(idx) for idx in range(10)}
+        budget = sum(len(pickle.dumps(results[idx], protocol=pickle.HIGHEST_PROTOCOL)) for idx in range(4))
+        buffer = SpillBuffer(budget)
+        buffer.update({idx: results[idx] for idx in range(5)})
+        buffer.update({idx: results[idx] for idx in range(5, 10)})
+
+        self.assertEqual(buffer.spilled_count, 6)
+        self.assertEqual(buffer.entity_count, sum(range(10)))
+        self.assertLessEqual(buffer.memory_bytes, budget)
+        self.assertGreater(buffer.spilled_bytes, 0)
+
+        self.assertEqual(len(buffer), 10)
+        self.assertEqual(sorted(buffer), list(range(10)))
+        self.assertIn(7, buffer.keys())
+        self.assertNotIn(10, buffer)
+        self.assertEqual(dict(buffer.items()), results)
+        # the spilled results are read back from the file
+        self.assertIsNot(buffer[7], results[7])
+        self.assertIsNone(buffer.get(10))
+
+        buffer.add(10, self._get_result(10))
+        self.assertEqual(buffer[10], self._get_result(10))
+
+        buffer.close()
+        self.assertEqual(buffer[0], results[0])
+        with self.assertRaises(Exception):
+            buffer[7]
+
+    def testResultsWithinTheBudgetStayInMemory(self):
+        buffer = SpillBuffer(1024 * 1024)
+        result = self._get_result(3)
+        buffer.add(0, result)
+
+        self.assertEqual(buffer.spilled_count, 0)
+        self.assertIs(buffer[0], result)
+        self.assertIsNone(buffer._file)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import requests
+from flask import Blueprint, Flask, jsonify, request
+from werkzeug.serving import make_server
+
+from medcat_service.api.capture import WorkloadCapture, record_payload, record_results
+from medcat_service.workload import (SyntheticTextGenerator, build_workload, compare, format_report, load_capture,
+                                     replay_workload)
+
+
+def _annotate(documents):
+    # one entity per "aspirin" mention
+    for document in documents:
+        yield {"text": document["text"], "annotations": [{"cui": "C01"}] * document["text"].lower().count("aspirin")}
+
+
+class TestWorkload(unittest.TestCase):
+    """
+    Implementation of test cases for the workload capture middleware and the workload replay
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.capture = WorkloadCapture(os.path.join(cls.tmp_dir, "capture.jsonl"))
+
+        blueprint = Blueprint(name='api', import_name='api', url_prefix='/api')
+        cls.capture.register(blueprint)
+
+        @blueprint.route('/process_bulk', methods=['POST'])
+        def process_bulk():
+            payload = request.get_json()
+            record_payload(payload)
+            time.sleep(0.05)
+            return jsonify({'result': list(record_results(_annotate(payload['content'])))})
+
+        @blueprint.route('/retrain_medcat', methods=['POST'])
+        def retrain_medcat():
+            return jsonify({})
+
+        app = Flask(__name__)
+        app.register_blueprint(blueprint)
+        cls.server = make_server("127.0.0.1", 0, app, threaded=True)
+        cls.url = "http://127.0.0.1:%d" % cls.server.server_port
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        shutil.rmtree(cls.tmp_dir)
+
+    def _capture_workload(self):
+        documents = [{"text": "Aspirin given. " * 4}, {"text": "No aspirin, no rash."}]
+        for i in range(3):
+            requests.post(self.url + "/api/process_bulk", json={"content": documents[:i + 1],
+                                                                "meta_anns_filters": [["Status", ["Affirmed"]]]},
+                          headers={"Accept-Encoding": "gzip"})
+            time.sleep(0.1)
+        requests.post(self.url + "/api/retrain_medcat", json={})
+
+        # the requests are recorded once their responses are sent
+        for _ in range(100):
+            captured = load_capture(self.capture.path)
+            if len(captured) == 4:
+                return captured
+            time.sleep(0.01)
+        return captured
+
+    def testCaptureAndReplay(self):
+        captured = self._capture_workload()
+        self.assertEqual([record["endpoint"] for record in captured], ["/api/process_bulk"] * 3 +
+                         ["/api/retrain_medcat"])
+        record = captured[2]
+        # the shape of the documents, without their content
+        self.assertEqual(record["num_docs"], 2)
+        self.assertEqual(record["doc_chars"], [60, 20])
+        self.assertEqual(record["doc_entities"], [4, 1])
+        self.assertEqual(record["options"], {"accept": "*/*", "accept_encoding": "gzip",
+                                             "meta_anns_filters": [["Status", ["Affirmed"]]]})
+        self.assertEqual(record["status"], 200)
+        self.assertGreaterEqual(record["latency_ms"], 50)
+        self.assertEqual(record["in_flight"], 1)
+        with open(self.capture.path) as f:
+            self.assertNotIn("aspirin", f.read().lower())
+
+        workload, skipped = build_workload(captured, SyntheticTextGenerator(terms=["aspirin"]))
+        self.assertEqual(skipped, 1)
+        self.assertEqual(len(workload), 3)
+        self.assertEqual([len(doc["text"]) for doc in workload[2]["payload"]["content"]], [60, 20])
+        self.assertEqual(workload[2]["payload"]["meta_anns_filters"], [["Status", ["Affirmed"]]])
+        self.assertEqual(workload[2]["headers"], {"Accept": "*/*", "Accept-Encoding": "gzip"})
+        self.assertGreater(workload[2]["offset"], workload[1]["offset"])
+
+        self.capture.path = os.path.join(self.tmp_dir, "replay.jsonl")
+        replayed = replay_workload(workload, self.url)
+        self.assertEqual([record["status"] for record in replayed], [200] * 3)
+        self.assertEqual([record["num_docs"] for record in replayed], [1, 2, 2])
+        self.assertTrue(all(record["doc_entities"] and record["doc_entities"][0] >= 1 for record in replayed))
+
+        report = compare(captured[:3], replayed, skipped)
+        self.assertEqual(report["replayed"]["overall"]["requests"], 3)
+        self.assertEqual(report["replayed"]["overall"]["errors"], 0)
+        self.assertGreater(report["replayed"]["overall"]["docs_per_s"], 0)
+        self.assertGreaterEqual(report["replayed"]["endpoints"]["/api/process_bulk"]["latency_p50_ms"], 50)
+        self.assertIn("latency p99 (ms)", format_report(report))
+
+    def testSyntheticDocuments(self):
+        generator = SyntheticTextGenerator(terms=["aspirin"], seed=1)
+        for num_chars in (0, 1, 50, 5000):
+            self.assertEqual(len(generator.generate(num_chars)), num_chars)
+
+        text = generator.generate(20000, entity_density=10)
+        self.assertAlmostEqual(text.count("aspirin") * 1000 / len(text), 10, delta=1)
+        self.assertEqual(SyntheticTextGenerator(seed=1).generate(500), SyntheticTextGenerator(seed=1).generate(500))
+
+
+if __name__ == '__main__':
+    unittest.main()
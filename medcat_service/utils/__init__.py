@@ -0,0 +1,10 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .cpu import get_available_cpus, get_cpu_layout, get_cpu_quota, get_numa_nodes, get_thread_counts, set_cpu_affinity
+from .memory import get_peak_rss_mb, get_rss_mb, release_memory
+from .profiling import RequestProfiler, create_request_profiler
+
+__all__ = ['RequestProfiler', 'create_request_profiler', 'get_rss_mb', 'get_peak_rss_mb', 'release_memory',
+           'get_available_cpus', 'get_cpu_quota', 'get_numa_nodes', 'get_cpu_layout', 'get_thread_counts',
+           'set_cpu_affinity']
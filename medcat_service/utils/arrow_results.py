@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+ARROW_STREAM_MIMETYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MIMETYPE = "application/vnd.apache.parquet"
+
+# number of documents per record batch
+ARROW_BATCH_DOCS = 1000
+
+# entity fields mapped onto columns, with the type of the column
+ENTITY_COLUMNS = [("entity_id", "int64"), ("cui", "string"), ("pretty_name", "string"), ("source_value", "string"),
+                  ("start", "int64"), ("end", "int64"), ("acc", "float64"), ("context_similarity", "float64"),
+                  ("type_ids", "list<string>")]
+
+
+def is_arrow_available():
+    return pa is not None
+
+
+def iter_entities(annotations):
+    """Iterates over the entities of a processing result, whatever the entity output mode.
+
+    Args:
+        annotations (Iterable): The "annotations" of a result, holding either dicts of {id: entity} or lists
+            of entities.
+
+    Yields:
+        dict: Consecutive MedCAT entities.
+    """
+    for item in annotations:
+        if isinstance(item, dict) and "cui" not in item:
+            yield from item.values()
+        elif isinstance(item, list):
+            yield from item
+        else:
+            yield item
+
+
+def get_entity_schema(meta_tasks=(), with_doc_id=False, metadata=None):
+    """Returns the schema of the entity record batches: one row per entity, with the index (and optionally the id)
+    of its document, the status of the document ("success", "deferred" and "errors"), the entity fields and, for
+    each meta-annotation task, the "meta_<task>" value and "meta_<task>_confidence" columns. A document without
+    entities has a single row, with null entity fields.
+
+    Args:
+        meta_tasks (Iterable): Names of the meta-annotation tasks. Defaults to ().
+        with_doc_id (bool): Whether to include the "doc_id" column. Defaults to False.
+        metadata (dict, optional): Key-value metadata of the schema. Defaults to None.
+
+    Returns:
+        pa.Schema: Schema of the record batches.
+    """
+    _check_arrow()
+    types = {"int64": pa.int64(), "float64": pa.float64(), "string": pa.string(), "list<string>": pa.list_(pa.string())}
+
+    fields = [pa.field("doc_index", pa.int64(), nullable=False)]
+    if with_doc_id:
+        fields.append(pa.field("doc_id", pa.string()))
+    fields.extend([pa.field("success", pa.bool_(), nullable=False), pa.field("deferred", pa.bool_(), nullable=False),
+                   pa.field("errors", pa.list_(pa.string()))])
+    fields.extend(pa.field(name, types[column_type]) for name, column_type in ENTITY_COLUMNS)
+    for task in meta_tasks:
+        fields.append(pa.field("meta_%s" % task, pa.string()))
+        fields.append(pa.field("meta_%s_confidence" % task, pa.float64()))
+    return pa.schema(fields, metadata=metadata)
+
+
+class EntityBatchBuilder:
+    """
+    Builds the entities of processing results into Arrow record batches, appending the entity fields straight
+    into columns rather than serialising the entities.
+    """
+
+    def __init__(self, meta_tasks=(), with_doc_id=False, metadata=None):
+        """
+        Args:
+            meta_tasks (Iterable): Names of the meta-annotation tasks, flattened into columns. Defaults to ().
+            with_doc_id (bool): Whether to include the "doc_id" column. Defaults to False.
+            metadata (dict, optional): Key-value metadata of the schema. Defaults to None.
+        """
+        self.meta_tasks = list(meta_tasks)
+        self.with_doc_id = with_doc_id
+        self.schema = get_entity_schema(self.meta_tasks, with_doc_id, metadata)
+        self._entity_columns = [name for name, _ in ENTITY_COLUMNS] + \
+            [name for task in self.meta_tasks for name in ("meta_%s" % task, "meta_%s_confidence" % task)]
+        self._reset()
+
+    def add_result(self, doc_index, result, doc_id=None):
+        """Appends the entities of a processing result, or a single row with null entity fields when it has none
+        (e.g. a failed or deferred document), so that the status of every document is found in the table.
+
+        Args:
+            doc_index (int): Index of the document.
+            result (dict): Processing result, as returned by `process_content` / `process_content_bulk`.
+            doc_id (str, optional): Id of the document. Defaults to None.
+        """
+        columns = self._columns
+        status = (bool(result.get("success", False)), bool(result.get("deferred", False)),
+                  [str(error) for error in result["errors"]] if result.get("errors") else None)
+        num_rows = len(columns["doc_index"])
+        for entity in iter_entities(result.get("annotations") or []):
+            self._add_document_columns(doc_index, doc_id, status)
+            columns["entity_id"].append(entity.get("id"))
+            columns["cui"].append(entity.get("cui"))
+            columns["pretty_name"].append(entity.get("pretty_name"))
+            columns["source_value"].append(entity.get("source_value"))
+            columns["start"].append(entity.get("start"))
+            columns["end"].append(entity.get("end"))
+            columns["acc"].append(entity.get("acc"))
+            columns["context_similarity"].append(entity.get("context_similarity"))
+            columns["type_ids"].append(entity.get("type_ids"))
+
+            meta_anns = entity.get("meta_anns") or {}
+            for task in self.meta_tasks:
+                meta_ann = meta_anns.get(task) or {}
+                columns["meta_%s" % task].append(meta_ann.get("value"))
+                columns["meta_%s_confidence" % task].append(meta_ann.get("confidence"))
+
+        if len(columns["doc_index"]) == num_rows:
+            self._add_document_columns(doc_index, doc_id, status)
+            for name in self._entity_columns:
+                columns[name].append(None)
+        self.num_docs += 1
+
+    def flush(self):
+        """Returns the entities appended so far as a record batch, and starts a new one.
+
+        Returns:
+            pa.RecordBatch: Record batch of the appended entities.
+        """
+        batch = pa.RecordBatch.from_arrays([pa.array(self._columns[field.name], type=field.type)
+                                            for field in self.schema], schema=self.schema)
+        self._reset()
+        return batch
+
+    def build_batches(self, results, doc_ids=None, batch_docs=ARROW_BATCH_DOCS):
+        """Generator function building the entities of the processing results into record batches.
+
+        Args:
+            results (Iterable): Processing results, in the order of the documents.
+            doc_ids (list, optional): Ids of the documents, when the builder has the "doc_id" column.
+                Defaults to None.
+            batch_docs (int): Number of documents per record batch. Defaults to ARROW_BATCH_DOCS.
+
+        Yields:
+            pa.RecordBatch: Consecutive record batches, at least one (possibly empty).
+        """
+        empty = True
+        for doc_index, result in enumerate(results):
+            self.add_result(doc_index, result, doc_ids[doc_index] if doc_ids is not None else None)
+            if self.num_docs >= batch_docs:
+                yield self.flush()
+                empty = False
+        if self.num_docs > 0 or empty:
+            yield self.flush()
+
+    def _reset(self):
+        self._columns = {field.name: [] for field in self.schema}
+        self.num_docs = 0
+
+    def _add_document_columns(self, doc_index, doc_id, status):
+        columns = self._columns
+        columns["doc_index"].append(doc_index)
+        if self.with_doc_id:
+            columns["doc_id"].append(None if doc_id is None else str(doc_id))
+        columns["success"].append(status[0])
+        columns["deferred"].append(status[1])
+        columns["errors"].append(status[2])
+
+
+def write_arrow_stream(record_batches, schema):
+    """Generator function serialising the record batches in the Arrow IPC streaming format, batch by batch.
+
+    Args:
+        record_batches (Iterable): Record batches.
+        schema (pa.Schema): Schema of the record batches.
+
+    Yields:
+        bytes: Consecutive chunks of the stream.
+    """
+    _check_arrow()
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in record_batches:
+            writer.write_batch(batch)
+            yield sink.pop()
+    yield sink.pop()
+
+
+def write_parquet(record_batches, schema, where):
+    """Writes the record batches to a Parquet file.
+
+    Args:
+        record_batches (Iterable): Record batches.
+        schema (pa.Schema): Schema of the record batches.
+        where (str | file-like): Path or file object to write to.
+    """
+    _check_arrow()
+    with pq.ParquetWriter(where, schema) as writer:
+        for batch in record_batches:
+            writer.write_batch(batch)
+
+
+def to_parquet_bytes(record_batches, schema):
+    """Returns the record batches serialised as a Parquet file.
+
+    Returns:
+        bytes: The Parquet file.
+    """
+    buffer = io.BytesIO()
+    write_parquet(record_batches, schema, buffer)
+    return buffer.getvalue()
+
+
+def _check_arrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for the Arrow / Parquet output, install it with: pip install pyarrow")
+
+
+class _ChunkSink(io.RawIOBase):
+    # collects the bytes written by the Arrow writer, so that they can be sent as they are produced
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
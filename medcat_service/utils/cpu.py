@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import glob
+import os
+
+# env variables read by the BLAS / OpenMP libraries when they are first loaded
+BLAS_THREADS_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "BLIS_NUM_THREADS",
+                         "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+NUMA_NODES_ROOT = "/sys/devices/system/node"
+
+
+def parse_cpu_list(cpu_list):
+    """Parses a kernel CPU list, e.g. "0-3,8,10-11".
+
+    Args:
+        cpu_list (str): CPU list.
+
+    Returns:
+        list: Sorted CPU ids.
+    """
+    cpus = set()
+    for item in cpu_list.strip().split(","):
+        if not item:
+            continue
+        if "-" in item:
+            first, last = item.split("-")
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(item))
+    return sorted(cpus)
+
+
+def get_available_cpus():
+    """Returns the CPUs the current process is allowed to run on.
+
+    Returns:
+        list: Sorted CPU ids.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def get_cpu_quota(cgroup_root=CGROUP_ROOT):
+    """Returns the CPU quota of the cgroup of the container (cgroup v2 or v1), e.g. set by `docker --cpus`.
+
+    Args:
+        cgroup_root (str): Mount point of the cgroup filesystem. Defaults to "/sys/fs/cgroup".
+
+    Returns:
+        float: Number of CPUs the quota amounts to, or None when there is no quota.
+    """
+    try:
+        # cgroup v2: "<quota> <period>", the quota being "max" when unlimited
+        with open(os.path.join(cgroup_root, "cpu.max")) as f:
+            quota, period = f.read().split()[:2]
+        return int(quota) / int(period) if quota != "max" else None
+    except (OSError, ValueError):
+        pass
+
+    for cpu_dir in ("cpu", "cpu,cpuacct"):
+        try:
+            # cgroup v1: the quota being -1 when unlimited
+            with open(os.path.join(cgroup_root, cpu_dir, "cpu.cfs_quota_us")) as f:
+                quota = int(f.read())
+            with open(os.path.join(cgroup_root, cpu_dir, "cpu.cfs_period_us")) as f:
+                period = int(f.read())
+            return quota / period if quota > 0 and period > 0 else None
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def get_numa_nodes(cpus=None, numa_nodes_root=NUMA_NODES_ROOT):
+    """Returns the CPUs of each NUMA node, restricted to the given CPUs.
+
+    Args:
+        cpus (list, optional): CPUs to keep. Defaults to the CPUs available to the current process.
+        numa_nodes_root (str): Directory of the NUMA nodes in sysfs. Defaults to "/sys/devices/system/node".
+
+    Returns:
+        list: List of sorted CPU lists, one per NUMA node holding any of the CPUs. A single node holding all
+            the CPUs when the topology cannot be read.
+    """
+    cpus = get_available_cpus() if cpus is None else cpus
+    node_paths = sorted(glob.glob(os.path.join(numa_nodes_root, "node[0-9]*")),
+                        key=lambda path: int(os.path.basename(path)[len("node"):]))
+
+    nodes, assigned = [], set()
+    for node_path in node_paths:
+        try:
+            with open(os.path.join(node_path, "cpulist")) as f:
+                node_cpus = [cpu for cpu in parse_cpu_list(f.read()) if cpu in cpus and cpu not in assigned]
+        except (OSError, ValueError):
+            continue
+        if node_cpus:
+            nodes.append(node_cpus)
+            assigned.update(node_cpus)
+
+    unassigned = [cpu for cpu in cpus if cpu not in assigned]
+    if unassigned:
+        nodes.append(sorted(unassigned))
+    return nodes
+
+
+def get_cpu_layout(n_workers, cpus=None, numa_nodes=None, cpu_quota=None):
+    """Partitions the CPUs into disjoint sets, one per worker, keeping each set within a NUMA node when there
+    are at least as many workers as nodes. Only as many CPUs as the cgroup CPU quota allows are used, so that
+    the threads sized after the CPU sets are not throttled.
+
+    Args:
+        n_workers (int): Number of workers.
+        cpus (list, optional): CPUs to partition. Defaults to the CPUs available to the current process.
+        numa_nodes (list, optional): CPUs of each NUMA node. Defaults to the topology read from sysfs.
+        cpu_quota (float, optional): CPU quota. Defaults to the quota of the cgroup of the current process.
+
+    Returns:
+        list: List of sorted CPU lists, one per worker. The CPUs are shared when there are more workers than
+            usable CPUs.
+    """
+    cpus = get_available_cpus() if cpus is None else sorted(cpus)
+    numa_nodes = get_numa_nodes(cpus) if numa_nodes is None else numa_nodes
+    cpu_quota = get_cpu_quota() if cpu_quota is None else cpu_quota
+    n_workers = max(1, n_workers)
+
+    # with a quota, the CPUs are taken node by node so that they span as few nodes as possible
+    n_cpus = min(len(cpus), max(1, int(cpu_quota))) if cpu_quota else len(cpus)
+    nodes, remaining = [], n_cpus
+    for node in sorted(numa_nodes, key=len, reverse=True) if cpu_quota else numa_nodes:
+        if remaining <= 0:
+            break
+        nodes.append(node[:remaining])
+        remaining -= len(nodes[-1])
+    usable_cpus = [cpu for node in nodes for cpu in node]
+
+    if n_workers > len(usable_cpus):
+        return [[usable_cpus[i % len(usable_cpus)]] for i in range(n_workers)]
+
+    if n_workers < len(nodes):
+        # fewer workers than nodes, each worker gets whole nodes
+        return [sorted(cpu for node in group for cpu in node) for group in _split(nodes, n_workers)]
+
+    # the workers are spread over the nodes proportionally to their size (D'Hondt), then each node is split
+    # between its workers
+    shares = [0] * len(nodes)
+    for _ in range(n_workers):
+        node_index = max(range(len(nodes)), key=lambda i: len(nodes[i]) / (shares[i] + 1))
+        shares[node_index] += 1
+    return [worker_cpus for node, share in zip(nodes, shares) for worker_cpus in _split(node, share)]
+
+
+def get_thread_counts(n_cpus, bulk_nproc):
+    """Derives the number of threads to use from the number of CPUs of a worker.
+
+    Args:
+        n_cpus (int): Number of CPUs of the worker.
+        bulk_nproc (int): Max number of bulk processing subprocesses.
+
+    Returns:
+        dict: "torch_threads" and "blas_threads" of the worker, "bulk_nproc" subprocesses (at most one per CPU)
+            and "bulk_torch_threads" of each of them.
+    """
+    n_cpus = max(1, n_cpus)
+    bulk_nproc = max(1, min(bulk_nproc, n_cpus))
+    return {"torch_threads": n_cpus,
+            "blas_threads": n_cpus,
+            "bulk_nproc": bulk_nproc,
+            "bulk_torch_threads": max(1, n_cpus // bulk_nproc)}
+
+
+def set_cpu_affinity(cpus):
+    """Pins the current process, and the processes it creates from now on, to the CPUs.
+
+    Args:
+        cpus (list): CPU ids.
+
+    Returns:
+        bool: Whether the affinity could be set.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        os.sched_setaffinity(0, cpus)
+        return True
+    except OSError:
+        return False
+
+
+def _split(items, n):
+    # splits the items into n contiguous chunks, their sizes differing by one at most
+    size, extra = divmod(len(items), n)
+    chunks, start = [], 0
+    for i in range(n):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import ctypes
+import ctypes.util
+import gc
+import os
+import resource
+
+try:
+    import psutil
+except ImportError:
+    psutil = None  # type: ignore
+
+_libc = None
+
+
+def get_rss_mb():
+    """Returns the resident set size of the current process.
+
+    Returns:
+        float: RSS in MB, or the peak RSS when the current one cannot be read.
+    """
+    if psutil is not None:
+        return psutil.Process(os.getpid()).memory_info().rss / (1024 * 1024)
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return get_peak_rss_mb()
+
+
+def get_peak_rss_mb():
+    """Returns the peak resident set size of the current process.
+
+    Returns:
+        float: Peak RSS in MB.
+    """
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def release_memory():
+    """Runs a full garbage collection and hands the freed heap memory back to the OS (glibc only)."""
+    global _libc
+    gc.collect()
+
+    if _libc is None:
+        libc_name = ctypes.util.find_library("c")
+        _libc = ctypes.CDLL(libc_name) if libc_name else False
+    if _libc and hasattr(_libc, "malloc_trim"):
+        _libc.malloc_trim(0)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import pickle
+import tempfile
+from stat import S_IWGRP, S_IWOTH
+
+log = logging.getLogger("PickleCache")
+log.setLevel(level=os.getenv("APP_LOG_LEVEL", logging.INFO))
+
+
+def load_or_build(cache_path, build, description="object"):
+    """Loads a pickled object from the cache, building (and caching) it when missing or unreadable. As unpickling
+    runs arbitrary code, the cache directory is created private to the current user, and the cache files (or
+    directories) owned by another user, or writable by others, are neither loaded nor written to.
+
+    Args:
+        cache_path (str): Path of the cache file, which should be keyed by whatever the object is built from.
+        build (Callable): Function building the object.
+        description (str): Description of the object, for logging. Defaults to "object".
+
+    Returns:
+        Any: The loaded or built object.
+    """
+    cache_dir = os.path.dirname(cache_path) or "."
+    if os.path.exists(cache_path) and not (is_private(cache_dir) and is_private(cache_path)):
+        log.warning("Ignoring the %s cached in %s, owned by another user or writable by others", description,
+                    cache_path)
+    elif os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                obj = pickle.load(f)
+            log.info("Loaded the %s from %s", description, cache_path)
+            return obj
+        except Exception as e:
+            log.warning("Could not load the %s from %s: %s", description, cache_path, repr(e))
+
+    obj = build()
+
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        if not is_private(cache_dir):
+            log.warning("Not caching the %s in %s, owned by another user or writable by others", description,
+                        cache_dir)
+            return obj
+        # written to a temporary file first, so that concurrent workers never read a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        log.warning("Could not cache the %s in %s: %s", description, cache_dir, repr(e))
+    return obj
+
+
+def is_private(path):
+    """Returns whether the file or directory is owned by the current user and not writable by the others.
+
+    Args:
+        path (str): Path of the file or directory.
+
+    Returns:
+        bool: Whether the path can be trusted.
+    """
+    stat = os.stat(path)
+    return stat.st_uid == os.getuid() and not stat.st_mode & (S_IWGRP | S_IWOTH)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hmac
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import simplejson as json
+
+log = logging.getLogger("Profiling")
+log.setLevel(level=os.getenv("APP_LOG_LEVEL", logging.INFO))
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+class RequestProfiler:
+    """
+    Collects a tree of timed spans for a single request. The spans can be returned as a per-stage breakdown,
+    dumped as folded stacks (the input format of flamegraph.pl / speedscope) and exported as OpenTelemetry spans.
+    """
+
+    def __init__(self, name, **attributes):
+        self.spans = []
+        self._stack = []
+        self._root = self._start_span(name, attributes)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Times the enclosed block as a child span of the current one.
+
+        Args:
+            name (str): Span name.
+            **attributes: Span attributes, more can be added on the yielded span "attributes" dict.
+
+        Yields:
+            dict: The span.
+        """
+        span = self._start_span(name, attributes)
+        try:
+            yield span
+        finally:
+            self._end_span(span)
+
+    def timed_iter(self, iterable, name):
+        """Wraps an iterable so that the time spent producing its items is accumulated into a single span.
+
+        Args:
+            iterable (Iterable): The iterable to be wrapped.
+            name (str): Span name.
+
+        Yields:
+            The items of the iterable.
+        """
+        parent = self._stack[-1] if self._stack else None
+        span = {"name": name, "path": self._get_path(name), "start_ns": time.time_ns(), "duration_ns": 0,
+                "attributes": {}, "children_ns": 0, "parent": parent}
+        self.spans.append(span)
+        iterator = iter(iterable)
+        try:
+            while True:
+                start_ns = time.perf_counter_ns()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    span["duration_ns"] += time.perf_counter_ns() - start_ns
+                yield item
+        finally:
+            span["end_ns"] = span["start_ns"] + span["duration_ns"]
+            if parent is not None:
+                parent["children_ns"] += span["duration_ns"]
+
+    def finish(self, **attributes):
+        """Ends the root span of the request.
+
+        Args:
+            **attributes: Additional attributes of the root span.
+        """
+        self._root["attributes"].update(attributes)
+        if "end_ns" not in self._root:
+            self._end_span(self._root)
+
+    def get_breakdown(self):
+        """Returns the total time spent in each stage.
+
+        Returns:
+            dict: Mapping of span paths to their total duration in milliseconds.
+        """
+        breakdown = {}
+        for span in self.spans:
+            breakdown[span["path"]] = breakdown.get(span["path"], 0) + span["duration_ns"] / 1e6
+        return breakdown
+
+    def get_folded_stacks(self):
+        """Returns the spans in the folded stacks format, one "root;child;grandchild <self time in us>" line
+        per distinct stack, that can be rendered as a flamegraph.
+
+        Returns:
+            list: Folded stack lines.
+        """
+        self_times = {}
+        for span in self.spans:
+            self_time_us = max(0, span["duration_ns"] - span["children_ns"]) // 1000
+            self_times[span["path"]] = self_times.get(span["path"], 0) + self_time_us
+        return ["%s %d" % (path, self_time) for path, self_time in self_times.items()]
+
+    def to_dict(self):
+        """Returns the profile of the request.
+
+        Returns:
+            dict: Profile with the per-stage "breakdown" (ms), the "folded_stacks" and the "spans".
+        """
+        return {"breakdown": self.get_breakdown(),
+                "folded_stacks": self.get_folded_stacks(),
+                "spans": [{"name": span["name"],
+                           "path": span["path"],
+                           "start_time_unix_nano": span["start_ns"],
+                           "end_time_unix_nano": span.get("end_ns", span["start_ns"]),
+                           "attributes": span["attributes"]} for span in self.spans]}
+
+    def export(self):
+        """Exports the spans through OpenTelemetry, when the SDK is installed, otherwise logs the profile.
+        The folded stacks are also written to APP_PROFILING_OUTPUT_DIR when set.
+        """
+        tracer = get_tracer()
+        if tracer is not None:
+            _export_otel_spans(tracer, self.spans)
+        else:
+            log.info("Request profile: %s", json.dumps(self.to_dict()))
+
+        output_dir = os.getenv("APP_PROFILING_OUTPUT_DIR", "")
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+            file_name = "%s-%d.folded" % (self._root["name"].strip("/").replace("/", "_"), self._root["start_ns"])
+            with open(os.path.join(output_dir, file_name), "w") as f:
+                f.write("\n".join(self.get_folded_stacks()) + "\n")
+
+    def _start_span(self, name, attributes):
+        span = {"name": name, "path": self._get_path(name), "start_ns": time.time_ns(),
+                "attributes": dict(attributes), "children_ns": 0, "parent": self._stack[-1] if self._stack else None,
+                "_perf_start_ns": time.perf_counter_ns()}
+        self.spans.append(span)
+        self._stack.append(span)
+        return span
+
+    def _end_span(self, span):
+        span["duration_ns"] = time.perf_counter_ns() - span.pop("_perf_start_ns")
+        span["end_ns"] = span["start_ns"] + span["duration_ns"]
+        if self._stack and self._stack[-1] is span:
+            self._stack.pop()
+        if span["parent"] is not None:
+            span["parent"]["children_ns"] += span["duration_ns"]
+
+    def _get_path(self, name):
+        return self._stack[-1]["path"] + ";" + name if self._stack else name
+
+
+def create_request_profiler(name, requested, token=None):
+    """Creates a profiler for the request when profiling was requested by an authorised client, or when the
+    request is picked for background tracing (APP_TRACE_SAMPLE_RATE).
+
+    Args:
+        name (str): Name of the root span, usually the endpoint.
+        requested (bool): Whether the client asked for the profile to be returned.
+        token (str, optional): The profiling token sent by the client. Defaults to None.
+
+    Returns:
+        tuple: (profiler, return_profile), profiler being None when the request is not profiled.
+    """
+    expected_token = os.getenv("APP_PROFILING_TOKEN", "")
+    if requested and expected_token and token is not None and _compare_tokens(token, expected_token):
+        return RequestProfiler(name), True
+
+    if random.random() < float(os.getenv("APP_TRACE_SAMPLE_RATE", 0)):
+        return RequestProfiler(name), False
+
+    return None, False
+
+
+def get_tracer():
+    """Returns the OpenTelemetry tracer of the service, exporting the spans to the collector set in the
+    OTEL_EXPORTER_OTLP_ENDPOINT (or OTEL_EXPORTER_OTLP_TRACES_ENDPOINT) env variable.
+
+    Returns:
+        Tracer: OpenTelemetry tracer, None if no collector is set or the OpenTelemetry SDK is not installed.
+    """
+    global _tracer
+    if not (os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT") or os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT")):
+        return None
+
+    with _tracer_lock:
+        if _tracer is None:
+            try:
+                from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+                from opentelemetry.sdk.resources import Resource
+                from opentelemetry.sdk.trace import TracerProvider
+                from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            except ImportError:
+                log.warning("OpenTelemetry SDK / OTLP exporter not installed, request profiles will be logged instead")
+                return None
+
+            provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("APP_NAME", "MedCAT")}))
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            _tracer = provider.get_tracer("medcat_service")
+        return _tracer
+
+
+def _export_otel_spans(tracer, spans):
+    from opentelemetry import trace
+
+    otel_spans = {}
+    for span in spans:
+        parent = otel_spans.get(id(span["parent"])) if span["parent"] is not None else None
+        context = trace.set_span_in_context(parent) if parent is not None else None
+        otel_span = tracer.start_span(span["name"], context=context, start_time=span["start_ns"],
+                                      attributes=span["attributes"])
+        otel_spans[id(span)] = otel_span
+    for span in spans:
+        otel_spans[id(span)].end(end_time=span.get("end_ns", span["start_ns"]))
+
+
+def _compare_tokens(token, expected_token):
+    return hmac.compare_digest(token.encode("utf-8"), expected_token.encode("utf-8"))
@@ -0,0 +1,8 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .replay import build_workload, compare, format_report, load_capture, replay_workload, summarise
+from .synthetic import SyntheticTextGenerator
+
+__all__ = ['SyntheticTextGenerator', 'load_capture', 'build_workload', 'replay_workload', 'summarise', 'compare',
+           'format_report']
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Replays a workload captured with APP_WORKLOAD_CAPTURE_PATH against a service, with synthetic documents of the
+same lengths and entity density, at the captured arrival rate, and compares the latency and throughput:
+
+    python -m medcat_service.workload <capture.jsonl> [--url http://localhost:5000] [--speed 1] [--terms names.txt]
+"""
+import argparse
+import logging
+import sys
+
+import simplejson as json
+
+from medcat_service.workload.replay import (REPLAYED_ENDPOINTS, build_workload, compare, format_report, load_capture,
+                                            replay_workload)
+from medcat_service.workload.synthetic import SyntheticTextGenerator
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m medcat_service.workload",
+                                     description="Replays a captured workload with synthetic documents and compares "
+                                                 "the latency and throughput with the captured run.")
+    parser.add_argument("capture", help="JSON lines file written by the workload capture (APP_WORKLOAD_CAPTURE_PATH)")
+    parser.add_argument("--url", default="http://localhost:5000", help="URL of the service (default: %(default)s)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay speed, 2 sending the requests twice as fast as captured (default: 1)")
+    parser.add_argument("--max-concurrency", type=int, default=32,
+                        help="max number of requests in flight (default: 32)")
+    parser.add_argument("--timeout", type=float, default=300, help="timeout of each request in seconds (default: 300)")
+    parser.add_argument("--terms", default=None,
+                        help="text file with the terms mentioned in the synthetic documents, one per line, e.g. "
+                             "names of the concepts of the model (default: common clinical terms)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic documents (default: 0)")
+    parser.add_argument("--save-workload", default=None,
+                        help="JSON lines file the synthetic requests are written to")
+    parser.add_argument("--dry-run", action="store_true", help="only build (and save) the synthetic requests")
+    parser.add_argument("--report", default=None, help="JSON file the comparison is written to")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="[%(asctime)s] [%(levelname)s] %(name)s: %(message)s", level=logging.INFO)
+
+    terms = None
+    if args.terms is not None:
+        with open(args.terms, encoding="utf-8") as f:
+            terms = [line.strip() for line in f if line.strip()]
+
+    records = load_capture(args.capture)
+    workload, skipped = build_workload(records, SyntheticTextGenerator(terms, seed=args.seed))
+    logging.getLogger("WorkloadReplay").info("Built %d synthetic requests, %d captured requests skipped",
+                                             len(workload), skipped)
+
+    if args.save_workload is not None:
+        with open(args.save_workload, "w", encoding="utf-8") as f:
+            for request in workload:
+                f.write(json.dumps(request) + "\n")
+    if args.dry_run:
+        return 0
+
+    replayed = replay_workload(workload, args.url, speed=args.speed, max_concurrency=args.max_concurrency,
+                               timeout=args.timeout)
+    report = compare([record for record in records if record.get("endpoint") in REPLAYED_ENDPOINTS], replayed,
+                     skipped)
+    print(format_report(report))
+
+    if args.report is not None:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
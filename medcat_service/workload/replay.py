@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gzip
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import simplejson as json
+
+from medcat_service.utils.arrow_results import iter_entities
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore
+
+log = logging.getLogger("WorkloadReplay")
+log.setLevel(level=os.getenv("APP_LOG_LEVEL", logging.INFO))
+
+# endpoints replayed with synthetic requests, the other ones (e.g. retraining, concept lookup) being skipped
+REPLAYED_ENDPOINTS = ("/api/process", "/api/process_bulk", "/api/screen", "/api/concepts/search", "/api/info")
+
+# captured options sent back as payload fields
+PAYLOAD_OPTIONS = ("meta_anns_filters", "deadline_ms", "output_format", "screen", "include_spans")
+
+# captured options sent back as request headers
+HEADER_OPTIONS = {"accept": "Accept", "accept_encoding": "Accept-Encoding", "content_encoding": "Content-Encoding"}
+
+# captured options that cannot be replayed: profiling needs the profiling token, the screened CUIs are not captured
+IGNORED_OPTIONS = ("profile", "num_cuis")
+
+
+def load_capture(path):
+    """Loads the requests captured by the workload capture of the service, sorted by arrival time.
+
+    Args:
+        path (str): Captured JSON lines file.
+
+    Returns:
+        list: Captured request records.
+    """
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                log.warning("Skipping the malformed line %d of %s", line_no, path)
+    return sorted(records, key=lambda record: record["time"])
+
+
+def build_workload(records, generator):
+    """Builds the synthetic requests replaying the captured ones: the same endpoints, options, arrival times and
+    document lengths, the documents being generated with the entity density of the captured documents.
+
+    Args:
+        records (list): Captured request records, sorted by arrival time.
+        generator (SyntheticTextGenerator): Generator of the documents.
+
+    Returns:
+        tuple: (synthetic requests with their "offset" in seconds from the first one, number of skipped records)
+    """
+    workload, skipped = [], 0
+    start_time = records[0]["time"] if records else 0
+    for record in records:
+        if record.get("endpoint") not in REPLAYED_ENDPOINTS:
+            skipped += 1
+            continue
+
+        options = dict(record.get("options") or {})
+        headers = {header: options.pop(name) for name, header in HEADER_OPTIONS.items() if name in options}
+        payload = {name: options.pop(name) for name in PAYLOAD_OPTIONS if name in options}
+        params = {name: value for name, value in options.items() if name not in IGNORED_OPTIONS}
+        if "query_chars" in record:
+            params["q"] = generator.generate_query(record["query_chars"])
+
+        doc_chars = record.get("doc_chars") or []
+        if record["method"] == "POST":
+            documents = [{"text": generator.generate(num_chars, _get_entity_density(record, i))}
+                         for i, num_chars in enumerate(doc_chars)]
+            payload["content"] = documents[0] if record["endpoint"] == "/api/process" and documents else documents
+
+        workload.append({"offset": record["time"] - start_time, "endpoint": record["endpoint"],
+                         "method": record["method"], "params": params, "headers": headers,
+                         "payload": payload if record["method"] == "POST" else None,
+                         "num_docs": len(doc_chars), "doc_chars": doc_chars})
+    return workload, skipped
+
+
+def replay_workload(workload, base_url, speed=1.0, max_concurrency=32, timeout=300):
+    """Sends the synthetic requests to a service at their arrival times (relative to the start of the replay),
+    each request being sent from its own thread, up to `max_concurrency` at once.
+
+    Args:
+        workload (list): Synthetic requests, as built by `build_workload`.
+        base_url (str): URL of the service, e.g. "http://localhost:5000".
+        speed (float): Replay speed, 2 sending the requests twice as fast as captured. Defaults to 1.
+        max_concurrency (int): Max number of requests in flight. Defaults to 32.
+        timeout (float): Timeout of each request, in seconds. Defaults to 300.
+
+    Returns:
+        list: Records of the replayed requests, in the format of the captured ones, with the "lag_ms" of each
+            request behind its arrival time.
+    """
+    bodies = [_encode_body(request) for request in workload]
+    sessions = threading.local()
+    in_flight, in_flight_lock = [0], threading.Lock()
+
+    def send(request, body, scheduled_time):
+        session = getattr(sessions, "session", None)
+        if session is None:
+            session = sessions.session = requests.Session()
+        with in_flight_lock:
+            in_flight[0] += 1
+            record = {"time": round(time.time(), 3), "endpoint": request["endpoint"], "method": request["method"],
+                      "in_flight": in_flight[0], "num_docs": request["num_docs"], "doc_chars": request["doc_chars"],
+                      "lag_ms": round((time.monotonic() - scheduled_time) * 1000, 3)}
+        start_time = time.monotonic()
+        try:
+            response = session.request(request["method"], base_url.rstrip("/") + request["endpoint"],
+                                       params=request["params"], headers=request["headers"], data=body,
+                                       timeout=timeout)
+            content = response.content
+            record["status"] = response.status_code
+        except requests.RequestException as e:
+            log.warning("Request to %s failed: %s", request["endpoint"], e)
+            content, record["status"] = None, 0
+        record["latency_ms"] = round((time.monotonic() - start_time) * 1000, 3)
+        with in_flight_lock:
+            in_flight[0] -= 1
+        if content is not None and record["status"] == 200 and request["method"] == "POST":
+            record["doc_entities"] = _count_entities(content)
+        return record
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        start_time = time.monotonic()
+        for request, body in zip(workload, bodies):
+            scheduled_time = start_time + request["offset"] / speed
+            time.sleep(max(0.0, scheduled_time - time.monotonic()))
+            futures.append(executor.submit(send, request, body, scheduled_time))
+    return [future.result() for future in futures]
+
+
+def summarise(records):
+    """Summarises the latency and throughput of requests, overall and per endpoint.
+
+    Args:
+        records (list): Captured or replayed request records.
+
+    Returns:
+        dict: The "overall" summary and the summaries of the "endpoints".
+    """
+    by_endpoint = {}
+    for record in records:
+        by_endpoint.setdefault(record["endpoint"], []).append(record)
+    return {"overall": _summarise_records(records),
+            "endpoints": {endpoint: _summarise_records(endpoint_records)
+                          for endpoint, endpoint_records in sorted(by_endpoint.items())}}
+
+
+def compare(captured, replayed, skipped=0):
+    """Compares the summaries of the captured and replayed requests.
+
+    Args:
+        captured (list): Captured request records (of the replayed endpoints).
+        replayed (list): Replayed request records.
+        skipped (int): Number of captured requests that were not replayed. Defaults to 0.
+
+    Returns:
+        dict: The "captured" and "replayed" summaries, the "skipped" requests and the max "lag_ms" of the replay.
+    """
+    return {"captured": summarise(captured), "replayed": summarise(replayed), "skipped": skipped,
+            "lag_ms": max((record.get("lag_ms", 0) for record in replayed), default=0)}
+
+
+def format_report(report):
+    """Formats a comparison of the captured and replayed requests as text tables, one per endpoint.
+
+    Args:
+        report (dict): Comparison, as returned by `compare`.
+
+    Returns:
+        str: Report.
+    """
+    rows = [("requests", "requests", "%d"), ("errors", "errors", "%d"), ("duration_s", "duration (s)", "%.2f"),
+            ("requests_per_s", "requests/s", "%.2f"), ("docs_per_s", "documents/s", "%.2f"),
+            ("chars_per_s", "characters/s", "%.0f"), ("mean_concurrency", "mean concurrency", "%.2f"),
+            ("max_concurrency", "max concurrency", "%d"), ("entity_density", "entities/1000 chars", "%.2f"),
+            ("latency_mean_ms", "latency mean (ms)", "%.1f"), ("latency_p50_ms", "latency p50 (ms)", "%.1f"),
+            ("latency_p90_ms", "latency p90 (ms)", "%.1f"), ("latency_p99_ms", "latency p99 (ms)", "%.1f"),
+            ("latency_max_ms", "latency max (ms)", "%.1f")]
+
+    lines = []
+    sections = [("all endpoints", report["captured"]["overall"], report["replayed"]["overall"])]
+    sections += [(endpoint, summary, report["replayed"]["endpoints"].get(endpoint, {}))
+                 for endpoint, summary in report["captured"]["endpoints"].items()]
+    for name, captured, replayed in sections:
+        lines.append("%-22s %14s %14s %9s" % (name, "captured", "replayed", "ratio"))
+        for key, label, value_format in rows:
+            captured_value, replayed_value = captured.get(key), replayed.get(key)
+            ratio = "%.2f" % (replayed_value / captured_value) if captured_value and replayed_value is not None \
+                else "-"
+            lines.append("  %-20s %14s %14s %9s" % (label, _format_value(captured_value, value_format),
+                                                    _format_value(replayed_value, value_format), ratio))
+        lines.append("")
+    lines.append("skipped requests: %d, max replay lag: %.1f ms" % (report["skipped"], report["lag_ms"]))
+    return "\n".join(lines)
+
+
+def _summarise_records(records):
+    if not records:
+        return {"requests": 0}
+
+    start = min(record["time"] for record in records)
+    intervals = [(record["time"], record["time"] + record["latency_ms"] / 1000) for record in records]
+    duration = max(max(end for _, end in intervals) - start, 1e-6)
+    latencies = sorted(record["latency_ms"] for record in records)
+    num_docs = sum(record.get("num_docs") or 0 for record in records)
+    num_chars = sum(sum(record.get("doc_chars") or []) for record in records)
+
+    # entity density of the documents whose entities were counted
+    entity_chars, num_entities = 0, 0
+    for record in records:
+        for num_chars_doc, doc_entities in zip(record.get("doc_chars") or [], record.get("doc_entities") or []):
+            if doc_entities is not None:
+                entity_chars += num_chars_doc
+                num_entities += doc_entities
+
+    return {"requests": len(records),
+            "errors": sum(1 for record in records if not 200 <= record.get("status", 0) < 400),
+            "duration_s": duration,
+            "requests_per_s": len(records) / duration,
+            "docs_per_s": num_docs / duration,
+            "chars_per_s": num_chars / duration,
+            "mean_concurrency": sum(latencies) / 1000 / duration,
+            "max_concurrency": _get_max_concurrency(intervals),
+            "entity_density": num_entities * 1000 / entity_chars if entity_chars else None,
+            "latency_mean_ms": sum(latencies) / len(latencies),
+            "latency_p50_ms": _percentile(latencies, 50),
+            "latency_p90_ms": _percentile(latencies, 90),
+            "latency_p99_ms": _percentile(latencies, 99),
+            "latency_max_ms": latencies[-1]}
+
+
+def _get_max_concurrency(intervals):
+    # the ends sort before the starts at the same time, back-to-back requests not overlapping
+    events = sorted([(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals])
+    concurrency, max_concurrency = 0, 0
+    for _, change in events:
+        concurrency += change
+        max_concurrency = max(max_concurrency, concurrency)
+    return max_concurrency
+
+
+def _percentile(sorted_values, percent):
+    # nearest-rank percentile
+    return sorted_values[max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)]
+
+
+def _get_entity_density(record, doc_idx):
+    doc_chars, doc_entities = record.get("doc_chars") or [], record.get("doc_entities") or []
+    if doc_idx < len(doc_entities) and doc_entities[doc_idx] is not None and doc_chars[doc_idx] > 0:
+        return doc_entities[doc_idx] * 1000 / doc_chars[doc_idx]
+    # the entities of the documents of partially captured results are estimated from the other documents
+    counted = [(chars, entities) for chars, entities in zip(doc_chars, doc_entities) if entities is not None]
+    total_chars = sum(chars for chars, _ in counted)
+    return sum(entities for _, entities in counted) * 1000 / total_chars if total_chars else None
+
+
+def _encode_body(request):
+    if request["payload"] is None:
+        return None
+    body = json.dumps(request["payload"]).encode("utf-8")
+    request["headers"].setdefault("Content-Type", "application/json")
+    encoding = request["headers"].get("Content-Encoding", "identity").strip().lower()
+    if encoding == "gzip":
+        return gzip.compress(body)
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor().compress(body)
+    request["headers"].pop("Content-Encoding", None)
+    return body
+
+
+def _count_entities(content):
+    try:
+        result = json.loads(content).get("result")
+    except (ValueError, AttributeError):
+        return None
+    results = result if isinstance(result, list) else [result]
+    return [sum(1 for _ in iter_entities(result["annotations"])) if isinstance(result, dict) and
+            isinstance(result.get("annotations"), list) else None for result in results]
+
+
+def _format_value(value, value_format):
+    return value_format % value if value is not None else "-"
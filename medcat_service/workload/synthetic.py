@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+
+# concept mentions per 1000 characters, when the captured requests have no entity counts
+DEFAULT_ENTITY_DENSITY = 5.0
+
+CLINICAL_TERMS = [
+    "hypertension", "type 2 diabetes mellitus", "asthma", "chronic obstructive pulmonary disease",
+    "atrial fibrillation", "heart failure", "myocardial infarction", "chest pain", "shortness of breath", "cough",
+    "fever", "headache", "nausea", "vomiting", "abdominal pain", "back pain", "rash", "fatigue", "dizziness", "syncope",
+    "palpitations", "pneumonia", "urinary tract infection", "sepsis", "acute kidney injury", "chronic kidney disease",
+    "anaemia", "depression", "anxiety", "dementia", "stroke", "epilepsy", "osteoarthritis", "rheumatoid arthritis",
+    "obesity", "hypothyroidism", "hyperlipidaemia", "cellulitis", "deep vein thrombosis", "pulmonary embolism",
+    "aspirin", "paracetamol", "ibuprofen", "metformin", "insulin", "amlodipine", "ramipril", "bisoprolol",
+    "atorvastatin", "simvastatin", "warfarin", "apixaban", "furosemide", "omeprazole", "salbutamol", "prednisolone",
+    "amoxicillin", "co-amoxiclav", "morphine", "codeine", "sertraline", "levothyroxine", "clopidogrel",
+]
+
+FILLER_SENTENCES = [
+    "Patient seen on the ward round this morning.",
+    "Observations stable overnight.",
+    "Alert and orientated, comfortable at rest.",
+    "Eating and drinking well, mobilising with assistance.",
+    "Discussed the plan with the patient and family, who are happy to proceed.",
+    "Bloods taken and sent, results to be reviewed this afternoon.",
+    "No new concerns raised by the nursing staff.",
+    "Heart sounds normal, chest clear on auscultation.",
+    "Abdomen soft and non-tender, bowel sounds present.",
+    "Review in clinic in six weeks.",
+    "Safety netting advice given.",
+    "Lives at home with partner, independent with activities of daily living.",
+    "Never smoked, drinks alcohol occasionally.",
+    "Plan to continue current management and reassess tomorrow.",
+    "Imaging reviewed with the radiology team.",
+]
+
+TERM_SENTENCES = [
+    "Known history of {}.",
+    "Presented with {} over the last few days.",
+    "Started on {} today.",
+    "Denies any {}.",
+    "Background of {}, well controlled.",
+    "Continue {} as per the drug chart.",
+    "Possible {}, to be investigated further.",
+    "Family history of {}.",
+    "Stop {} until further review.",
+    "No evidence of {} on examination.",
+]
+
+SECTION_HEADINGS = ["HISTORY:", "EXAMINATION:", "MEDICATIONS:", "IMPRESSION:", "PLAN:"]
+
+
+class SyntheticTextGenerator:
+    """
+    Generates clinical-like documents of a given length, made of note sections, filler sentences and sentences
+    mentioning clinical terms at a given density, so that a captured workload can be replayed without its
+    (patient) text. The terms can be replaced by names of the concepts of the model, for the replayed documents
+    to have about as many entities as the captured ones.
+    """
+
+    def __init__(self, terms=None, seed=0):
+        """
+        Args:
+            terms (list, optional): Terms mentioned in the documents. Defaults to common clinical terms.
+            seed (int): Seed of the random generator, for the workload to be reproducible. Defaults to 0.
+        """
+        self.terms = list(terms) if terms else CLINICAL_TERMS
+        self.random = random.Random(seed)
+
+    def generate(self, num_chars, entity_density=None):
+        """Generates a document.
+
+        Args:
+            num_chars (int): Number of characters of the document.
+            entity_density (float, optional): Number of term mentions per 1000 characters.
+                Defaults to DEFAULT_ENTITY_DENSITY.
+
+        Returns:
+            str: Document of exactly `num_chars` characters.
+        """
+        density = DEFAULT_ENTITY_DENSITY if entity_density is None else entity_density
+        parts, length, num_terms = [], 0, 0
+        while length < num_chars:
+            if self.random.random() < 0.1:
+                part = "\n\n%s\n" % self.random.choice(SECTION_HEADINGS) if parts else "%s\n" % SECTION_HEADINGS[0]
+            elif num_terms < density * (length + 1) / 1000:
+                part = self.random.choice(TERM_SENTENCES).format(self.random.choice(self.terms))
+                num_terms += 1
+            else:
+                part = self.random.choice(FILLER_SENTENCES)
+            if parts and not parts[-1].endswith("\n"):
+                part = " " + part
+            parts.append(part)
+            length += len(part)
+        return "".join(parts)[:num_chars]
+
+    def generate_query(self, num_chars):
+        """Generates a concept search query, i.e. the beginning of a term.
+
+        Args:
+            num_chars (int): Number of characters of the query.
+
+        Returns:
+            str: Query of at most `num_chars` characters (at least 1).
+        """
+        return self.random.choice(self.terms)[:max(1, num_chars)]
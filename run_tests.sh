@@ -3,6 +3,7 @@ set -e
 
 # download the sci-scpacy language model
 python3 -m pip install -r ./requirements.txt --extra-index-url https://download.pytorch.org/whl/cpu/;
+python3 -m pip install -r ./requirements-onnx.txt;
 python3 -m spacy download en_core_web_sm
 python3 -m spacy download en_core_web_md
 python3 -m spacy download en_core_web_lg
@@ -17,7 +18,7 @@ export APP_VOCAB_MODEL="$PWD/models/medmen/vocab.dat"
 echo "Starting the tests ..."
 
 # run the python tests
-python3 -m medcat_service.test.test_service
+python3 -m unittest discover -s medcat_service/test -t .
 
 if [ "$?" -ne "0" ]; then
     echo "Error: one or more tests failed"
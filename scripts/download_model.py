@@ -1,9 +1,17 @@
 #!/usr/bin/env python3
+import hashlib
+import json
 import logging
 import os
+import shutil
+import struct
 import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from zipfile import ZipFile
+from zipfile import BadZipFile, ZipFile
 
 import requests
 
@@ -15,91 +23,534 @@ required_vars = {
     "MODEL_META_URL": "URL to meta file",
 }
 
-# Setup logging
-logging.basicConfig(
-    format="[%(asctime)s] [%(levelname)s] %(name)s: %(message)s",
-    level=logging.INFO,
-)
+# Optional environment variables
+optional_vars = {
+    "MODEL_VOCAB_SHA256": "SHA-256 checksum of the vocab file",
+    "MODEL_CDB_SHA256": "SHA-256 checksum of the CDB file",
+    "MODEL_META_SHA256": "SHA-256 checksum of the meta file",
+    "MODEL_CACHE_DIR": "content-addressed download cache (default: models/.cache)",
+    "MODEL_DOWNLOAD_WORKERS": "number of concurrent downloads (default: 3)",
+    "MODEL_DOWNLOAD_RETRIES": "number of times an interrupted download is resumed (default: 5)",
+    "MODEL_DOWNLOAD_TIMEOUT": "connect / read timeout in seconds (default: 60)",
+}
+
 log = logging.getLogger()
 
-log.info("Running MedCAT Model Downloader")
-
-# Check for missing env vars
-missing = [var for var in required_vars if not os.getenv(var)]
-if missing:
-    log.error("Missing Required environment variables:")
-    for var in missing:
-        log.error(f"  {var}")
-    log.info("Usage: set these environment variables before running the script:")
-    for var, desc in required_vars.items():
-        log.info(f"  {var:<16} - {desc}")
-
-    sys.exit(1)
-
-# Load env vars
-model_name = os.environ["MODEL_NAME"]
-vocab_url = os.environ["MODEL_VOCAB_URL"]
-cdb_url = os.environ["MODEL_CDB_URL"]
-meta_url = os.environ["MODEL_META_URL"]
-
-# Prepare paths
-script_dir = Path(__file__).resolve().parent
-model_dir = script_dir.parent / "models" / model_name
-model_dir.mkdir(parents=True, exist_ok=True)
-
-vocab_file = model_dir / "vocab.dat"
-cdb_file = model_dir / "cdb.dat"
-meta_zip = model_dir / "mc_status.zip"
-meta_dir = model_dir / "Status"
-
-
-def download_file(url, dest_path):
-    log.info(f"Downloading from {url} to {dest_path}")
-    resp = requests.get(url, stream=True)
-    resp.raise_for_status()
-    total = int(resp.headers.get("content-length", 0))
-    downloaded = 0
-    chunk_size = 8192
-    last_logged_percent = 0
-
-    with open(dest_path, "wb") as f:
-        # Print status bar to the console
-        for chunk in resp.iter_content(chunk_size):
-            if chunk:
-                f.write(chunk)
-                downloaded += len(chunk)
-                if total:
-                    percent = int(downloaded * 100 / total)
-                    if percent - last_logged_percent >= 10 or percent == 100:
-                        last_logged_percent = percent
-                        done = int(50 * percent / 100)
-                        downloaded_mb = downloaded / (1024 * 1024)
-                        total_mb = total / (1024 * 1024)
-                        log.info(f"[{'=' * done:<50}] {percent:3d}% {downloaded_mb:.2f} MB / {total_mb:.2f} MB")
-    os.chmod(dest_path, 0o644)
-    log.info(f"Download complete to {dest_path}")
-
-
-# Download vocab and cdb if missing
-if vocab_file.exists() and cdb_file.exists():
-    log.info(
-        f"{model_name} model already present with Vocabulary: '{vocab_file}' and CDB: '{cdb_file}'. Skipping download"
+# the bytes of an incomplete chunk are lost when the connection drops
+CHUNK_SIZE = 64 * 1024
+
+ZIP_LOCAL_FILE_HEADER = 0x04034B50
+ZIP_CENTRAL_DIRECTORY = (0x02014B50, 0x06054B50, 0x06064B50, 0x07064B50)
+ZIP_DATA_DESCRIPTOR = 0x08074B50
+
+
+class ChecksumError(Exception):
+    pass
+
+
+class UnsupportedZipError(Exception):
+    pass
+
+
+class Artefact:
+    """
+    A file to download, placed at `dest` or, when `extract_to` is set, extracted into that directory.
+    """
+
+    def __init__(self, name, url, dest, sha256=None, extract_to=None):
+        self.name = name
+        self.url = url
+        self.dest = Path(dest)
+        self.sha256 = sha256.lower() if sha256 else None
+        self.extract_to = Path(extract_to) if extract_to else None
+
+
+class StreamingUnzipper:
+    """
+    Extracts a zip archive as its bytes are received, reading the local file headers in order rather than the
+    central directory at the end of the archive. Archives it cannot stream (encrypted entries, compression methods
+    other than stored / deflated, stored entries of unknown size) raise UnsupportedZipError.
+    """
+
+    def __init__(self, dest_dir):
+        self.dest_dir = Path(dest_dir)
+        self.buffer = bytearray()
+        self.done = False
+        self._entry = None
+
+    def feed(self, data):
+        if self.done:
+            return
+        self.buffer += data
+        while not self.done and self._step():
+            pass
+
+    def close(self):
+        if not self.done or self._entry is not None:
+            raise UnsupportedZipError("Truncated zip archive")
+
+    def _step(self):
+        # processes what it can of the buffer, returns False when more bytes are needed
+        if self._entry is None:
+            return self._read_header()
+        if self._entry["remaining"] is None:
+            return self._read_until_end_of_stream()
+        return self._read_sized_data()
+
+    def _read_header(self):
+        if len(self.buffer) < 4:
+            return False
+        signature = struct.unpack_from("<I", self.buffer)[0]
+        if signature in ZIP_CENTRAL_DIRECTORY:
+            # all the entries were extracted
+            self.done = True
+            return False
+        if signature != ZIP_LOCAL_FILE_HEADER:
+            raise UnsupportedZipError("Unexpected zip record signature %#x" % signature)
+        if len(self.buffer) < 30:
+            return False
+
+        (_, _, flags, method, _, _, crc, compressed_size, size,
+         name_length, extra_length) = struct.unpack_from("<IHHHHHIIIHH", self.buffer)
+        if len(self.buffer) < 30 + name_length + extra_length:
+            return False
+        name = bytes(self.buffer[30:30 + name_length]).decode("utf-8" if flags & 0x800 else "cp437")
+        extra = bytes(self.buffer[30 + name_length:30 + name_length + extra_length])
+        del self.buffer[:30 + name_length + extra_length]
+
+        zip64, size, compressed_size = self._read_zip64_extra(extra, size, compressed_size)
+
+        if flags & 0x1:
+            raise UnsupportedZipError("Encrypted zip entry: %s" % name)
+        if method not in (0, 8):
+            raise UnsupportedZipError("Unsupported compression method %d: %s" % (method, name))
+        has_descriptor = bool(flags & 0x8)
+        if has_descriptor and method == 0:
+            raise UnsupportedZipError("Stored zip entry of unknown size: %s" % name)
+
+        path = self._get_path(name)
+        is_dir = name.endswith("/")
+        if is_dir:
+            path.mkdir(parents=True, exist_ok=True)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+        self._entry = {"name": name,
+                       "file": None if is_dir else open(path, "wb"),
+                       "decompressor": zlib.decompressobj(-15) if method == 8 else None,
+                       "crc": crc,
+                       "size": size,
+                       "zip64": zip64,
+                       "remaining": None if has_descriptor else compressed_size,
+                       "actual_crc": 0,
+                       "actual_size": 0}
+        return True
+
+    def _read_sized_data(self):
+        entry = self._entry
+        if entry["remaining"] > 0:
+            if not self.buffer:
+                return False
+            data = bytes(self.buffer[:entry["remaining"]])
+            del self.buffer[:len(data)]
+            entry["remaining"] -= len(data)
+            self._write(data if entry["decompressor"] is None else entry["decompressor"].decompress(data))
+            if entry["remaining"] > 0:
+                return False
+        if entry["decompressor"] is not None:
+            self._write(entry["decompressor"].flush())
+        self._complete_entry(entry["crc"], entry["size"])
+        return True
+
+    def _read_until_end_of_stream(self):
+        entry = self._entry
+        decompressor = entry["decompressor"]
+        if not decompressor.eof:
+            if not self.buffer:
+                return False
+            data = bytes(self.buffer)
+            self.buffer.clear()
+            self._write(decompressor.decompress(data))
+            if not decompressor.eof:
+                return False
+            # the bytes after the end of the deflate stream belong to the data descriptor
+            self.buffer[:0] = decompressor.unused_data
+        return self._read_descriptor()
+
+    def _read_descriptor(self):
+        size_format = "<IQQ" if self._entry["zip64"] else "<III"
+        descriptor_size = struct.calcsize(size_format)
+        if len(self.buffer) < 4:
+            return False
+        offset = 4 if struct.unpack_from("<I", self.buffer)[0] == ZIP_DATA_DESCRIPTOR else 0
+        if len(self.buffer) < offset + descriptor_size:
+            return False
+        crc, _, size = struct.unpack_from(size_format, self.buffer, offset)
+        del self.buffer[:offset + descriptor_size]
+        self._complete_entry(crc, size)
+        return True
+
+    def _complete_entry(self, crc, size):
+        entry = self._entry
+        if entry["file"] is not None:
+            entry["file"].close()
+        if entry["actual_crc"] != crc or entry["actual_size"] != size:
+            raise ChecksumError("CRC check failed for zip entry: %s" % entry["name"])
+        self._entry = None
+
+    def _write(self, data):
+        entry = self._entry
+        entry["actual_crc"] = zlib.crc32(data, entry["actual_crc"])
+        entry["actual_size"] += len(data)
+        if entry["file"] is not None:
+            entry["file"].write(data)
+
+    def _get_path(self, name):
+        parts = Path(name).parts
+        if Path(name).is_absolute() or ".." in parts:
+            raise UnsupportedZipError("Unsafe path in zip archive: %s" % name)
+        return self.dest_dir.joinpath(*parts)
+
+    @staticmethod
+    def _read_zip64_extra(extra, size, compressed_size):
+        # returns whether the entry has a zip64 extra field, which also holds its sizes when they overflow
+        while len(extra) >= 4:
+            header_id, data_size = struct.unpack_from("<HH", extra)
+            data = extra[4:4 + data_size]
+            if header_id == 0x0001:
+                values = list(struct.unpack_from("<%dQ" % (len(data) // 8), data))
+                if size == 0xFFFFFFFF and values:
+                    size = values.pop(0)
+                if compressed_size == 0xFFFFFFFF and values:
+                    compressed_size = values.pop(0)
+                return True, size, compressed_size
+            extra = extra[4 + data_size:]
+        return False, size, compressed_size
+
+
+class ModelDownloader:
+    """
+    Downloads the artefacts concurrently into a content-addressed cache, resuming interrupted downloads with
+    HTTP range requests and verifying their checksums, before linking (or extracting) them into place.
+
+    The cache holds each downloaded file under its SHA-256 checksum, together with an index of the URLs already
+    downloaded, so that an artefact is not downloaded again when its checksum (or URL) is found in the cache.
+    """
+
+    def __init__(self, cache_dir, workers=3, retries=5, timeout=60):
+        self.cache_dir = Path(cache_dir)
+        self.workers = workers
+        self.retries = retries
+        self.timeout = timeout
+        self.blobs_dir = self.cache_dir / "sha256"
+        self.partial_dir = self.cache_dir / "partial"
+        self.index_path = self.cache_dir / "index.json"
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        self._index_lock = threading.Lock()
+
+    def download_all(self, artefacts):
+        """
+        Downloads the artefacts concurrently
+        :param artefacts: list of Artefact
+        :return: list of the names of the artefacts that failed
+        """
+        failed = []
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            futures = {executor.submit(self.download, artefact): artefact for artefact in artefacts}
+            for future, artefact in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    log.error(f"Failed to download {artefact.name} from {artefact.url}: {e}")
+                    failed.append(artefact.name)
+        return failed
+
+    def download(self, artefact):
+        blob = self._get_cached_blob(artefact)
+        if blob is not None:
+            log.info(f"{artefact.name} found in cache {blob} -- skipping download")
+            self._place_from_blob(artefact, blob)
+            return
+
+        log.info(f"Downloading {artefact.name} from {artefact.url}")
+        digest, etag, staging_dir = self._fetch(artefact)
+
+        blob = self.blobs_dir / digest
+        os.replace(self._get_partial_path(artefact), blob)
+        os.chmod(blob, 0o644)
+        self._get_partial_path(artefact, ".json").unlink(missing_ok=True)
+        self._update_index(artefact.url, {"sha256": digest, "etag": etag})
+
+        if staging_dir is not None:
+            self._move_into_place(staging_dir, artefact.extract_to)
+        else:
+            self._place_from_blob(artefact, blob)
+        log.info(f"Download complete for {artefact.name} (sha256: {digest})")
+
+    def _fetch(self, artefact):
+        """
+        Downloads the artefact to its partial file, resuming it after a failure, and verifies its checksum
+        :return: tuple of (sha256 checksum, ETag, staging directory the archive was extracted to or None)
+        """
+        attempt, restarted = 0, False
+        while True:
+            staging_dir = None
+            if artefact.extract_to is not None:
+                staging_dir = artefact.extract_to.parent / (".%s.partial" % artefact.extract_to.name)
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                staging_dir.mkdir(parents=True)
+
+            try:
+                digest, etag = self._fetch_once(artefact, staging_dir)
+                if artefact.sha256 and digest != artefact.sha256:
+                    raise ChecksumError(f"Checksum mismatch for {artefact.name}: expected {artefact.sha256}, "
+                                        f"got {digest}")
+                return digest, etag, staging_dir
+
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                wait_sec = min(2 ** attempt, 30)
+                log.warning(f"Download of {artefact.name} interrupted ({e}), resuming in {wait_sec}s "
+                            f"(attempt {attempt}/{self.retries})")
+                time.sleep(wait_sec)
+
+            except ChecksumError as e:
+                # a corrupted partial file is only detected once complete, it is then downloaded again from scratch
+                self._get_partial_path(artefact).unlink(missing_ok=True)
+                self._get_partial_path(artefact, ".json").unlink(missing_ok=True)
+                if staging_dir is not None:
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+                if restarted:
+                    raise
+                log.warning(f"{e}, downloading it again")
+                restarted = True
+
+    def _fetch_once(self, artefact, staging_dir):
+        partial_path = self._get_partial_path(artefact)
+        partial_meta_path = self._get_partial_path(artefact, ".json")
+        partial_meta = json.loads(partial_meta_path.read_text()) if partial_meta_path.exists() else {}
+
+        offset = partial_path.stat().st_size if partial_path.exists() and partial_meta.get("url") == artefact.url \
+            else 0
+        headers = {}
+        if offset > 0:
+            headers["Range"] = f"bytes={offset}-"
+            if partial_meta.get("etag"):
+                # the whole file is sent back when it changed since the partial download
+                headers["If-Range"] = partial_meta["etag"]
+
+        with requests.get(artefact.url, stream=True, headers=headers, timeout=self.timeout) as resp:
+            if resp.status_code == 416:
+                # the partial file does not match the remote one anymore
+                partial_path.unlink(missing_ok=True)
+                raise requests.ConnectionError("Requested range not satisfiable")
+            resp.raise_for_status()
+
+            if resp.status_code != 206 or not resp.headers.get("content-range", "").startswith(f"bytes {offset}-"):
+                offset = 0
+            etag = resp.headers.get("etag")
+            partial_meta_path.write_text(json.dumps({"url": artefact.url, "etag": etag}))
+
+            length = int(resp.headers.get("content-length", 0))
+            total = offset + length if length else 0
+            hasher = hashlib.sha256()
+            unzipper = StreamingUnzipper(staging_dir) if staging_dir is not None else None
+            streaming = unzipper is not None
+
+            def consume(data):
+                nonlocal streaming
+                hasher.update(data)
+                if streaming:
+                    try:
+                        unzipper.feed(data)
+                    except (UnsupportedZipError, ChecksumError) as e:
+                        log.info(f"Cannot extract {artefact.name} while downloading ({e}), extracting it once "
+                                 f"downloaded")
+                        streaming = False
+
+            if offset > 0:
+                log.info(f"Resuming download of {artefact.name} from {offset / (1024 * 1024):.2f} MB")
+                # the partial bytes are hashed and extracted again, as this state is not kept across attempts
+                with open(partial_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        consume(chunk)
+
+            downloaded = offset
+            progress = _Progress(artefact.name, total)
+            with open(partial_path, "ab" if offset > 0 else "wb") as f:
+                for chunk in resp.iter_content(CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        consume(chunk)
+                        downloaded += len(chunk)
+                        progress.update(downloaded)
+
+            if total and downloaded != total:
+                raise requests.ConnectionError(f"Received {downloaded} of {total} bytes")
+
+        if unzipper is not None:
+            if streaming:
+                try:
+                    unzipper.close()
+                except UnsupportedZipError:
+                    streaming = False
+            if not streaming:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                try:
+                    with ZipFile(partial_path, "r") as zip_ref:
+                        zip_ref.extractall(staging_dir)
+                except BadZipFile as e:
+                    raise ChecksumError(f"Corrupted archive {artefact.name}: {e}")
+        return hasher.hexdigest(), etag
+
+    def _get_cached_blob(self, artefact):
+        digest = artefact.sha256 or self._read_index().get(artefact.url, {}).get("sha256")
+        if digest and (self.blobs_dir / digest).exists():
+            return self.blobs_dir / digest
+        return None
+
+    def _place_from_blob(self, artefact, blob):
+        if artefact.extract_to is not None:
+            staging_dir = artefact.extract_to.parent / (".%s.partial" % artefact.extract_to.name)
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            with ZipFile(blob, "r") as zip_ref:
+                zip_ref.extractall(staging_dir)
+            self._move_into_place(staging_dir, artefact.extract_to)
+            return
+
+        # hard link the cached file when possible, so that it does not take twice the space
+        tmp_dest = artefact.dest.with_name(artefact.dest.name + ".partial")
+        tmp_dest.unlink(missing_ok=True)
+        try:
+            os.link(blob, tmp_dest)
+        except OSError:
+            shutil.copyfile(blob, tmp_dest)
+            os.chmod(tmp_dest, 0o644)
+        os.replace(tmp_dest, artefact.dest)
+
+    @staticmethod
+    def _move_into_place(staging_dir, extract_to):
+        # the archive is extracted next to its destination, so that moving its entries in place is atomic
+        for entry in staging_dir.iterdir():
+            target = extract_to.parent / entry.name
+            if target.is_dir():
+                shutil.rmtree(target)
+            os.replace(entry, target)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _get_partial_path(self, artefact, suffix=".part"):
+        return self.partial_dir / (hashlib.sha1(artefact.url.encode("utf-8")).hexdigest() + suffix)
+
+    def _read_index(self):
+        try:
+            return json.loads(self.index_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _update_index(self, url, entry):
+        with self._index_lock:
+            index = self._read_index()
+            index[url] = entry
+            tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+            tmp_path.write_text(json.dumps(index, indent=2))
+            os.replace(tmp_path, self.index_path)
+
+
+class _Progress:
+
+    def __init__(self, name, total):
+        self.name = name
+        self.total = total
+        self.last_logged_percent = 0
+
+    def update(self, downloaded):
+        if not self.total:
+            return
+        percent = int(downloaded * 100 / self.total)
+        if percent - self.last_logged_percent >= 10 or (percent == 100 and self.last_logged_percent < 100):
+            self.last_logged_percent = percent
+            done = int(50 * percent / 100)
+            downloaded_mb = downloaded / (1024 * 1024)
+            total_mb = self.total / (1024 * 1024)
+            log.info(f"{self.name} [{'=' * done:<50}] {percent:3d}% {downloaded_mb:.2f} MB / {total_mb:.2f} MB")
+
+
+def get_artefacts(model_dir, env=os.environ):
+    """
+    Lists the artefacts of the model not present yet in the model directory
+    :param model_dir: the model directory
+    :param env: the environment variables
+    :return: list of Artefact
+    """
+    model_name = env["MODEL_NAME"]
+    vocab_file = model_dir / "vocab.dat"
+    cdb_file = model_dir / "cdb.dat"
+    meta_dir = model_dir / "Status"
+
+    artefacts = []
+    if vocab_file.exists() and cdb_file.exists():
+        log.info(
+            f"{model_name} model already present with Vocabulary: '{vocab_file}' and CDB: '{cdb_file}'. "
+            f"Skipping download"
+        )
+    else:
+        if not vocab_file.exists():
+            artefacts.append(Artefact("vocab", env["MODEL_VOCAB_URL"], vocab_file, env.get("MODEL_VOCAB_SHA256")))
+        if not cdb_file.exists():
+            artefacts.append(Artefact("cdb", env["MODEL_CDB_URL"], cdb_file, env.get("MODEL_CDB_SHA256")))
+
+    if not meta_dir.exists():
+        artefacts.append(Artefact("meta model: status", env["MODEL_META_URL"], model_dir / "mc_status.zip",
+                                  env.get("MODEL_META_SHA256"), extract_to=meta_dir))
+    else:
+        log.info(f"Meta model already present in {meta_dir} -- skipping download")
+    return artefacts
+
+
+def main(env=os.environ, models_dir=None):
+    log.info("Running MedCAT Model Downloader")
+
+    # Check for missing env vars
+    missing = [var for var in required_vars if not env.get(var)]
+    if missing:
+        log.error("Missing Required environment variables:")
+        for var in missing:
+            log.error(f"  {var}")
+        log.info("Usage: set these environment variables before running the script:")
+        for var, desc in required_vars.items():
+            log.info(f"  {var:<22} - {desc}")
+        log.info("Optionally:")
+        for var, desc in optional_vars.items():
+            log.info(f"  {var:<22} - {desc}")
+        return 1
+
+    # Prepare paths
+    model_name = env["MODEL_NAME"]
+    models_dir = Path(models_dir) if models_dir else Path(__file__).resolve().parent.parent / "models"
+    model_dir = models_dir / model_name
+    model_dir.mkdir(parents=True, exist_ok=True)
+
+    artefacts = get_artefacts(model_dir, env)
+    if artefacts:
+        log.info(f"Starting download of MedCAT Model '{model_name}'")
+        downloader = ModelDownloader(env.get("MODEL_CACHE_DIR") or models_dir / ".cache",
+                                     workers=int(env.get("MODEL_DOWNLOAD_WORKERS", 3)),
+                                     retries=int(env.get("MODEL_DOWNLOAD_RETRIES", 5)),
+                                     timeout=float(env.get("MODEL_DOWNLOAD_TIMEOUT", 60)))
+        failed = downloader.download_all(artefacts)
+        if failed:
+            log.error(f"Failed downloading model '{model_name}': {', '.join(failed)}")
+            return 1
+
+    log.info(f"Completed downloading model '{model_name}'")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="[%(asctime)s] [%(levelname)s] %(name)s: %(message)s",
+        level=logging.INFO,
     )
-else:
-    log.info(f"Starting download of MedCAT Model '{model_name}'")
-    if not vocab_file.exists():
-        download_file(vocab_url, vocab_file)
-    if not cdb_file.exists():
-        download_file(cdb_url, cdb_file)
-
-# Download and unzip meta if missing
-if not meta_dir.exists():
-    log.info("Downloading meta model: status")
-    download_file(meta_url, meta_zip)
-    with ZipFile(meta_zip, "r") as zip_ref:
-        zip_ref.extractall(model_dir)
-    meta_zip.unlink()
-else:
-    log.info(f"Meta model already present in {meta_dir} -- skipping download")
-
-log.info(f"Completed downloading model '{model_name}'")
+    sys.exit(main())
@@ -36,10 +36,33 @@ fi
 
 SERVER_ACCESS_LOG_FORMAT="%(t)s [ACCESSS] %(h)s \"%(r)s\" %(s)s \"%(f)s\" \"%(a)s\""
 
-# start the server
-#
-echo "Starting up Flask app using gunicorn server ..."
-gunicorn --bind $SERVER_HOST:$SERVER_PORT --workers=$SERVER_WORKERS --threads=$SERVER_THREADS --timeout=$SERVER_WORKER_TIMEOUT \
+start_gunicorn() {
+  exec gunicorn --bind $SERVER_HOST:$SERVER_PORT --workers=$SERVER_WORKERS --threads=$SERVER_THREADS --timeout=$SERVER_WORKER_TIMEOUT \
 	 --access-logformat="$SERVER_ACCESS_LOG_FORMAT" --access-logfile=- --log-file=- --log-level info \
 	 --config /cat/config.py \
   wsgi
+}
+
+# start the server
+#
+if [[ "$APP_GRPC_ENABLED" != "true" ]]; then
+  echo "Starting up Flask app using gunicorn server ..."
+  start_gunicorn
+fi
+
+# optionally, start the gRPC server next to the Flask app, the container exiting as soon as either of them exits
+#
+trap 'kill $(jobs -p) 2>/dev/null' TERM INT
+
+echo "Starting up gRPC server on port ${APP_GRPC_PORT:-50051} ..."
+python -m medcat_service.grpc_server &
+
+echo "Starting up Flask app using gunicorn server ..."
+start_gunicorn &
+
+wait -n
+status=$?
+echo "A server exited with status $status, stopping the other one ..."
+kill $(jobs -p) 2>/dev/null
+wait
+exit $status